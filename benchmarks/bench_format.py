@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+""" Measures G-code generation throughput (lines/second) for `meander` and
+`triangular_wave` workloads, comparing the cached argument formatter in
+`G._format_args` against the previous per-axis `str.format` implementation.
+
+Both workloads write every line through `move` and so `_format_args`.
+Methods that emit through `G.moves`, like `spiral`, build their format string
+once per block and are not affected by it.
+
+Run from the repository root::
+
+    python benchmarks/bench_format.py
+
+"""
+import io
+import sys
+from os.path import abspath, dirname, join
+from time import time
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from wheecode import G
+
+
+def legacy_format_args(self, x=None, y=None, z=None, i=None, j=None, k=None, **kwargs):
+    d = self.output_digits
+    args = []
+    if x is not None:
+        args.append('{0}{1:.{digits}f}'.format(self.x_axis, x, digits=d))
+    if y is not None:
+        args.append('{0}{1:.{digits}f}'.format(self.y_axis, y, digits=d))
+    if z is not None:
+        args.append('{0}{1:.{digits}f}'.format(self.z_axis, z, digits=d))
+    if i is not None:
+        args.append('{0}{1:.{digits}f}'.format(self.i_axis, i, digits=d))
+    if j is not None:
+        args.append('{0}{1:.{digits}f}'.format(self.j_axis, j, digits=d))
+    if k is not None:
+        args.append('{0}{1:.{digits}f}'.format(self.k_axis, k, digits=d))
+    args += ['{0}{1:.{digits}f}'.format(k, kwargs[k], digits=d) for k in sorted(kwargs)]
+    return ' '.join(args)
+
+
+def meander(g):
+    g.meander(100, 100, 0.01)
+
+
+def triangular_wave(g):
+    g.triangular_wave(100, 100, 20000)
+
+
+def run(workload, repeat=3):
+    """ Return the best lines/second over `repeat` runs of `workload`.
+    """
+    best = 0
+    for _ in range(repeat):
+        out = io.StringIO()
+        g = G(outfile=out, print_lines=False, record_history=False)
+        start = time()
+        workload(g)
+        g.teardown()
+        elapsed = time() - start
+        lines = out.getvalue().count('\n')
+        best = max(best, lines / elapsed)
+    return best
+
+
+def main():
+    print('{:<16} {:>16} {:>16} {:>8}'.format('workload', 'legacy lines/s',
+                                              'cached lines/s', 'speedup'))
+    for workload in (meander, triangular_wave):
+        cached_format_args = G._format_args
+        G._format_args = legacy_format_args
+        try:
+            before = run(workload)
+        finally:
+            G._format_args = cached_format_args
+        after = run(workload)
+        print('{:<16} {:>16.0f} {:>16.0f} {:>7.2f}x'.format(
+            workload.__name__, before, after, after / before))
+
+
+if __name__ == '__main__':
+    main()
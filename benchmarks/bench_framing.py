@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+""" Measures how many lines/second `Printer._next_line` can frame with line
+numbers and checksums, comparing the cached bytes framing against the
+previous str framing that recomputed every line, including resends.
+
+Run from the repository root::
+
+    python benchmarks/bench_framing.py
+
+"""
+import sys
+from functools import reduce
+from os.path import abspath, dirname, join
+from time import time
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from wheecode.printer import Printer, encode2To3
+
+GCODE = join(dirname(__file__), '..', 'wheecode', 'tests', 'test.gcode')
+
+
+def legacy_next_line(self):
+    line = self._buffer[self._current_line_idx].strip()
+    if line.startswith('M110 N'):
+        new_number = int(line[6:])
+        self._reset_offset = self._current_line_idx + 1 - new_number
+    elif line.startswith('M110'):
+        self._reset_offset = self._current_line_idx + 1
+    idx = self._current_line_idx + 1 - self._reset_offset
+    line = 'N{} {}'.format(idx, line)
+    checksum = reduce(lambda a, b: a ^ b, [ord(char) for char in line])
+    return encode2To3('{}*{}\n'.format(line, checksum))
+
+
+def frame_all(printer, next_line):
+    """ Frame every buffered line once, as the print thread does.
+    """
+    for idx in range(len(printer._buffer)):
+        printer._current_line_idx = idx
+        next_line(printer)
+
+
+def run(next_line, passes, repeat=3):
+    """ Return the best lines/second over `repeat` runs. Each run frames the
+    file `passes` times on the same Printer, so every pass after the first
+    behaves like a resend of every line.
+    """
+    best = 0
+    for _ in range(repeat):
+        printer = Printer()
+        printer.load_file(GCODE)
+        start = time()
+        for _ in range(passes):
+            frame_all(printer, next_line)
+        elapsed = time() - start
+        best = max(best, passes * len(printer._buffer) / elapsed)
+    return best
+
+
+def main():
+    print('{:<10} {:>16} {:>16} {:>8}'.format('case', 'legacy lines/s',
+                                              'cached lines/s', 'speedup'))
+    for name, passes in (('send', 1), ('resend', 10)):
+        before = run(legacy_next_line, passes)
+        after = run(Printer._next_line, passes)
+        print('{:<10} {:>16.0f} {:>16.0f} {:>7.2f}x'.format(
+            name, before, after, after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+""" Measures how many moves/second go through `GMatrix` under a rotation,
+compared to plain `G`, for single `move` calls and for reading
+`current_position` after each one, and for rotated copies of a meander given
+to `moves` as arrays or replayed from a recorded `Toolpath`.
+
+Run from the repository root::
+
+    python benchmarks/bench_matrix.py
+
+"""
+import math
+import sys
+from os.path import abspath, dirname, join
+from time import time
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..')))
+
+import numpy as np
+
+from wheecode import G, GMatrix
+
+MOVES = 20000
+
+COPIES = 1000
+
+
+def run(g_class, read_position=False, repeat=3):
+    """ Return the best moves/second over `repeat` runs.
+    """
+    best = 0
+    for _ in range(repeat):
+        g = g_class(print_lines=False)
+        if g_class is GMatrix:
+            g.rotate(math.pi / 6)
+        start = time()
+        for i in range(MOVES):
+            g.move(1, i % 3)
+            if read_position:
+                g.current_position
+        best = max(best, MOVES / (time() - start))
+    return best
+
+
+def meander(lines=20, width=10, spacing=0.5):
+    """ Return the relative moves of a meander, one row per move.
+    """
+    steps = np.zeros((2 * lines, 2))
+    steps[0::2, 0] = width * (-1) ** np.arange(lines)
+    steps[1::2, 1] = spacing
+    return steps
+
+
+def run_copies(mode, repeat=3):
+    """ Return the best moves/second over `repeat` runs of drawing COPIES
+    rotated meanders, with one `move` call per move, one `moves` call per
+    copy, or by replaying a recorded copy.
+    """
+    steps = meander()
+    best = 0
+    for _ in range(repeat):
+        g = GMatrix(print_lines=False)
+        start = time()
+        if mode == 'replay':
+            path = g.record_toolpath(lambda g: g.moves(steps))
+            g.replay(path, [lambda g, i=i: g.rotate(2 * math.pi * i / COPIES)
+                            for i in range(COPIES)], travel=False)
+        else:
+            for i in range(COPIES):
+                g.push_matrix()
+                g.rotate(2 * math.pi * i / COPIES)
+                if mode == 'moves':
+                    g.moves(steps)
+                else:
+                    for x, y in steps.tolist():
+                        g.move(x, y)
+                g.pop_matrix()
+        best = max(best, COPIES * len(steps) / (time() - start))
+    return best
+
+
+def main():
+    print('{:<26} {:>12}'.format('case', 'moves/s'))
+    for name, g_class, read_position in (
+            ('G.move', G, False),
+            ('GMatrix.move', GMatrix, False),
+            ('GMatrix.move + position', GMatrix, True)):
+        print('{:<26} {:>12.0f}'.format(name, run(g_class, read_position)))
+    for mode in ('move', 'moves', 'replay'):
+        print('{:<26} {:>12.0f}'.format('rotated copies, ' + mode,
+                                        run_copies(mode)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#! /usr/bin/env python
+""" Measures how many MB/second `parse_gcode` reads, and how long
+`G.from_gcode` takes to rebuild the history, on a file made of copies of
+`wheecode/tests/test.gcode`.
+
+Run from the repository root::
+
+    python benchmarks/bench_parser.py [size in MB]
+
+"""
+import os
+import sys
+import tempfile
+from os.path import abspath, dirname, join
+from time import time
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from wheecode import G
+from wheecode.parser import parse_gcode
+
+GCODE = join(dirname(__file__), '..', 'wheecode', 'tests', 'test.gcode')
+
+
+def main(size=20):
+    with open(GCODE, 'rb') as f:
+        text = f.read()
+    copies = max(1, int(size * 1e6 / len(text)))
+    fd, path = tempfile.mkstemp(suffix='.gcode')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for _ in range(copies):
+                f.write(text)
+        megabytes = copies * len(text) / 1e6
+
+        start = time()
+        parsed = parse_gcode(path)
+        elapsed = time() - start
+        print('parse_gcode   {:8.1f} MB {:10d} moves {:8.2f} s {:8.1f} MB/s'.format(
+            megabytes, len(parsed), elapsed, megabytes / elapsed))
+
+        start = time()
+        G.from_gcode(path)
+        elapsed = time() - start
+        print('G.from_gcode  {:8.1f} MB {:10d} moves {:8.2f} s {:8.1f} MB/s'.format(
+            megabytes, len(parsed), elapsed, megabytes / elapsed))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*[float(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+""" Measures `Printer` throughput against the simulated Marlin firmware in
+`wheecode.simulator`, without any hardware attached.
+
+For each combination of link latency, injected resend rate and send mode it
+reports the lines/second streamed with `sendline`, and the 50th, 90th and
+99th percentile round trip times of `get_response`.
+
+Run from the repository root::
+
+    python benchmarks/bench_printer.py
+
+"""
+import logging
+import sys
+from os.path import abspath, dirname, join
+from time import time
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from wheecode.printer import Printer, logger
+from wheecode.simulator import MarlinSimulator
+
+LINES = 2000
+ROUND_TRIPS = 200
+
+MODES = (('ping-pong', None), ('streaming', 127))
+LATENCIES = (0, 0.001, 0.005)
+RESEND_RATES = (0, 0.01)
+
+
+def connect(rx_buffer_size, **simulator_options):
+    s = MarlinSimulator(seed=0, **simulator_options)
+    p = Printer(rx_buffer_size=rx_buffer_size)
+    p.connect(s)
+    p.start()
+    return p, s
+
+
+def throughput(rx_buffer_size, **simulator_options):
+    """ Return the lines/second achieved streaming `LINES` moves.
+    """
+    p, s = connect(rx_buffer_size, **simulator_options)
+    start = time()
+    for i in range(LINES):
+        p.sendline('G1 X{:.3f} Y{:.3f}'.format(i * 0.01, (i % 100) * 0.01))
+    p.disconnect(wait=True)
+    elapsed = time() - start
+    s.close()
+    return LINES / elapsed
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100.0 * (len(values) - 1))))]
+
+
+def round_trips(rx_buffer_size, **simulator_options):
+    """ Return the 50th, 90th and 99th percentile `get_response` times in
+    milliseconds.
+    """
+    p, s = connect(rx_buffer_size, **simulator_options)
+    times = []
+    for _ in range(ROUND_TRIPS):
+        start = time()
+        p.get_response('M114')
+        times.append((time() - start) * 1000)
+    p.disconnect()
+    s.close()
+    return [percentile(times, q) for q in (50, 90, 99)]
+
+
+def main():
+    logger.setLevel(logging.WARNING)
+    print('{:<10} {:>11} {:>7} {:>10} {:>9} {:>9} {:>9}'.format(
+        'mode', 'latency ms', 'resend', 'lines/s', 'p50 ms', 'p90 ms', 'p99 ms'))
+    for latency in LATENCIES:
+        for resend_rate in RESEND_RATES:
+            for name, rx_buffer_size in MODES:
+                options = dict(latency=latency, resend_rate=resend_rate)
+                rate = throughput(rx_buffer_size, **options)
+                p50, p90, p99 = round_trips(rx_buffer_size, **options)
+                print('{:<10} {:>11.1f} {:>7.2f} {:>10.0f} {:>9.2f} {:>9.2f} {:>9.2f}'
+                      .format(name, latency * 1000, resend_rate, rate, p50, p90, p99))
+
+
+if __name__ == '__main__':
+    main()
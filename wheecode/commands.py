@@ -0,0 +1,210 @@
+import numpy as np
+
+from wheecode.history import GrowableArray
+
+# Opcodes of the commands in a `CommandLog`.
+RAPID = 0    # G0
+MOVE = 1     # G1
+ARC_CW = 2   # G2
+ARC_CCW = 3  # G3
+OTHER = -1   # anything else, only kept as text
+
+MOTION_OPCODES = (RAPID, MOVE, ARC_CW, ARC_CCW)
+
+_OPCODES = {'G0': RAPID, 'G00': RAPID, 'G1': MOVE, 'G01': MOVE,
+            'G2': ARC_CW, 'G02': ARC_CW, 'G3': ARC_CCW, 'G03': ARC_CCW}
+
+
+def parse_opcode(line):
+    """ Return the opcode of a line of GCode.
+    """
+    words = line.split(None, 1)
+    if not words:
+        return OTHER
+    return _OPCODES.get(words[0].upper(), OTHER)
+
+
+class CommandLog(object):
+    """ A struct-of-arrays record of the commands issued by a `G` instance.
+
+    Every command gets one entry in each of the arrays below, so analysis
+    passes can work on whole columns instead of parsing text:
+
+    - `opcode`: one of RAPID, MOVE, ARC_CW, ARC_CCW or OTHER.
+    - `position`: the absolute x, y, z position after the command.
+    - `e`: the position of the E axis after the command.
+    - `feed`: the feed rate in effect after the command.
+    - `extruding`: whether the extruder was on.
+    - `relative`: whether the command was issued in relative mode.
+    - `color`: the color given for moves, None for other commands.
+    - `text`: the GCode line the command was written as.
+
+    `to_gcode` is the text backend. It renders moves from the arrays and
+    the other commands from their text.
+
+    Examples
+    --------
+    >>> g = G(print_lines=False, record_commands=True)
+    >>> g.move(10, 10)
+    >>> g.commands.position
+    array([[ 0.,  0.,  0.],
+           [10., 10.,  0.]])
+
+    """
+
+    def __init__(self, capacity=1024):
+        self._opcode = GrowableArray(dtype=np.int8, capacity=capacity)
+        self._position = GrowableArray(width=3, capacity=capacity)
+        self._e = GrowableArray(capacity=capacity)
+        self._feed = GrowableArray(capacity=capacity)
+        self._extruding = GrowableArray(dtype=bool, capacity=capacity)
+        self._relative = GrowableArray(dtype=bool, capacity=capacity)
+        self._color = GrowableArray(dtype=object, capacity=capacity)
+        self._text = GrowableArray(dtype=object, capacity=capacity)
+
+    def append(self, text, relative, position, e, feed, extruding, color):
+        """ Record the command written as `text`, with the state after it.
+        """
+        opcode = parse_opcode(text)
+        self._opcode.append(opcode)
+        self._position.append(position)
+        self._e.append(e)
+        self._feed.append(feed)
+        self._extruding.append(extruding)
+        self._relative.append(relative)
+        self._color.append(color if opcode in MOTION_OPCODES else None)
+        self._text.append(text)
+
+    def extend(self, texts, relative, positions, e, feed, extruding, colors):
+        """ Record a block of commands whose states are already known, all
+        with the opcode of the first one.
+        """
+        count = len(texts)
+        if count == 0:
+            return
+        self._opcode.extend(np.full(count, parse_opcode(texts[0])))
+        self._position.extend(positions)
+        self._e.extend(np.broadcast_to(e, (count,)))
+        self._feed.extend(np.full(count, feed))
+        self._extruding.extend(np.full(count, extruding))
+        self._relative.extend(np.full(count, relative))
+        self._color.extend(colors)
+        self._text.extend(texts)
+
+    def clear(self):
+        for column in (self._opcode, self._position, self._e, self._feed,
+                       self._extruding, self._relative, self._color,
+                       self._text):
+            column.clear()
+
+    @property
+    def opcode(self):
+        return self._opcode.array
+
+    @property
+    def position(self):
+        return self._position.array
+
+    @property
+    def e(self):
+        return self._e.array
+
+    @property
+    def feed(self):
+        return self._feed.array
+
+    @property
+    def extruding(self):
+        return self._extruding.array
+
+    @property
+    def relative(self):
+        return self._relative.array
+
+    @property
+    def color(self):
+        return self._color.array
+
+    @property
+    def text(self):
+        return self._text.array
+
+    def __len__(self):
+        return len(self._opcode)
+
+    def is_motion(self):
+        """ A boolean mask of the commands that move the tool head.
+        """
+        return self.opcode >= 0
+
+    def lengths(self, start=(0, 0, 0)):
+        """ The straight line distance covered by each command, measured from
+        the position after the previous one, or `start` for the first.
+        """
+        position = self.position
+        previous = np.vstack([np.asarray(start, dtype=float).reshape(1, 3),
+                              position[:-1]])
+        return np.sqrt(((position - previous) ** 2).sum(axis=1))
+
+    def to_gcode(self, axis_names=('X', 'Y', 'Z'), output_digits=6,
+                 start=(0, 0, 0)):
+        """ Render the log back to GCode, yielding one line at a time.
+
+        G0 and G1 moves are formatted from the arrays, with absolute
+        coordinates for the axes that changed. Other commands are written
+        from their text, and the positioning mode is switched as needed so
+        that commands issued in relative mode keep their meaning.
+
+        Parameters
+        ----------
+        axis_names : 3-tuple of str (default: ('X', 'Y', 'Z'))
+            The names of the x, y and z axes.
+        output_digits : int (default: 6)
+            The number of decimals of the rendered coordinates.
+        start : 3-tuple of floats (default: (0, 0, 0))
+            The position before the first command.
+
+        """
+        fmt = '{}{:.%df}' % output_digits
+        known = set(axis_names) | set(['E', 'F'])
+        previous = tuple(float(v) for v in start)
+        previous_e = 0.0
+        previous_feed = None
+        mode = None
+        opcodes = self.opcode.tolist()
+        positions = self.position.tolist()
+        es = self.e.tolist()
+        feeds = self.feed.tolist()
+        relatives = self.relative.tolist()
+        texts = self.text
+        for index, opcode in enumerate(opcodes):
+            position = tuple(positions[index])
+            text = texts[index]
+            words = text.split(';')[0].split()
+            args = None
+            if words and words[0] in ('G90', 'G91'):
+                continue  # the mode is set below as needed
+            if opcode in (RAPID, MOVE) and all(w[0] in known for w in words[1:]):
+                args = [fmt.format(name, value)
+                        for name, value, last in zip(axis_names, position, previous)
+                        if value != last]
+                if es[index] != previous_e:
+                    args.append(fmt.format('E', es[index]))
+                if feeds[index] != previous_feed and previous_feed is not None:
+                    args.append('F{}'.format(feeds[index]))
+            if args:
+                if mode != 'G90':
+                    mode = 'G90'
+                    yield mode
+                yield ('G0 ' if opcode == RAPID else 'G1 ') + ' '.join(args)
+            else:
+                if opcode in MOTION_OPCODES:
+                    # Written as text, so keep the mode it was issued in.
+                    wanted = 'G91' if relatives[index] else 'G90'
+                    if mode != wanted:
+                        mode = wanted
+                        yield mode
+                yield text
+            previous = position
+            previous_e = es[index]
+            previous_feed = feeds[index]
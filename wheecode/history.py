@@ -0,0 +1,120 @@
+import numpy as np
+
+
+class GrowableArray(object):
+    """ An append-only numpy array whose capacity doubles whenever it fills
+    up, so appending is amortized O(1) without keeping a Python object per
+    entry.
+
+    The recorded entries are exposed through the read-only `array` view, and
+    the object otherwise behaves like that view for indexing, iteration and
+    `len`.
+
+    Examples
+    --------
+    >>> history = GrowableArray(width=3)
+    >>> history.append((0, 0, 0))
+    >>> history.append((1, 2, 3))
+    >>> history.array
+    array([[0., 0., 0.],
+           [1., 2., 3.]])
+
+    """
+
+    def __init__(self, width=None, dtype=float, initial=None, capacity=1024):
+        """
+        Parameters
+        ----------
+        width : int or None (default: None)
+            The number of columns in each entry. If None the array is one
+            dimensional.
+        dtype : numpy dtype (default: float)
+            The type of the stored values. Use `object` to store arbitrary
+            Python values such as colors.
+        initial : iterable or None (default: None)
+            Entries to add on construction.
+        capacity : int (default: 1024)
+            The number of entries to allocate up front.
+
+        """
+        self.width = width
+        self.dtype = np.dtype(dtype)
+        self._size = 0
+        self._data = self._allocate(max(int(capacity), 1))
+        if initial is not None:
+            self.extend(initial)
+
+    def _allocate(self, capacity):
+        shape = (capacity,) if self.width is None else (capacity, self.width)
+        return np.empty(shape, dtype=self.dtype)
+
+    def _reserve(self, size):
+        """ Make sure there is room for `size` entries.
+        """
+        capacity = len(self._data)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        data = self._allocate(capacity)
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+
+    def append(self, value):
+        """ Add a single entry to the end of the array.
+        """
+        if self._size == len(self._data):
+            self._reserve(self._size + 1)
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values):
+        """ Add several entries to the end of the array.
+        """
+        if self.dtype == object and not (isinstance(values, np.ndarray)
+                                         and values.dtype == object
+                                         and values.ndim == 1):
+            # Assigning a sequence of tuples to an object array slice would
+            # try to broadcast them, so store each entry individually.
+            values = list(values)
+            self._reserve(self._size + len(values))
+            for value in values:
+                self._data[self._size] = value
+                self._size += 1
+            return
+        values = np.asarray(values, dtype=self.dtype)
+        if self.width is not None:
+            values = values.reshape(-1, self.width)
+        self._reserve(self._size + len(values))
+        self._data[self._size:self._size + len(values)] = values
+        self._size += len(values)
+
+    def clear(self):
+        """ Remove all entries while keeping the allocated memory.
+        """
+        self._size = 0
+
+    @property
+    def array(self):
+        """ A read-only view of the recorded entries.
+        """
+        view = self._data[:self._size]
+        view.flags.writeable = False
+        return view
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self.array
+        return self.array.astype(dtype)
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        return self.array[index]
+
+    def __iter__(self):
+        return iter(self.array)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.array)
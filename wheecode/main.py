@@ -57,7 +57,10 @@ import math
 import os
 import sys
 import numpy as np
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+
+from wheecode.history import GrowableArray
+from wheecode.commands import CommandLog
 
 HERE = os.path.dirname(os.path.abspath(__file__))
 
@@ -111,7 +114,13 @@ class G(object):
                  setup=True,
                  lineend='os',
                  comment_char=';',
-                 absolute=False):
+                 absolute=False,
+                 buffer_lines=0,
+                 buffer_size=0,
+                 record_history=True,
+                 socket_window=0,
+                 printer_rx_buffer_size=None,
+                 record_commands=False):
         """
         Parameters
         ----------
@@ -139,8 +148,11 @@ class G(object):
             `direct_write` is True.
         printer_host : str (default: 'localhost')
             Hostname of the printer, only used if `direct_write` is True.
-        printer_port : int (default: 8000)
-            Port of the printer, only used if `direct_write` is True.
+        printer_port : int, str or list (default: 8000)
+            Port of the printer, only used if `direct_write` is True. If
+            `direct_write_mode` is 'serial', a list of serial ports sends the
+            same GCode to each of those printers through a `PrinterGroup`,
+            and `write` returns a list of responses.
         baudrate: int (default: 250000)
             The baudrate to connect to the printer with.
         two_way_comm : bool (default: True)
@@ -185,6 +197,38 @@ class G(object):
             and closing parenthesis: `G1 X5 ( this is a comment )`
         absolute : bool (default: False)
             Should the system default to relative or absolute mode
+        buffer_lines : int (default: 0)
+            If greater than 0, output lines are collected in memory and
+            written to the outfile in one call once this many lines are
+            pending. The buffer is also flushed by `flush` and `teardown`.
+        buffer_size : int (default: 0)
+            If greater than 0, the output buffer is written out once it holds
+            at least this many characters. May be combined with
+            `buffer_lines`; whichever limit is reached first triggers a write.
+        record_history : bool (default: True)
+            If False, the position, color, speed and extruding histories are
+            not recorded. This keeps memory constant for long jobs that are
+            only written out, but `view`, `gen_geometry` and `export_APE` are
+            unavailable.
+        socket_window : int (default: 0)
+            If greater than 0 and `two_way_comm` is True, lines are sent over
+            the socket without waiting for the previous response, with up to
+            this many lines awaiting a response at once. `write` then returns
+            a `Response` whose `result()` waits for the controller's answer,
+            unless `resp_needed` is True. The first error reported by the
+            controller is raised by the following `write`, `flush` or
+            `teardown`.
+        printer_rx_buffer_size : int or None (default: None)
+            Only used if `direct_write_mode` is 'serial'. If given, lines are
+            streamed to the printer with up to this many bytes awaiting an
+            'ok', instead of waiting for each 'ok' before sending the next
+            line. See `Printer`.
+        record_commands : bool (default: False)
+            If True, every command is also recorded in `commands`, a
+            `CommandLog` holding the opcode, position, feed, extruding state
+            and color of each command in numpy arrays. Combined with
+            `outfile=None` and `print_lines=False` the commands are only
+            recorded, and `commands.to_gcode()` renders them to text later.
 
         """
         self.outfile = outfile
@@ -199,6 +243,8 @@ class G(object):
         self.printer_port = printer_port
         self.baudrate = baudrate
         self.two_way_comm = two_way_comm
+        self.socket_window = socket_window
+        self.printer_rx_buffer_size = printer_rx_buffer_size
         self.x_axis = x_axis
         self.y_axis = y_axis
         self.z_axis = z_axis
@@ -206,6 +252,7 @@ class G(object):
         self.j_axis = j_axis
         self.k_axis = k_axis
         self._comment_char = comment_char
+        self._arg_formatters = {}
 
         self._current_position = defaultdict(float)
         self.is_relative = True
@@ -216,12 +263,16 @@ class G(object):
         self.extrusion_width = extrusion_width
         self.extrusion_multiplier = extrusion_multiplier
 
-        self.position_history = [(0, 0, 0)]
-        self.color_history = [(0, 0, 0)]
+        self.position_history = GrowableArray(width=3, initial=[(0, 0, 0)])
+        self.color_history = GrowableArray(dtype=object, initial=[(0, 0, 0)])
         self.speed = 0
         self.speed_history = []
         self.extruding = [None,False]
         self.extruding_history = []
+        self.record_history = record_history
+        self._commands = CommandLog() if record_commands else None
+        # The color of the last move, recorded in the command log.
+        self._last_color = None
 
         self._socket = None
         self._p = None
@@ -243,6 +294,14 @@ class G(object):
         else:
             self.out_fd = None
 
+        # Decide once whether lines must be encoded before being written.
+        self._out_binary = 'b' in getattr(self.out_fd, 'mode', '')
+        self.buffer_lines = buffer_lines
+        self.buffer_size = buffer_size
+        self._out_buffer = []
+        self._out_buffer_lines = 0
+        self._out_buffer_chars = 0
+
         if setup:
             self.setup()
 
@@ -254,6 +313,13 @@ class G(object):
     def current_position(self):
         return self._current_position
 
+    @property
+    def commands(self):
+        """ The `CommandLog` of all commands issued so far, or None if
+        `record_commands` is False.
+        """
+        return self._commands
+
     def __enter__(self):
         """
         Context manager entry
@@ -272,6 +338,65 @@ class G(object):
         """
         self.teardown()
 
+    @classmethod
+    def generate(cls, program, maxsize=1000, **kwargs):
+        """ Run `program` on a new instance of this class in a background
+        thread and return an iterator over the lines of GCode it produces.
+
+        Lines are generated only as fast as they are consumed, so nothing
+        has to be buffered in between. See `wheecode.stream.generate`.
+
+        Parameters
+        ----------
+        program : callable
+            Called with the new instance, and should issue the commands.
+        maxsize : int (default: 1000)
+            The number of writes that may be waiting to be consumed before the
+            program is paused.
+        **kwargs
+            Passed on to the constructor.
+
+        Examples
+        --------
+        >>> def program(g):
+        ...     g.meander(5, 5, 1)
+        >>> with open('out.gcode', 'w') as f:
+        ...     for line in G.generate(program, extrude=True):
+        ...         f.write(line + '\n')
+
+        """
+        from .stream import generate
+        return generate(program, cls, maxsize, **kwargs)
+
+    @classmethod
+    def from_gcode(cls, source, **kwargs):
+        """ Create an instance whose history holds the moves of an existing
+        GCode file, so it can be analyzed with `view`, `export_APE` and the
+        other history based methods.
+
+        The file is parsed with `wheecode.parser.parse_gcode`, nothing is
+        written.
+
+        Parameters
+        ----------
+        source : str or file
+            The path of the file, or a file object open for reading.
+        **kwargs
+            Passed on to the constructor.
+
+        Examples
+        --------
+        >>> g = G.from_gcode('part.gcode')
+        >>> g.view()
+
+        """
+        from .parser import parse_gcode
+        kwargs.setdefault('print_lines', False)
+        kwargs.setdefault('setup', False)
+        g = cls(**kwargs)
+        parse_gcode(source).apply_history(g)
+        return g
+
     def _commentify(self, txt):
         '''
         Format text `txt` in whichever manner is needed to indicate it's a comment.
@@ -333,9 +458,8 @@ class G(object):
         """
         args = self._format_args(x, y, z, **kwargs)
         space = ' ' if len(args) > 0 else ''
-        self.write('G92' + space + args + " " +self._commentify('set home'))
-
         self._update_current_position(mode='absolute', x=x, y=y, z=z, **kwargs)
+        self.write('G92' + space + args + " " +self._commentify('set home'))
 
     def reset_home(self):
         """ Reset the position back to machine coordinates without moving.
@@ -372,8 +496,8 @@ class G(object):
             The speed to move the tool head in (typically) mm/minute.
 
         """
-        self.write('G1 F{}'.format(rate))
         self.speed = rate
+        self.write('G1 F{}'.format(rate))
 
     def dwell(self, time, comment=None):
         """ Pause code executions for the given amount of time.
@@ -421,6 +545,7 @@ class G(object):
             if self.footer is not None:
                 with open(self.footer) as fd:
                     self._write_out(lines=fd.readlines())
+            self.flush()
             if self.outfile is None:
                 self.out_fd.close()
         if self._socket is not None:
@@ -500,6 +625,76 @@ class G(object):
         """
         self.abs_move(x, y, z, rapid=True, **kwargs)
 
+    def moves(self, points, axes=('x', 'y'), absolute=None, rapid=False,
+              color=(0,0,0,0.5), colors=None):
+        """ Move the tool head through a sequence of points in one call. This
+        produces the same output as calling `move` once per point, but the
+        current position and history are updated in a single vectorized step
+        and the resulting block of GCode is written out at once.
+
+        Parameters
+        ----------
+        points : array_like of shape (N, len(axes))
+            The waypoints to move through, one row per move.
+        axes : sequence of str (default: ('x', 'y'))
+            The axis name of each column in `points`, as they would be passed
+            to `move`, e.g. ('x', 'y', 'z') or ('x', 'y', 'E').
+        absolute : bool or None (default: None)
+            If True the points are absolute positions, if False they are
+            relative moves. If None the current mode is used.
+        rapid : Bool (default: False)
+            Executes uncoordinated moves to the specified locations.
+        color : hex string or rgb(a) string
+            Specifies a color to be added to color history for viewing.
+        colors : sequence or None (default: None)
+            Per move colors, overriding `color`.
+
+        Examples
+        --------
+        >>> # trace a 10x10 square
+        >>> g.moves([[0, 10], [10, 0], [0, -10], [-10, 0]])
+
+        >>> # move through absolute positions in 3D
+        >>> g.moves(np.array([[1, 1, 0], [2, 2, 1]]), axes=('x', 'y', 'z'),
+        ...         absolute=True)
+
+        """
+        axes = tuple(axes)
+        points = np.asarray(points, dtype=float).reshape(-1, len(axes))
+        if len(points) == 0:
+            return
+        if colors is not None and len(colors) != len(points):
+            msg = 'Got {} colors for {} points'.format(len(colors), len(points))
+            raise ValueError(msg)
+
+        was_relative = self.is_relative
+        if absolute is None:
+            absolute = not was_relative
+        if absolute:
+            self.absolute()
+        else:
+            self.relative()
+
+        if self.extrude is True and 'E' not in axes:
+            points = np.column_stack([points, self._extrusion_lengths(points, axes)])
+            axes = axes + ('E',)
+
+        if colors is None:
+            colors = [color] * len(points)
+        state = self._update_positions(points, axes, colors)
+        cmd = 'G0 ' if rapid else 'G1 '
+        fmt = cmd + self._arg_formatter(axes)
+        statements = [fmt.format(*row) for row in points.tolist()]
+        if state is None:
+            self._write_lines(statements)
+        else:
+            self._write_lines(statements, state[0], state[1], colors)
+
+        if was_relative:
+            self.relative()
+        else:
+            self.absolute()
+
     def retract(self, retraction):
         if self.extrude is False:
             self.move(E = -retraction)
@@ -700,15 +895,15 @@ class G(object):
                 self.write('G16 X Y {} {}'.format(axis, self._commentify("coordinate axis assignment")))  # coordinate axis assignment
             self.write(plane_selector)
             args = self._format_args(**dims)
+            if helix_dim is not None:
+                dims[helix_dim] = helix_len
+            self._update_current_position(**dims)
             if helix_dim is None:
                 self.write('{0} {1} R{2:.{digits}f}'.format(command, args, radius,
                                                             digits=self.output_digits))
             else:
                 self.write('{0} {1} R{2:.{digits}f} G1 {3}{4}'.format(
                     command, args, radius, helix_dim.upper(), helix_len, digits=self.output_digits))
-                dims[helix_dim] = helix_len
-
-            self._update_current_position(**dims)
 
 
     def arc_ijk(self, target, center, plane, direction='CW', helix_len=None):
@@ -779,10 +974,8 @@ class G(object):
 
 
         args = self._format_args(**dims)
-
-        self.write('{} {}'.format(command, args))
-
         self._update_current_position(**dims)
+        self.write('{} {}'.format(command, args))
 
     def abs_arc(self, direction='CW', radius='auto', **kwargs):
         """ Same as `arc` method, but positions are interpreted as absolute.
@@ -1218,28 +1411,15 @@ class G(object):
         else:
             raise Exception("Must either choose 'center' or 'edge' for starting position.")
         
+        #Compute every point of the spiral at once
+        x_moves, y_moves = self._spiral_points(t, b, start, direction, center_position)
+
         #Move to starting positon
-        if (direction == 'CW' and start == 'center') or (direction == 'CCW' and start == 'edge'):
-            x_move = -t[0]*b*math.cos(t[0])+center_position[0]
-        elif (direction == 'CCW' and start == 'center') or (direction == 'CW' and start == 'edge'):
-            x_move = t[0]*b*math.cos(t[0])+center_position[0]
-        else:
-            raise Exception("Must either choose 'CW' or 'CCW' for spiral direction.")
-        y_move = t[0]*b*math.sin(t[0])+center_position[1]
-        self.move(x_move, y_move)
+        self.move(x_moves[0], y_moves[0])
 
         #Start writing moves
         self.feed(feedrate)
-
-        for step in t[1:]:
-            if (direction == 'CW' and start == 'center') or (direction == 'CCW' and start == 'edge'):
-                x_move = -step*b*math.cos(step)+center_position[0]
-            elif (direction == 'CCW' and start == 'center') or (direction == 'CW' and start == 'edge'):
-                x_move = step*b*math.cos(step)+center_position[0]
-            else:
-                raise Exception("Must either choose 'CW' or 'CCW' for spiral direction.")
-            y_move = step*b*math.sin(step)+center_position[1]
-            self.move(x_move, y_move)
+        self.moves(np.column_stack([x_moves[1:], y_moves[1:]]))
 
         #Set back to relative mode if it was previsously before command was called
         if was_relative:
@@ -1292,129 +1472,134 @@ class G(object):
 
         import sympy as sy
 
-        def calculate_extrusion_values(radius, length, feed = feedrate, flow = flowrate, formula = gradient, delay = dead_delay, spacing = spacing, start = start, outer_radius = end_diameter/2.0, inner_radius=start_diameter/2.0):
-            """Calculates the extrusion values for syringe pumps A & B during a move along the print path.
+        # Compile the gradient formula once into a numpy function of the radius.
+        gradient_function = sy.lambdify(sy.symbols('r'), sy.sympify(gradient), 'numpy')
+
+        def exact_length(r0,r1,h):
+            """Calculates the exact length of an archimedean given the spacing, inner and outer radii.
+            SEE: http://www.giangrandi.ch/soft/spiral/spiral.shtml
+
+            Parameters
+            ----------
+            r0 : float or array
+                The inner diameter of the spiral.
+            r1 : float or array
+                The outer diameter of the spiral.
+            h  : float
+                The spacing of the spiral.
             """
+            #t0 & t1 are the respective diameters in terms of radians along the spiral.
+            t0 = 2*math.pi*np.asarray(r0)/h
+            t1 = 2*math.pi*np.asarray(r1)/h
+            return h/(2.0*math.pi)*(t1/2.0*np.sqrt(t1**2+1)+1/2.0*np.log(t1+np.sqrt(t1**2+1))-t0/2.0*np.sqrt(t0**2+1)-1/2.0*np.log(t0+np.sqrt(t0**2+1)))
+
+
+        def exact_radius(r_0,h,L):
+            """Calculates the exact outer radius of an archimedean given the spacing, inner radius and the length.
+            SEE: http://www.giangrandi.ch/soft/spiral/spiral.shtml
+
+            Parameters
+            ----------
+            r0 : float
+                The inner radius of the spiral.
+            h  : float
+                The spacing of the spiral.
+            L  : array
+                The lengths of the spiral.
+            """
+            d_0 = r_0*2
+            if d_0 == 0:
+                d_0 = 1e-10
 
-            def exact_length(r0,r1,h):
-                """Calculates the exact length of an archimedean given the spacing, inner and outer radii.
+            def exact_length(d0,d1,h):
+                """Calculates the exact length of an archimedean given the spacing, inner and outer diameters.
                 SEE: http://www.giangrandi.ch/soft/spiral/spiral.shtml
 
                 Parameters
                 ----------
-                r0 : float
+                d0 : float
                     The inner diameter of the spiral.
-                r1 : float
-                    The outer diameter of the spiral.
+                d1 : array
+                    The outer diameters of the spiral.
                 h  : float
                     The spacing of the spiral.
                 """
                 #t0 & t1 are the respective diameters in terms of radians along the spiral.
-                t0 = 2*math.pi*r0/h
-                t1 = 2*math.pi*r1/h
-                return h/(2.0*math.pi)*(t1/2.0*math.sqrt(t1**2+1)+1/2.0*math.log(t1+math.sqrt(t1**2+1))-t0/2.0*math.sqrt(t0**2+1)-1/2.0*math.log(t0+math.sqrt(t0**2+1)))
-
+                t0 = math.pi*d0/h
+                t1 = math.pi*d1/h
+                return h/(2.0*math.pi)*(t1/2.0*np.sqrt(t1**2+1)+1/2.0*np.log(t1+np.sqrt(t1**2+1))-t0/2.0*math.sqrt(t0**2+1)-1/2.0*math.log(t0+math.sqrt(t0**2+1)))
 
-            def exact_radius(r_0,h,L):
-                """Calculates the exact outer radius of an archimedean given the spacing, inner radius and the length.
+            def exact_length_derivative(d,h):
+                """Calculates the derivative of the exact length of an archimedean at a given diameter and spacing.
                 SEE: http://www.giangrandi.ch/soft/spiral/spiral.shtml
 
                 Parameters
                 ----------
-                r0 : float
-                    The inner radius of the spiral.
+                d : array
+                    The diameter points of interest in the spiral.
                 h  : float
                     The spacing of the spiral.
-                L  : float
-                    The length of the spiral.
                 """
-                d_0 = r_0*2
-                if d_0 == 0:
-                    d_0 = 1e-10
-                
-                def exact_length(d0,d1,h):
-                    """Calculates the exact length of an archimedean given the spacing, inner and outer diameters.
-                    SEE: http://www.giangrandi.ch/soft/spiral/spiral.shtml
-
-                    Parameters
-                    ----------
-                    d0 : float
-                        The inner diameter of the spiral.
-                    d1 : float
-                        The outer diameter of the spiral.
-                    h  : float
-                        The spacing of the spiral.
-                    """
-                    #t0 & t1 are the respective diameters in terms of radians along the spiral.
-                    t0 = math.pi*d0/h
-                    t1 = math.pi*d1/h
-                    return h/(2.0*math.pi)*(t1/2.0*math.sqrt(t1**2+1)+1/2.0*math.log(t1+math.sqrt(t1**2+1))-t0/2.0*math.sqrt(t0**2+1)-1/2.0*math.log(t0+math.sqrt(t0**2+1)))
-
-                def exact_length_derivative(d,h):
-                    """Calculates the derivative of the exact length of an archimedean at a given diameter and spacing.
-                    SEE: http://www.giangrandi.ch/soft/spiral/spiral.shtml
-
-                    Parameters
-                    ----------
-                    d : float
-                        The diameter point of interest in the spiral.
-                    h  : float
-                        The spacing of the spiral.
-                    """
-                    #t is diameter of interest in terms of radians along the spiral.
-                    t = math.pi*d/h
-                    dl_dt = h/(2.0*math.pi)*((2*t**2+1)/(2*math.sqrt(t**2+1))+(t+math.sqrt(t**2+1))/(2*t*math.sqrt(t**2+1)+2*t**2+2))
-                    dl_dd = h*dl_dt/math.pi
-                    return dl_dd
-
-                #Approximate radius (for first guess)
-                N = (h-d_0+math.sqrt((d_0-h)**2+4*h*L/math.pi))/(2*h)
-                D_1 = 2*N*h + d_0
-                tol = 1e-10
-
-                #Use Newton's Method to iterate until within tolerance
-                while True:
-                    f_df_dt = (exact_length(d_0,D_1,h)-L)/1000/exact_length_derivative(D_1,h)
-                    if f_df_dt < tol:
-                        break
-                    D_1 -= f_df_dt   
-                return D_1/2
-        
-            def rollover(val,limit,mode):
-                if val < limit: 
-                    if mode == 'max':
-                        return val
-                    elif mode == 'min':
-                        return limit+(limit-val)
-                    else:
-                        raise ValueError("'{}' is an incorrect selection for the mode".format(mode))
-                else:
-                    if mode == 'max':
-                        return limit-(val-limit)
-                    elif mode == 'min':
-                        return val
-                    else:
-                        raise ValueError("'{}' is an incorrect selection for the mode".format(mode))
+                #t is diameter of interest in terms of radians along the spiral.
+                t = math.pi*d/h
+                dl_dt = h/(2.0*math.pi)*((2*t**2+1)/(2*np.sqrt(t**2+1))+(t+np.sqrt(t**2+1))/(2*t*np.sqrt(t**2+1)+2*t**2+2))
+                dl_dd = h*dl_dt/math.pi
+                return dl_dd
+
+            #Approximate radius (for first guess)
+            L = np.asarray(L, dtype=float)
+            N = (h-d_0+np.sqrt((d_0-h)**2+4*h*L/math.pi))/(2*h)
+            D_1 = 2*N*h + d_0
+            tol = 1e-10
+
+            #Use Newton's Method to iterate until every radius is within tolerance
+            active = np.ones(D_1.shape, dtype=bool)
+            while active.any():
+                D_active = D_1[active]
+                f_df_dt = (exact_length(d_0,D_active,h)-L[active])/1000/exact_length_derivative(D_active,h)
+                # A NaN step can never converge, so treat it as finished.
+                converged = ~(f_df_dt >= tol)
+                D_active[~converged] -= f_df_dt[~converged]
+                D_1[active] = D_active
+                active[active] = ~converged
+            return D_1/2
+
+        def rollover(val,limit,mode):
+            if mode == 'max':
+                return np.where(val < limit, val, limit-(val-limit))
+            elif mode == 'min':
+                return np.where(val < limit, limit+(limit-val), val)
+            else:
+                raise ValueError("'{}' is an incorrect selection for the mode".format(mode))
+
+        def minor_fraction_calc(e,e_a=300,e_b=2.3,n=0.102,sr=0.6):
+            """Calculates the minor fraction (fraction of part b) required to achieve the
+            specified dielectric value
+
+            Parameters
+            ----------
+            e : float or array
+                Dielectric value of interest
+            e_a  : float
+                Dielectric value of part a
+            e_b. : float
+                Dielectric value of part b
+            n  : float
+                Morphology factor
+            sr : float
+                Fraction of SrTi03 in part a
+            """
+            return 1 - ((e-e_b)*((n-1)*e_b-n*e_a))/(sr*(e_b-e_a)*(n*(e-e_b)+e_b))
 
-            def minor_fraction_calc(e,e_a=300,e_b=2.3,n=0.102,sr=0.6):
-                """Calculates the minor fraction (fraction of part b) required to achieve the
-                specified dielectric value
+        # The total spiral lengths used to roll the delay over at either end
+        # do not depend on the segment, so compute them once.
+        outer_length = exact_length(0,end_diameter/2.0,spacing)
+        inner_length = exact_length(0,start_diameter/2.0,spacing)
+
+        def calculate_extrusion_values(radius, length, feed = feedrate, flow = flowrate, delay = dead_delay, spacing = spacing, start = start):
+            """Calculates the extrusion values for syringe pumps A & B for every move along the print path at once.
+            """
 
-                Parameters
-                ----------
-                e : float
-                    Dielectric value of interest
-                e_a  : float
-                    Dielectric value of part a
-                e_b. : float
-                    Dielectric value of part b
-                n  : float
-                    Morphology factor
-                sr : float
-                    Fraction of SrTi03 in part a
-                """
-                return 1 - ((e-e_b)*((n-1)*e_b-n*e_a))/(sr*(e_b-e_a)*(n*(e-e_b)+e_b))
-            
             """
             This is a key line of the extrusion values calculations.
             It starts off by calculating the exact length along the spiral for the current 
@@ -1427,13 +1612,13 @@ class G(object):
 
             """
             if start == 'center':
-                offset_radius = exact_radius(0,spacing,rollover(exact_length(0,radius,spacing)+delay,exact_length(0,outer_radius,spacing),'max'))
+                offset_radius = exact_radius(0,spacing,rollover(exact_length(0,radius,spacing)+delay,outer_length,'max'))
             else:
-                offset_radius = exact_radius(0,spacing,rollover(exact_length(0,radius,spacing)-delay,exact_length(0,inner_radius,spacing),'min'))
+                offset_radius = exact_radius(0,spacing,rollover(exact_length(0,radius,spacing)-delay,inner_length,'min'))
 
-            expr = sy.sympify(formula)
-            r = sy.symbols('r')
-            minor_fraction = np.clip(minor_fraction_calc(float(expr.subs(r,offset_radius))),0,1)
+            # A constant formula evaluates to a scalar, so broadcast it to every segment.
+            dielectric = np.broadcast_to(gradient_function(offset_radius), offset_radius.shape)
+            minor_fraction = np.clip(minor_fraction_calc(dielectric.astype(float)),0,1)
             line_flow = length/float(feed)*flow
             return [minor_fraction*line_flow,(1-minor_fraction)*line_flow,minor_fraction]
 
@@ -1466,43 +1651,45 @@ class G(object):
         else:
             raise Exception("Must either choose 'center' or 'edge' for starting position.")
         
+        #Compute every point of the spiral at once
+        x_moves, y_moves = self._spiral_points(t, b, start, direction, center_position)
+
         #Move to starting positon
-        if (direction == 'CW' and start == 'center') or (direction == 'CCW' and start == 'edge'):
-            x_move = -t[0]*b*math.cos(t[0])+center_position[0]
-        elif (direction == 'CCW' and start == 'center') or (direction == 'CW' and start == 'edge'):
-            x_move = t[0]*b*math.cos(t[0])+center_position[0]
-        else:
-            raise Exception("Must either choose 'CW' or 'CCW' for spiral direction.")
-        y_move = t[0]*b*math.sin(t[0])+center_position[1]
-        self.move(x_move, y_move)
+        self.move(x_moves[0], y_moves[0])
 
         #Start writing moves
         self.feed(feedrate)
-        syringe_extrusion = np.array([0.0,0.0])
 
         #Zero a & b axis before printing, we do this so it can easily do multiple layers without quickly jumping back to 0
         #Would likely be useful to change this to relative coordinates at some point
         self.write('G92 a0 b0')
 
-        for step in t[1:]:
-            if (direction == 'CW' and start == 'center') or (direction == 'CCW' and start == 'edge'):
-                x_move = -step*b*math.cos(step)+center_position[0]
-            elif (direction == 'CCW' and start == 'center') or (direction == 'CW' and start == 'edge'):
-                x_move = step*b*math.cos(step)+center_position[0]
-            else:
-                raise Exception("Must either choose 'CW' or 'CCW' for spiral direction.")
-            y_move = step*b*math.sin(step)+center_position[1]
-            
-            radius_pos = np.sqrt((self._current_position['x']-center_position[0])**2 + (self._current_position['y']-center_position[1])**2)
-            line_length = np.sqrt((x_move-self._current_position['x'])**2 + (y_move-self._current_position['y'])**2)
-            extrusion_values = calculate_extrusion_values(radius_pos,line_length)
-            syringe_extrusion += extrusion_values[:2]
-            self.move(x_move, y_move, a=syringe_extrusion[0],b=syringe_extrusion[1],color=extrusion_values[2])
+        #Each segment starts at the previous point of the spiral
+        radius_pos = np.sqrt((x_moves[:-1]-center_position[0])**2 + (y_moves[:-1]-center_position[1])**2)
+        line_length = np.sqrt(np.diff(x_moves)**2 + np.diff(y_moves)**2)
+        extrusion_a, extrusion_b, minor_fraction = calculate_extrusion_values(radius_pos, line_length)
+        syringe_extrusion = np.cumsum(np.column_stack([extrusion_a, extrusion_b]), axis=0)
+        self.moves(np.column_stack([x_moves[1:], y_moves[1:], syringe_extrusion]),
+                   axes=('x', 'y', 'a', 'b'), colors=minor_fraction)
         
         #Set back to relative mode if it was previsously before command was called
         if was_relative:
                 self.relative()
 
+    def _spiral_points(self, t, b, start, direction, center_position):
+        """ Returns the x and y coordinates of an archimedean spiral with
+        spacing `2*pi*b` at the angles `t`, used by `spiral` and
+        `gradient_spiral`.
+        """
+        if (direction == 'CW' and start == 'center') or (direction == 'CCW' and start == 'edge'):
+            x_moves = -t*b*np.cos(t)+center_position[0]
+        elif (direction == 'CCW' and start == 'center') or (direction == 'CW' and start == 'edge'):
+            x_moves = t*b*np.cos(t)+center_position[0]
+        else:
+            raise Exception("Must either choose 'CW' or 'CCW' for spiral direction.")
+        y_moves = t*b*np.sin(t)+center_position[1]
+        return x_moves, y_moves
+
     def purge_meander(self, x, y, spacing, volume_fraction, flowrate, start='LL', orientation='x',
             tail=False, minor_feed=None):
         self.write('FREERUN a {}'.format(flowrate*volume_fraction))
@@ -1518,7 +1705,7 @@ class G(object):
         """ Gets the current position of the specified `axis`.
         """
         cmd = 'AXISSTATUS({}, DATAITEM_PositionFeedback)'.format(axis.upper())
-        pos = self.write(cmd)
+        pos = self.write(cmd, resp_needed=True)
         return float(pos)
 
     def set_cal_file(self, path):
@@ -1546,11 +1733,11 @@ class G(object):
         >>> g.toggle_pressure(3)
 
         """
-        self.write('Call togglePress P{}'.format(com_port))
         if self.extruding[0] == com_port:
             self.extruding = [com_port, not self.extruding[1]]
         else:
             self.extruding = [com_port,True]
+        self.write('Call togglePress P{}'.format(com_port))
 
     def set_pressure(self, com_port, value):
         """ Sets pressure on Nordson Ultimus V Pressure Controllers.
@@ -1682,6 +1869,7 @@ class G(object):
         >>> g.gen_geometry('test.scad')
 
         """
+        self._check_history()
         import solid as sld
         from solid import utils as sldutils
 
@@ -1704,13 +1892,13 @@ class G(object):
         filament_cross = circle(radius=filament_diameter/2)
 
         extruding_hist = dict(self.extruding_history)
-        position_hist = np.array(self.position_history)
+        position_hist = self.position_history.array
 
         #Stepping through all moves after initial position
         extruding_state = False
-        for index, (pos, color) in enumerate(zip(self.position_history[1:cut_point],self.color_history[1:cut_point]),1):
+        for index, (pos, color) in enumerate(zip(position_hist[1:cut_point],self.color_history[1:cut_point]),1):
             sys.stdout.write('\r')
-            sys.stdout.write("Exporting model: {:.0f}%".format(index/len(self.position_history[1:])*100))
+            sys.stdout.write("Exporting model: {:.0f}%".format(index/(len(position_hist)-1)*100))
             sys.stdout.flush()
             #print("{}/{}".format(index,len(self.position_history[1:])))
             if index in extruding_hist:
@@ -1948,12 +2136,13 @@ class G(object):
         >>> geometry_def = g.meander()
 
         """
+        self._check_history()
         extruding_hist = dict(self.extruding_history)
-        position_hist = self.position_history
+        position_hist = self.position_history.array
         cut_ranges=list(extruding_hist)[1:]
         final_coords = []
         for i in range(0,len(cut_ranges),2):
-            final_coords.append(position_hist[cut_ranges[i]-1:cut_ranges[i+1]])
+            final_coords.append(position_hist[cut_ranges[i]-1:cut_ranges[i+1]].tolist())
         final_coords_dict = []
         for i in final_coords:
             keys = ['X','Y','Z']
@@ -1962,6 +2151,53 @@ class G(object):
 
     # Public Interface  #######################################################
 
+    def _view_groups(self, hide_travel=False, color_on=True):
+        """ Group the moves in the history by how the matplotlib backends
+        draw them, and return a list of (segments, style) pairs. `segments`
+        is an array of shape (N, 2, 3) holding the start and end of each
+        move, and `style` the keyword arguments of its line collection.
+        """
+        history = self.position_history.array
+        segments = np.stack([history[:-1], history[1:]], axis=1)
+
+        # The extruding state of each move, from the entries recorded where
+        # it changed. The last entry for an index wins.
+        extruding = np.zeros(len(segments), dtype=bool)
+        changes = [(index, state[1]) for index, state in self.extruding_history
+                   if index >= 1]
+        if changes:
+            indices, states = zip(*changes)
+            latest = np.searchsorted(indices, np.arange(1, len(history)),
+                                     side='right') - 1
+            extruding = np.where(latest >= 0, np.array(states, dtype=bool)[latest],
+                                 False)
+
+        groups = []
+        if not hide_travel and not extruding.all():
+            groups.append((segments[~extruding],
+                           dict(colors='k', linestyles='--', linewidths=0.5)))
+        moves = np.flatnonzero(extruding)
+        if len(moves) == 0:
+            return groups
+        if not color_on:
+            groups.append((segments[moves], dict(colors='b')))
+            return groups
+
+        colors = self.color_history.array
+        by_color = OrderedDict()
+        for move in moves.tolist():
+            color = colors[move + 1]
+            try:
+                group = by_color.setdefault(color, [])
+            except TypeError:  # an unhashable color, like a list
+                color = tuple(np.ravel(color).tolist())
+                group = by_color.setdefault(color, [])
+            group.append(move)
+        for color, members in by_color.items():
+            style = {} if color is None else dict(colors=[color])
+            groups.append((segments[members], style))
+        return groups
+
     def view(self, backend='matplotlib', outfile=None, hide_travel=False,color_on=True, nozzle_cam=False,
              fast_forward = 3, framerate = 60, nozzle_dims=[1.0,20.0], 
              substrate_dims=[0.0,0.0,-1.0,300,1,300], scene_dims = [720,720]):
@@ -2005,33 +2241,20 @@ class G(object):
             format: [width, height]
 
         """
+        self._check_history()
         import matplotlib.cm as cm
         from mpl_toolkits.mplot3d import Axes3D
         import matplotlib.pyplot as plt
-        history = np.array(self.position_history)
+        history = self.position_history.array
 
         if backend == 'matplotlib':
+            from mpl_toolkits.mplot3d.art3d import Line3DCollection
             fig = plt.figure()
             ax = fig.add_subplot(projection='3d')
 
-            extruding_hist = dict(self.extruding_history)
-            #Stepping through all moves after initial position
-            extruding_state = False
-            for index, (pos, color) in enumerate(zip(history[1:],self.color_history[1:]),1):
-                if index in extruding_hist:
-                    extruding_state =  extruding_hist[index][1]
-
-                X, Y, Z = history[index-1:index+1, 0], history[index-1:index+1, 1], history[index-1:index+1, 2]
-
-                if extruding_state:
-                    if color_on:
-                        # ax.plot(X, Y, Z,color = cm.gray(self.color_history[index])[:-1])
-                        ax.plot(X, Y, Z,color = self.color_history[index])
-                    else:
-                        ax.plot(X, Y, Z,'b')
-                else:
-                    if not hide_travel:
-                        ax.plot(X,Y,Z,'k--',linewidth=0.5)
+            # One collection per line style instead of one line per move.
+            for segments, style in self._view_groups(hide_travel, color_on):
+                ax.add_collection3d(Line3DCollection(segments, **style))
 
             X, Y, Z = history[:, 0], history[:, 1], history[:, 2]
 
@@ -2056,6 +2279,25 @@ class G(object):
             else:
                 plt.savefig(outfile,dpi=500)
 
+        elif backend == 'matplotlib2d':
+            from matplotlib.collections import LineCollection
+            fig = plt.figure()
+            ax = fig.add_subplot()
+
+            # The moves seen from above.
+            for segments, style in self._view_groups(hide_travel, color_on):
+                ax.add_collection(LineCollection(segments[:, :, :2], **style))
+
+            ax.autoscale()
+            ax.set_aspect('equal')
+            ax.set_xlabel("X")
+            ax.set_ylabel("Y")
+
+            if outfile == None:
+                plt.show()
+            else:
+                plt.savefig(outfile,dpi=500)
+
         elif backend == 'mayavi':
             from mayavi import mlab
             mlab.plot3d(history[:, 0], history[:, 1], history[:, 2])
@@ -2071,7 +2313,8 @@ class G(object):
             vp.scene.forward = vp.vec(-1,-1,-1) 
             vp.scene.background = vp.vec(1,1,1)
 
-            position_hist = history
+            # Copy, since the axes are swapped in place below.
+            position_hist = np.array(history)
             speed_hist = dict(self.speed_history)
             extruding_hist = dict(self.extruding_history)
             extruding_state = False
@@ -2233,32 +2476,99 @@ class G(object):
     def write(self, statement_in, resp_needed=False):
         if self.print_lines is True or (self.print_lines == 'auto' and self.outfile is None):
             print(statement_in)
+        if self._commands is not None:
+            self._record_command(statement_in)
         self._write_out(statement_in)
-        statement = encode2To3(statement_in + self.lineend)
         if self.direct_write is True:
-            if self.direct_write_mode == 'socket':
-                if self._socket is None:
-                    import socket
-                    self._socket = socket.socket(socket.AF_INET,
-                                                socket.SOCK_STREAM)
-                    self._socket.connect((self.printer_host, self.printer_port))
-                self._socket.send(statement)
-                if self.two_way_comm is True:
-                    response = self._socket.recv(8192)
-                    response = decode2To3(response)
-                    if response[0] != '%':
-                        raise RuntimeError(response)
-                    return response[1:-1]
-            elif self.direct_write_mode == 'serial':
-                if self._p is None:
-                    from .printer import Printer
-                    self._p = Printer(self.printer_port, self.baudrate)
-                    self._p.connect()
-                    self._p.start()
-                if resp_needed:
-                    return self._p.get_response(statement_in)
+            return self._direct_write(statement_in, resp_needed)
+
+    def _write_lines(self, statements, positions=None, e=None, colors=None):
+        """ Write several statements at once. Output to stdout and the outfile
+        happens in a single call, while direct write still sends each
+        statement separately.
+
+        `positions`, `e` and `colors` give the state after each statement for
+        the command log. If they are omitted, the current state is used.
+        """
+        if self.print_lines is True or (self.print_lines == 'auto' and self.outfile is None):
+            print('\n'.join(statements))
+        if self._commands is not None:
+            if positions is None:
+                for statement in statements:
+                    self._record_command(statement)
+            else:
+                self._commands.extend(statements, self.is_relative, positions,
+                                      e, self.speed, bool(self.extruding[1]),
+                                      colors)
+        if self.out_fd is not None and statements:
+            # The statements are generated without trailing whitespace, so
+            # they can be joined directly.
+            self._write_block(self.lineend.join(statements) + self.lineend,
+                              len(statements))
+        if self.direct_write is True:
+            for statement in statements:
+                self._direct_write(statement)
+
+    def _direct_write(self, statement_in, resp_needed=False):
+        """ Send a single statement to the printer over the configured
+        channel, returning the response if there is one.
+        """
+        statement = encode2To3(statement_in + self.lineend)
+        if self.direct_write_mode == 'socket' and self.two_way_comm is True \
+                and self.socket_window > 0:
+            if self._socket is None:
+                from .socket_transport import SocketTransport
+                self._socket = SocketTransport(self.printer_host,
+                                               self.printer_port,
+                                               window=self.socket_window,
+                                               lineend=self.lineend)
+                self._socket.connect()
+            response = self._socket.send(statement_in)
+            if resp_needed:
+                return response.result()
+            return response
+        elif self.direct_write_mode == 'socket':
+            if self._socket is None:
+                import socket
+                self._socket = socket.socket(socket.AF_INET,
+                                            socket.SOCK_STREAM)
+                self._socket.connect((self.printer_host, self.printer_port))
+            self._socket.send(statement)
+            if self.two_way_comm is True:
+                response = self._socket.recv(8192)
+                response = decode2To3(response)
+                if response[0] != '%':
+                    raise RuntimeError(response)
+                return response[1:-1]
+        elif self.direct_write_mode == 'serial':
+            if self._p is None:
+                from .printer import Printer, PrinterGroup
+                if isinstance(self.printer_port, (list, tuple)):
+                    self._p = PrinterGroup([
+                        Printer(port, self.baudrate,
+                                rx_buffer_size=self.printer_rx_buffer_size)
+                        for port in self.printer_port])
                 else:
-                    self._p.sendline(statement_in)
+                    self._p = Printer(self.printer_port, self.baudrate,
+                                      rx_buffer_size=self.printer_rx_buffer_size)
+                self._p.connect()
+                self._p.start()
+            if resp_needed:
+                return self._p.get_response(statement_in)
+            else:
+                self._p.sendline(statement_in)
+
+    def flush(self):
+        """ Write any buffered output lines and flush the outfile. When
+        sending over a pipelined socket, also wait for all outstanding
+        responses.
+        """
+        if self.out_fd is not None:
+            self._flush_out_buffer()
+            if hasattr(self.out_fd, 'flush'):
+                self.out_fd.flush()
+        if self._socket is not None and hasattr(self._socket, 'wait'):
+            self._socket.wait()
 
     def rename_axis(self, x=None, y=None, z=None):
         """ Replaces the x, y, or z axis with the given name.
@@ -2277,6 +2587,7 @@ class G(object):
         else:
             msg = 'Must specify new name for x, y, or z only'
             raise RuntimeError(msg)
+        self._arg_formatters.clear()
 
     # Private Interface  ######################################################
 
@@ -2287,14 +2598,41 @@ class G(object):
         if self.out_fd is None:
             return
 
-        if lines is not None:
-            for line in lines:
-                self._write_out(line)
+        if lines is None:
+            self._write_block(line.rstrip() + self.lineend, 1)  # add lineend character
+        elif lines:
+            lineend = self.lineend
+            self._write_block(''.join([line.rstrip() + lineend for line in lines]),
+                              len(lines))
 
-        line = line.rstrip() + self.lineend  # add lineend character
-        if hasattr(self.out_fd, 'mode') and 'b' in self.out_fd.mode:  # encode the string to binary if needed
-            line = encode2To3(line)
-        self.out_fd.write(line)
+    def _write_block(self, block, count):
+        """ Writes `block`, which holds `count` complete lines, to the output
+        file or the output buffer.
+        """
+        if self.buffer_lines > 0 or self.buffer_size > 0:
+            self._out_buffer.append(block)
+            self._out_buffer_lines += count
+            self._out_buffer_chars += len(block)
+            if (0 < self.buffer_lines <= self._out_buffer_lines
+                    or 0 < self.buffer_size <= self._out_buffer_chars):
+                self._flush_out_buffer()
+        elif self._out_binary:  # encode the string to binary if needed
+            self.out_fd.write(encode2To3(block))
+        else:
+            self.out_fd.write(block)
+
+    def _flush_out_buffer(self):
+        """ Writes all buffered lines to the output file in a single call.
+        """
+        if not self._out_buffer:
+            return
+        block = ''.join(self._out_buffer)
+        self._out_buffer = []
+        self._out_buffer_lines = 0
+        self._out_buffer_chars = 0
+        if self._out_binary:
+            block = encode2To3(block)
+        self.out_fd.write(block)
 
 
     def _meander_passes(self, minor, spacing):
@@ -2315,24 +2653,68 @@ class G(object):
             with open(self.header) as fd:
                 self._write_out(lines=fd.readlines())
 
+    def _record_command(self, statement):
+        """ Add `statement` to the command log with the current state, which
+        every command method updates before writing.
+        """
+        cp = self._current_position
+        self._commands.append(statement, self.is_relative,
+                              (cp.get('x', 0.0), cp.get('y', 0.0), cp.get('z', 0.0)),
+                              cp.get('E', 0.0), self.speed,
+                              bool(self.extruding[1]), self._last_color)
+
+    def _check_history(self):
+        if not self.record_history:
+            msg = 'History is not recorded when record_history is False'
+            raise RuntimeError(msg)
+
     def _format_args(self, x=None, y=None, z=None, i=None, j=None, k=None, **kwargs):
-        d = self.output_digits
-        args = []
+        names = []
+        values = []
         if x is not None:
-            args.append('{0}{1:.{digits}f}'.format(self.x_axis, x, digits=d))
+            names.append('x')
+            values.append(x)
         if y is not None:
-            args.append('{0}{1:.{digits}f}'.format(self.y_axis, y, digits=d))
+            names.append('y')
+            values.append(y)
         if z is not None:
-            args.append('{0}{1:.{digits}f}'.format(self.z_axis, z, digits=d))
+            names.append('z')
+            values.append(z)
         if i is not None:
-            args.append('{0}{1:.{digits}f}'.format(self.i_axis, i, digits=d))
+            names.append('i')
+            values.append(i)
         if j is not None:
-            args.append('{0}{1:.{digits}f}'.format(self.j_axis, j, digits=d))
+            names.append('j')
+            values.append(j)
         if k is not None:
-            args.append('{0}{1:.{digits}f}'.format(self.k_axis, k, digits=d))
-        args += ['{0}{1:.{digits}f}'.format(k, kwargs[k], digits=d) for k in sorted(kwargs)]
-        args = ' '.join(args)
-        return args
+            names.append('k')
+            values.append(k)
+        if kwargs:
+            names.extend(kwargs)
+            values.extend(kwargs.values())
+        return self._arg_formatter(tuple(names)).format(*values)
+
+    def _arg_formatter(self, names):
+        """ Returns a format string that formats values given in the order of
+        `names` as GCode arguments. The format strings are compiled once per
+        combination of names and `output_digits` and cached until an axis is
+        renamed.
+        """
+        key = (names, self.output_digits)
+        fmt = self._arg_formatters.get(key)
+        if fmt is None:
+            axes = {'x': self.x_axis, 'y': self.y_axis, 'z': self.z_axis,
+                    'i': self.i_axis, 'j': self.j_axis, 'k': self.k_axis}
+            # Named axes come first in xyzijk order, followed by any other
+            # arguments in sorted order.
+            order = [n for n in 'xyzijk' if n in names]
+            order += sorted(n for n in names if n not in axes)
+            fields = ['{0}{{{1}:.{2}f}}'.format(axes.get(n, n), names.index(n),
+                                                self.output_digits)
+                      for n in order]
+            fmt = ' '.join(fields)
+            self._arg_formatters[key] = fmt
+        return fmt
 
     def _update_current_position(self, mode='auto', x=None, y=None, z=None, color = None,
                                  **kwargs):
@@ -2365,17 +2747,87 @@ class G(object):
             for dimention, delta in kwargs.items():
                 self._current_position[dimention] = delta
 
+        self._last_color = color
+        if not self.record_history:
+            return
+
         x = self._current_position['x']
         y = self._current_position['y']
         z = self._current_position['z']
 
         self.position_history.append((x, y, z))
         self.color_history.append(color)
+        self._record_state_changes(len(self.position_history) - 1)
+
+    def _update_positions(self, points, axes, colors):
+        """ Vectorized counterpart of `_update_current_position` for a block of
+        moves, where column `n` of `points` holds the values for `axes[n]`.
 
-        len_history = len(self.position_history)
+        Returns the absolute x, y, z positions and E values after each move
+        if they are needed for the command log, otherwise None.
+        """
+        cp = self._current_position
+        renamed = {'x': self.x_axis != 'X' and self.x_axis,
+                   'y': self.y_axis != 'Y' and self.y_axis,
+                   'z': self.z_axis != 'Z' and self.z_axis}
+        tracks = {}
+        for column, name in zip(points.T, axes):
+            for dimension in (name, renamed.get(name)):
+                if not dimension:
+                    continue
+                if self.is_relative:
+                    # Accumulate from the current position so the result
+                    # matches a sequence of single moves exactly.
+                    track = np.cumsum(np.concatenate([[cp[dimension]], column]))[1:]
+                else:
+                    track = column
+                tracks[dimension] = track
+                cp[dimension] = float(track[-1])
+
+        self._last_color = colors[-1]
+        if not self.record_history and self._commands is None:
+            return None
+
+        positions = np.empty((len(points), 3))
+        for index, dimension in enumerate('xyz'):
+            positions[:, index] = tracks.get(dimension, cp[dimension])
+        if self.record_history:
+            first_index = len(self.position_history)
+            self.position_history.extend(positions)
+            self.color_history.extend(colors)
+            self._record_state_changes(first_index)
+        return positions, tracks.get('E', cp.get('E', 0.0))
+
+    def _record_state_changes(self, index):
+        """ Note the speed and extruding state at history entry `index` if
+        either changed since it was last recorded.
+        """
         if (len(self.speed_history) == 0
             or self.speed_history[-1][1] != self.speed):
-            self.speed_history.append((len_history - 1, self.speed))
+            self.speed_history.append((index, self.speed))
         if (len(self.extruding_history) == 0
             or self.extruding_history[-1][1] != self.extruding):
-            self.extruding_history.append((len_history - 1, self.extruding))
+            self.extruding_history.append((index, self.extruding))
+
+    def _extrusion_lengths(self, points, axes):
+        """ Vectorized counterpart of the flow calculation in `move`, returning
+        the E value for every row of `points`.
+        """
+        cp = self._current_position
+        distances = []
+        for name in ('x', 'y'):
+            if name not in axes:
+                continue
+            column = points[:, axes.index(name)]
+            if self.is_relative:
+                distances.append(column)
+            else:
+                distances.append(np.diff(np.concatenate([[cp[name]], column])))
+        line_length = np.sqrt(sum(d**2 for d in distances)) if distances else np.zeros(len(points))
+        area = self.layer_height*(self.extrusion_width-self.layer_height) + \
+            3.14159*(self.layer_height/2)**2
+        volume = line_length*area
+        filament_length = ((4*volume)/(3.14149*self.filament_diameter**2))*self.extrusion_multiplier
+        if self.is_relative:
+            return filament_length
+        return np.cumsum(np.concatenate([[cp['E']], filament_length]))[1:]
@@ -1,14 +1,18 @@
-
 import math
-import copy
 import numpy as np
-from wheecode import G
+from wheecode import G, is_str
+
+# The index of each axis in a point and of the axis normal to each plane.
+_AXIS_INDEX = {'x': 0, 'y': 1, 'z': 2}
+
+# How far a transformation may be from keeping an arc's plane, relative to
+# its scale, and still have the arc written as G2/G3.
+_PLANE_TOLERANCE = 1e-9
+
 
 class GMatrix(G):
-    """This class passes points through a 2D transformation matrix before
-    fowarding them to the G class.  A 2D transformation matrix was
-    choosen over a 3D transformation matrix because GCode's ARC
-    command cannot be arbitrary rotated in a 3 dimensions.
+    """This class passes points through a 3D transformation before
+    fowarding them to the G class.
 
     This lets you write code like:
 
@@ -27,8 +31,20 @@ class GMatrix(G):
 
     To get two boxes at a 45 degree angle from each other.
 
-    The 2D transformation matrices are arranged in a stack,
-    similar to OpenGL.
+    The transformations are 4x4 homogeneous matrices arranged in a stack,
+    similar to OpenGL. `translate` moves the origin of the current coordinate
+    system, while `rotate`, `scale`, `reflect` and `shear` act about that
+    origin, after the transformations already on the stack.
+
+    GCode's arc commands cannot be rotated arbitrarily in 3 dimensions, so
+    an arc is only written as G2/G3 when the transformation keeps its plane
+    and its shape, e.g. a rotation about the axis normal to the plane, a
+    reflection or a uniform scale. Otherwise it is broken up into straight
+    moves, which are transformed like any other.
+
+    As long as only rotations about the Z axis, uniform scales, reflections
+    and translations in XY are applied, Z passes through untouched and moves
+    are written exactly as with a 2D transformation.
 
     numpy is required.
 
@@ -37,8 +53,8 @@ class GMatrix(G):
         super(GMatrix, self).__init__(*args, **kwargs)
         self._matrix_setup()
         self.position_savepoints = []
-        
-    # Position savepoints #####################################################        
+
+    # Position savepoints #####################################################
     def save_position(self):
         self.position_savepoints.append((self.current_position["x"],
                                          self.current_position["y"],
@@ -49,31 +65,159 @@ class GMatrix(G):
         self.abs_move(return_position[0], return_position[1], return_position[2])
 
 
-    # Matrix manipulation #####################################################        
+    # Matrix manipulation #####################################################
     def _matrix_setup(self):
         " Create our matrix stack. "
-        self.matrix_stack = [np.matrix([[1.0, 0], [0.0, 1.0]])]
+        self.matrix_stack = [np.identity(4)]
+        # The coefficients, inverse and properties of each matrix in the
+        # stack, worked out when first needed.
+        self._matrix_cache = [None]
 
     def push_matrix(self):
         " Push a copy of our current transformation matrix. "
-        self.matrix_stack.append(copy.deepcopy(self.matrix_stack[-1]))
+        # Matrices are replaced rather than modified, so the copy can share
+        # the array and its cache.
+        self.matrix_stack.append(self.matrix_stack[-1])
+        self._matrix_cache.append(self._matrix_cache[-1])
 
     def pop_matrix(self):
         " Pop the matrix stack. "
         self.matrix_stack.pop()
+        self._matrix_cache.pop()
+
+    def _set_matrix(self, matrix):
+        " Replace the current transformation matrix. "
+        self.matrix_stack[-1] = matrix
+        self._matrix_cache[-1] = None
+
+    def _matrix_info(self):
+        """ Return the coefficients of the linear part of the current matrix
+        as a flat tuple (row by row), its translation (tx, ty, tz), the
+        coefficients of the inverse of the linear part, and whether the
+        matrix is planar, i.e. leaves Z alone and keeps XY in XY.
+        """
+        info = self._matrix_cache[-1]
+        if info is None:
+            matrix = self.matrix_stack[-1]
+            linear = matrix[:3, :3]
+            planar = (not linear[:2, 2].any() and not linear[2, :2].any()
+                      and linear[2, 2] == 1 and matrix[2, 3] == 0)
+            if planar:
+                inverse = np.identity(3)
+                inverse[:2, :2] = np.linalg.inv(linear[:2, :2])
+            else:
+                inverse = np.linalg.inv(linear)
+            info = (tuple(linear.ravel().tolist()),
+                    tuple(matrix[:3, 3].tolist()),
+                    tuple(inverse.ravel().tolist()),
+                    planar)
+            self._matrix_cache[-1] = info
+        return info
+
+    def _apply_linear(self, linear):
+        """ Apply the 3x3 `linear` transformation about the current origin,
+        after the current transformation.
+        """
+        matrix = self.matrix_stack[-1].copy()
+        if not linear[:2, 2].any() and not linear[2, :2].any() and linear[2, 2] == 1:
+            # Z is left alone, so only the XY part needs updating. This
+            # also keeps planar transformations bit for bit the same as
+            # their 2D products.
+            # The translation is not transformed, the origin stays put.
+            matrix[:2, :2] = linear[:2, :2].dot(matrix[:2, :2])
+            matrix[:2, 2] = linear[:2, :2].dot(matrix[:2, 2])
+        else:
+            matrix[:3, :3] = linear.dot(matrix[:3, :3])
+        self._set_matrix(matrix)
+
+    def translate(self, x=0, y=0, z=0):
+        """ Move the origin of the current coordinate system by the given
+        offset, measured in the current coordinate system.
+
+        Example
+        -------
+        >>> # draw the same square at two places
+        >>> g.push_matrix()
+        >>> g.translate(20, 0)
+        >>> g.rect(10, 10)
+        >>> g.pop_matrix()
+
+        """
+        translation = np.identity(4)
+        translation[:3, 3] = (x, y, z)
+        self._set_matrix(self.matrix_stack[-1].dot(translation))
 
-    def rotate(self, angle):
-        """Rotate the current transformation matrix around the Z
-        axis, in radians. """
-        rotation_matrix = np.matrix([[math.cos(angle), -math.sin(angle)],
-                                     [math.sin(angle), math.cos(angle)]])
+    def rotate(self, angle, axis='z'):
+        """Rotate the current transformation matrix around the given axis,
+        in radians. The axis is 'x', 'y', 'z' or a vector (x, y, z), and
+        goes through the current origin.
 
-        self.matrix_stack[-1] = rotation_matrix * self.matrix_stack[-1]
+        Example
+        -------
+        >>> # tilt the XY plane by 45 degrees about the X axis
+        >>> g.rotate(math.pi/4, axis='x')
+        >>> # rotate about the diagonal of the XY plane
+        >>> g.rotate(math.pi/2, axis=(1, 1, 0))
 
-    def scale(self, scale):
-        " Scale the current transformation matrix. "
-        scale_matrix = np.identity(2) * scale
-        self.matrix_stack[-1] = scale_matrix * self.matrix_stack[-1]
+        """
+        cos, sin = math.cos(angle), math.sin(angle)
+        if not is_str(axis):
+            # Rodrigues' rotation formula.
+            u = np.asarray(axis, dtype=float)
+            u = u / np.linalg.norm(u)
+            cross = np.array([[0, -u[2], u[1]],
+                              [u[2], 0, -u[0]],
+                              [-u[1], u[0], 0]])
+            rotation_matrix = (cos * np.identity(3) + sin * cross
+                               + (1 - cos) * np.outer(u, u))
+        elif axis == 'z':
+            rotation_matrix = np.array([[cos, -sin, 0],
+                                        [sin, cos, 0],
+                                        [0, 0, 1]])
+        elif axis == 'x':
+            rotation_matrix = np.array([[1, 0, 0],
+                                        [0, cos, -sin],
+                                        [0, sin, cos]])
+        elif axis == 'y':
+            rotation_matrix = np.array([[cos, 0, sin],
+                                        [0, 1, 0],
+                                        [-sin, 0, cos]])
+        else:
+            raise ValueError('Unknown axis {!r}'.format(axis))
+
+        self._apply_linear(rotation_matrix)
+
+    def scale(self, scale, y=None, z=1):
+        """ Scale the current transformation matrix. With a single factor X
+        and Y are scaled uniformly and Z is left alone, otherwise the X, Y
+        and Z factors are given separately.
+
+        Example
+        -------
+        >>> # double the size of everything in XY
+        >>> g.scale(2)
+        >>> # stretch X and squash Z
+        >>> g.scale(2, 1, 0.5)
+
+        """
+        if y is None:
+            y = scale
+        self._apply_linear(np.diag([scale, y, z]).astype(float))
+
+    def shear(self, xy=0, xz=0, yx=0, yz=0, zx=0, zy=0):
+        """ Shear the current transformation matrix. Each factor is named
+        after the axis that is moved and the axis it is moved along with,
+        e.g. `xz` adds that many times z to x.
+
+        Example
+        -------
+        >>> # lean parts forward by 10 degrees as they grow in z
+        >>> g.shear(xz=math.tan(math.radians(10)))
+
+        """
+        self._apply_linear(np.array([[1, xy, xz],
+                                     [yx, 1, yz],
+                                     [zx, zy, 1]], dtype=float))
 
     def reflect(self, angle):
         """ Reflect about the line starting from the origin at given angle
@@ -97,33 +241,81 @@ class GMatrix(G):
         # In our case, t is the given angle plus the current angle between vector [1,0]
         # and the absolute x axis, i.e. the angle of the current coordinate system.
 
-        # So first, we get that angle
-        x_axis = self.matrix_stack[-1] * np.matrix([1, 0]).T
-        x_angle = math.atan2(x_axis.item(1), x_axis.item(0))
+        # So first, we get that angle, from the image of [1, 0], which is the
+        # first column of the matrix.
+        (a, _, _, c, _, _, _, _, _), _, _, _ = self._matrix_info()
+        x_angle = math.atan2(c, a)
 
         # Now we can set 2t in our adjusted coordinate system
         tt = 2 * (x_angle + angle)
 
-        reflection_matrix = np.matrix([[math.cos(tt), math.sin(tt)],
-                                       [math.sin(tt), -1 * math.cos(tt)]])
+        reflection_matrix = np.array([[math.cos(tt), math.sin(tt), 0],
+                                      [math.sin(tt), -1 * math.cos(tt), 0],
+                                      [0, 0, 1]])
 
-        self.matrix_stack[-1] = reflection_matrix * self.matrix_stack[-1]
+        self._apply_linear(reflection_matrix)
 
-    def _matrix_transform(self, x, y, z):
-        "Transform an x,y,z coordinate by our transformation matrix."
-        matrix = self.matrix_stack[-1]
+    def _matrix_transform(self, x, y, z, translate=False):
+        """Transform an x,y,z coordinate by our transformation matrix, with
+        its translation if `translate` is True, e.g. for absolute positions.
+        Missing coordinates count as 0, except for z which is passed through
+        as long as the matrix is planar."""
+        l, t, _, planar = self._matrix_info()
 
         if x is None: x = 0
         if y is None: y = 0
 
-        transform = matrix * np.matrix([x, y]).T
-        
-        return (transform.item(0), transform.item(1), z)
+        if planar:
+            x_prime, y_prime = l[0] * x + l[1] * y, l[3] * x + l[4] * y
+            if translate and (t[0] or t[1]):
+                x_prime += t[0]
+                y_prime += t[1]
+            return (x_prime, y_prime, z)
+
+        if z is None: z = 0
+        point = (l[0] * x + l[1] * y + l[2] * z,
+                 l[3] * x + l[4] * y + l[5] * z,
+                 l[6] * x + l[7] * y + l[8] * z)
+        if translate:
+            point = (point[0] + t[0], point[1] + t[1], point[2] + t[2])
+        return point
 
     def _matrix_transform_length(self, length):
         (x,y,z) = self._matrix_transform(length, 0, 0)
         return math.sqrt(x**2 + y**2 + z**2)
 
+    def transform_points(self, points, translate=True):
+        """ Transform an array of points by the current transformation
+        matrix in one go.
+
+        Parameters
+        ----------
+        points : array_like of shape (N, 3)
+            The x, y and z coordinates of the points.
+        translate : bool (default: True)
+            Whether to apply the translation, as for absolute positions.
+            Relative moves are transformed without it.
+
+        Returns
+        -------
+        transformed : ndarray of shape (N, 3)
+
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        l, t, _, planar = self._matrix_info()
+        x, y, z = points.T
+        if planar:
+            result = np.column_stack([l[0] * x + l[1] * y, l[3] * x + l[4] * y, z])
+            if translate and (t[0] or t[1]):
+                result[:, :2] += t[:2]
+            return result
+        result = np.column_stack([l[0] * x + l[1] * y + l[2] * z,
+                                  l[3] * x + l[4] * y + l[5] * z,
+                                  l[6] * x + l[7] * y + l[8] * z])
+        if translate:
+            result += t
+        return result
+
     def abs_move(self, x=None, y=None, z=None, **kwargs):
         if x is None: x = self.current_position['x']
         if y is None: y = self.current_position['y']
@@ -133,39 +325,248 @@ class GMatrix(G):
         super(GMatrix, self).abs_move(x,y,z, **kwargs)
 
     def move(self, x=None, y=None, z=None, **kwargs):
-        (x,y,z) = self._matrix_transform(x,y,z)
+        absolute = not self.is_relative
+        if absolute:
+            # Coordinates that are not given stay where they are. z is only
+            # needed once the matrix transforms it too, like in `moves`.
+            planar = self._matrix_info()[3]
+            if x is None or y is None or (z is None and not planar):
+                position = self.current_position
+                if x is None: x = position['x']
+                if y is None: y = position['y']
+                if z is None and not planar: z = position['z']
+        (x,y,z) = self._matrix_transform(x,y,z, translate=absolute)
         super(GMatrix, self).move(x,y,z, **kwargs)
 
-    def _arc_direction_transform(self, direction):
-        if np.linalg.det(self.matrix_stack[-1]) < 0:
-            direction_reverse = { 'CW' : 'CCW',
-                                  'CCW' : 'CW' }
-            return direction_reverse[direction]
-        return direction
+    def moves(self, points, axes=('x', 'y'), absolute=None, **kwargs):
+        axes = list(axes)
+        points = np.array(points, dtype=float).reshape(-1, len(axes))
+        if absolute is None:
+            absolute = not self.is_relative
+        # The planar coordinates are needed to transform a point, and all
+        # three once z is transformed too, so fill in whichever are missing
+        # with the value move/abs_move would use.
+        planar = self._matrix_info()[3]
+        missing = [name for name in (('x', 'y') if planar else ('x', 'y', 'z'))
+                   if name not in axes]
+        if missing:
+            if absolute:
+                position = self.current_position
+                fill = [position[name] for name in missing]
+            else:
+                fill = [0] * len(missing)
+            points = np.column_stack([points, np.tile(fill, (len(points), 1))])
+            axes.extend(missing)
+        # Transform all points at once, and hand them on as a single block.
+        columns = [axes.index(name) if name in axes else None for name in 'xyz']
+        xyz = np.zeros((len(points), 3))
+        for i, column in enumerate(columns):
+            if column is not None:
+                xyz[:, i] = points[:, column]
+        xyz = self.transform_points(xyz, translate=absolute)
+        for i, column in enumerate(columns):
+            if column is not None:
+                points[:, column] = xyz[:, i]
+        super(GMatrix, self).moves(points, axes=axes, absolute=absolute, **kwargs)
+
+    def _arc_plane_transform(self, plane):
+        """ Return the 2x2 transformation of the arc `plane`, a pair of axis
+        indices, or None if the current matrix does not keep arcs in it
+        circular.
+        """
+        l, _, _, _ = self._matrix_info()
+        i, j = plane
+        k = 3 - i - j
+        block = ((l[3 * i + i], l[3 * i + j]), (l[3 * j + i], l[3 * j + j]))
+        (a, b), (c, d) = block
+        scale = math.sqrt(abs(a * d - b * c))
+        tolerance = _PLANE_TOLERANCE * max(scale, 1)
+        coupling = (l[3 * i + k], l[3 * j + k], l[3 * k + i], l[3 * k + j])
+        if scale == 0 or max(abs(v) for v in coupling) > tolerance:
+            return None
+        # A similarity is a rotation or a reflection, times a scale.
+        if not ((abs(a - d) <= tolerance and abs(b + c) <= tolerance) or
+                (abs(a + d) <= tolerance and abs(b - c) <= tolerance)):
+            return None
+        return block
 
     def arc(self, x=None, y=None, z=None, direction='CW', radius='auto',
-            helix_dim=None, helix_len=0, **kwargs):
-        (x_prime,y_prime,z_prime) = self._matrix_transform(x,y,z)
-        if x is None: x_prime = None
-        if y is None: y_prime = None
-        if z is None: z_prime = None
-        if helix_len: helix_len = self._matrix_transform_length(helix_len)
-        direction = self._arc_direction_transform(direction)
-        super(GMatrix, self).arc(x=x_prime,y=y_prime,z=z_prime,direction=direction,radius=radius,
+            helix_dim=None, helix_len=0, linearize=False, color=(0,1,0,0.5),
+            **kwargs):
+        given = [(name, value) for name, value in (('x', x), ('y', y), ('z', z))
+                 if value is not None]
+        if len(given) != 2:
+            # The arc runs through another axis, only transform what we can.
+            (x_prime,y_prime,z_prime) = self._matrix_transform(
+                x, y, z, translate=not self.is_relative)
+            if x is None: x_prime = None
+            if y is None: y_prime = None
+            if z is None: z_prime = None
+            super(GMatrix, self).arc(x=x_prime, y=y_prime, z=z_prime,
+                                     direction=direction, radius=radius,
+                                     helix_dim=helix_dim, helix_len=helix_len,
+                                     linearize=linearize, color=color, **kwargs)
+            return
+
+        plane = tuple(_AXIS_INDEX[name] for name, _ in given)
+        block = self._arc_plane_transform(plane)
+        if linearize or block is None:
+            self._linearized_arc(given, direction, radius, helix_dim,
+                                 helix_len, color)
+            return
+
+        (a, b), (c, d) = block
+        (_, u), (_, v) = given
+        u_prime, v_prime = a * u + b * v, c * u + d * v
+        if not self.is_relative:
+            t = self._matrix_info()[1]
+            if t[plane[0]] or t[plane[1]]:
+                u_prime += t[plane[0]]
+                v_prime += t[plane[1]]
+        dims = {given[0][0]: u_prime, given[1][0]: v_prime}
+
+        det = a * d - b * c
+        if det < 0:
+            direction = {'CW': 'CCW', 'CCW': 'CW'}[direction]
+        if radius != 'auto':
+            radius = radius * math.sqrt(abs(det))
+        if helix_len and helix_dim is not None:
+            normal = 3 - plane[0] - plane[1]
+            if _AXIS_INDEX.get(helix_dim.lower()) == normal:
+                helix_len = helix_len * self._matrix_info()[0][4 * normal]
+        super(GMatrix, self).arc(direction=direction, radius=radius,
                                  helix_dim=helix_dim, helix_len=helix_len,
-                                 **kwargs)
+                                 color=color, **dict(kwargs, **dims))
+
+    def _linearized_arc(self, given, direction, radius, helix_dim, helix_len,
+                        color):
+        """ Break the arc to the end point `given`, as pairs of axis name and
+        coordinate, into straight moves of at most pi/16 radians each, and
+        pass them through the transformation.
+        """
+        (u_name, u), (v_name, v) = given
+        if not self.is_relative:
+            position = self.current_position
+            u, v = u - position[u_name], v - position[v_name]
+        dist = math.sqrt(u ** 2 + v ** 2)
+        if radius == 'auto':
+            radius = dist / 2.0
+        elif abs(radius) < dist / 2.0:
+            msg = 'Radius {} to small for distance {}'.format(radius, dist)
+            raise RuntimeError(msg)
+        if dist == 0:
+            return
+
+        # The center is to the right of the chord for a short clockwise arc,
+        # and to the left for a long one.
+        offset = math.sqrt(max(radius ** 2 - (dist / 2.0) ** 2, 0))
+        side = 1 if (direction == 'CW') == (radius > 0) else -1
+        center_u = u / 2.0 + side * offset * v / dist
+        center_v = v / 2.0 - side * offset * u / dist
+        start = math.atan2(-center_v, -center_u)
+        end = math.atan2(v - center_v, u - center_u)
+        if direction == 'CW':
+            sweep = -((start - end) % (2 * math.pi))
+        else:
+            sweep = (end - start) % (2 * math.pi)
+
+        count = max(1, int(math.ceil(abs(sweep) / (math.pi / 16) - 1e-9)))
+        angles = start + sweep * np.arange(1, count + 1) / count
+        points = np.column_stack([center_u + abs(radius) * np.cos(angles),
+                                  center_v + abs(radius) * np.sin(angles)])
+        points[-1] = (u, v)
+        steps = np.diff(np.vstack([[0, 0], points]), axis=0)
+        axes = (u_name, v_name)
+        if helix_dim is not None and helix_len:
+            steps = np.column_stack([steps, np.full(count, helix_len / float(count))])
+            axes += (helix_dim,)
+        self.moves(steps, axes=axes, absolute=False, color=color)
+
+    # Instancing ##############################################################
+    def record_toolpath(self, program):
+        """ Record the commands `program` issues into a `Toolpath`, without
+        writing anything, to replay it later with `replay`.
+
+        Parameters
+        ----------
+        program : callable
+            Called with a new instance with the same output and extrusion
+            settings as this one, and should issue the commands. The path
+            starts at the origin of its coordinate system.
+
+        Examples
+        --------
+        >>> part = g.record_toolpath(lambda g: g.meander(5, 5, 0.5))
+
+        """
+        from .toolpath import Toolpath
+        return Toolpath.record(program, self)
+
+    def replay(self, toolpath, transforms=(None,), travel=True):
+        """ Issue the commands of `toolpath` once for each of `transforms`.
+
+        Each copy is drawn with the transformation applied after the
+        current one, like `translate` or `rotate` would, and the matrix
+        stack is left as it was. The moves of the path are transformed and
+        written a block at a time, straight from the recorded geometry.
+
+        Parameters
+        ----------
+        toolpath : Toolpath
+            The path, from `record_toolpath`.
+        transforms : sequence (default: (None,))
+            One item per copy: a 4x4 homogeneous matrix, a callable that is
+            given this instance to set up the transformation with its usual
+            methods, or None for no transformation.
+        travel : bool (default: True)
+            If True, move rapidly in XY to the origin of each copy before
+            drawing it, otherwise each copy starts where the last one ended.
+
+        Examples
+        --------
+        >>> # print the part at 10 positions along x, turned a little more
+        >>> # each time
+        >>> g.replay(part, [lambda g, i=i: (g.translate(10 * i, 0),
+        ...                                 g.rotate(0.1 * i))
+        ...                 for i in range(10)])
+
+        """
+        for transform in transforms:
+            self.push_matrix()
+            try:
+                if callable(transform):
+                    transform(self)
+                elif transform is not None:
+                    self._set_matrix(self.matrix_stack[-1].dot(
+                        np.asarray(transform, dtype=float)))
+                if travel:
+                    extrude, self.extrude = self.extrude, False
+                    try:
+                        self.abs_move(x=0, y=0, rapid=True)
+                    finally:
+                        self.extrude = extrude
+                toolpath.emit(self)
+            finally:
+                self.pop_matrix()
+
     @property
     def current_position(self):
+        position = dict(self._current_position)
         x = self._current_position['x']
         y = self._current_position['y']
         z = self._current_position['z']
         if x is None: x = 0.0
         if y is None: y = 0.0
 
-        matrix = self.matrix_stack[-1]
-        transform = matrix.getI() * np.matrix([x, y]).T
-        
-        return { 'x':transform.item(0),
-                 'y':transform.item(1),
-                 'z':z }
-
+        _, t, (a, b, c, d, e, f, g, h, i), planar = self._matrix_info()
+        x, y = x - t[0], y - t[1]
+
+        if planar:
+            position.update(x=a * x + b * y, y=d * x + e * y, z=z)
+        else:
+            if z is None: z = 0.0
+            z = z - t[2]
+            position.update(x=a * x + b * y + c * z,
+                            y=d * x + e * y + f * z,
+                            z=g * x + h * y + i * z)
+        return position
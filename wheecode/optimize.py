@@ -0,0 +1,445 @@
+""" Passes that rewrite a stream of GCode lines into fewer, equivalent ones.
+
+Every pass takes an iterable of lines, such as a file, the lines returned by
+`G.generate` or another pass, and yields the rewritten lines as it goes, so
+passes can be chained and used on programs of any size.
+
+Examples
+--------
+>>> with open('part.gcode') as infile, open('merged.gcode', 'w') as outfile:
+...     for line in merge_collinear(infile, tolerance=0.005):
+...         outfile.write(line + '\\n')
+
+"""
+from math import atan2, hypot, pi, sqrt
+
+AXES = ('X', 'Y', 'Z')
+
+# The words a move may have to be rewritten. Moves with any other word, like
+# the pump axes of `gradient_spiral`, are passed through unchanged.
+_REWRITABLE = frozenset(AXES + ('E', 'F'))
+
+
+def _split(line):
+    """ Return the command and a dict of the other words of `line`, or
+    (None, None) if it has comments or words that are not a letter and a
+    number.
+    """
+    words = line.split()
+    if not words or ';' in line or '(' in line:
+        return None, None
+    args = {}
+    for word in words[1:]:
+        letter = word[0].upper()
+        if letter in args:
+            return None, None
+        try:
+            args[letter] = (float(word[1:]), word[1:])
+        except ValueError:
+            return None, None
+    return words[0].upper(), args
+
+
+def _decimals(text):
+    """ The number of decimals `text` is written with.
+    """
+    return len(text) - text.index('.') - 1 if '.' in text else 0
+
+
+class _ModalState(object):
+    """ Follows the position and the positioning modes along a stream of
+    GCode, the way Marlin interprets them.
+    """
+
+    def __init__(self):
+        self.position = {'X': 0.0, 'Y': 0.0, 'Z': 0.0, 'E': 0.0}
+        self.relative = False
+        self.e_relative = False
+        self.plane = None
+
+    def point(self):
+        return tuple(self.position[axis] for axis in AXES)
+
+    def update(self, line, command=None, args=None):
+        """ Apply `line`, already split into `command` and `args` if given.
+        """
+        if command is None:
+            command, args = _split(line.split(';')[0])
+            if command is None:
+                return
+        if command in ('G90', 'G91'):
+            self.relative = self.e_relative = command == 'G91'
+        elif command in ('M82', 'M83'):
+            self.e_relative = command == 'M83'
+        elif command in ('G17', 'G18', 'G19'):
+            self.plane = command
+        elif command == 'G92':
+            for axis in self.position:
+                if axis in args or not args:
+                    self.position[axis] = args[axis][0] if args else 0.0
+        elif command in ('G0', 'G00', 'G1', 'G01', 'G2', 'G02', 'G3', 'G03'):
+            for axis in self.position:
+                if axis in args:
+                    relative = self.e_relative if axis == 'E' else self.relative
+                    value = args[axis][0]
+                    self.position[axis] = (self.position[axis] + value
+                                           if relative else value)
+
+
+class _Run(object):
+    """ Consecutive moves that may be written as a single straight one.
+    """
+
+    def __init__(self, line, command, args, start, end, e, relative, e_relative):
+        self.lines = [line]
+        self.command = command
+        self.feed = args.get('F')
+        self.axes = set(args) & set(AXES + ('E',))
+        self.decimals = max([_decimals(text) for _, text in args.values()] + [0])
+        self.start = start
+        self.points = [end]
+        self.e_start = e[0]
+        self.e_end = e[1]
+        self.length = _distance(start, end)
+        self.relative = relative
+        self.e_relative = e_relative
+
+    def accepts(self, command, args, end, e, tolerance, flow_tolerance):
+        """ Whether the move to `end` can join the run, keeping every point
+        within `tolerance` of the straight move from the start to `end`.
+        """
+        if command != self.command or 'F' in args:
+            return False
+        if not _same_flow(_distance(self.points[-1], end), e, self.length,
+                          (self.e_start, self.e_end), flow_tolerance):
+            return False
+        chord = [b - a for a, b in zip(self.start, end)]
+        chord_length = sqrt(sum(c * c for c in chord))
+        if chord_length == 0:
+            return False
+        previous = 0.0
+        for point in self.points:
+            offset = [p - a for a, p in zip(self.start, point)]
+            along = sum(o * c for o, c in zip(offset, chord)) / chord_length
+            if along < previous:  # the path turns back
+                return False
+            previous = along
+            across = sum(o * o for o in offset) - along * along
+            if across > tolerance * tolerance:
+                return False
+        return along <= chord_length
+
+    def add(self, line, args, end, e):
+        self.lines.append(line)
+        self.axes |= set(args) & set(AXES + ('E',))
+        self.decimals = max([self.decimals] +
+                            [_decimals(text) for _, text in args.values()])
+        self.length += _distance(self.points[-1], end)
+        self.points.append(end)
+        self.e_end = e[1]
+
+    def format(self):
+        """ Return the single line the run is written as.
+        """
+        if len(self.lines) == 1:
+            return self.lines[0]
+        fmt = '{}{:.%df}' % self.decimals
+        end = self.points[-1]
+        words = [self.command]
+        for axis, start, value in zip(AXES, self.start, end):
+            if axis in self.axes:
+                words.append(fmt.format(axis, value - start if self.relative else value))
+        if 'E' in self.axes:
+            value = self.e_end - self.e_start if self.e_relative else self.e_end
+            words.append(fmt.format('E', value))
+        if self.feed is not None:
+            words.append('F' + self.feed[1])
+        return ' '.join(words)
+
+
+def _distance(a, b):
+    return sqrt(sum((q - p) ** 2 for p, q in zip(a, b)))
+
+
+def _same_flow(length, e, other_length, other_e, flow_tolerance):
+    """ Whether two moves extrude the same amount per unit of length, within
+    `flow_tolerance`, where `e` holds the E positions before and after.
+    """
+    flow = (e[1] - e[0]) / length
+    other = (other_e[1] - other_e[0]) / other_length
+    return (flow > 0) == (other > 0) and (
+        abs(flow - other) <= flow_tolerance * abs(other))
+
+
+def merge_collinear(lines, tolerance=0.001, flow_tolerance=0.01):
+    """ Merge consecutive straight moves that (nearly) continue in the same
+    direction into single moves.
+
+    Dense linearized output, like that of `arc(linearize=True)`, `spiral` or
+    `gradient_spiral`, often has runs of short G0 or G1 moves that are almost
+    collinear. Merging them cuts the number of lines the controller has to
+    receive and plan without changing the path by more than `tolerance`.
+
+    A run of moves is only merged if they are all G0 or all G1 moves, only
+    the first one sets the feed rate, they all extrude or all don't, and
+    their extrusion per unit of length agrees within `flow_tolerance`. The
+    merged move extrudes the total amount of the run. Lines with comments,
+    moves of axes other than X, Y, Z and E, and all other commands are
+    passed through unchanged and end the run.
+
+    Parameters
+    ----------
+    lines : iterable of str
+        The GCode to merge, one line per item. Trailing line breaks are
+        dropped.
+    tolerance : float (default: 0.001)
+        The largest distance the end point of any merged move may be from
+        the straight move that replaces it.
+    flow_tolerance : float (default: 0.01)
+        The largest relative difference of the extrusion per unit of length
+        of the moves in a merged run.
+
+    Examples
+    --------
+    >>> list(merge_collinear(['G91', 'G1 X1 Y1', 'G1 X1 Y1.0001', 'G1 X1']))
+    ['G91', 'G1 X2.0000 Y2.0001', 'G1 X1']
+
+    """
+    state = _ModalState()
+    run = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        command, args = _split(line)
+        if (command in ('G0', 'G00', 'G1', 'G01') and set(args) & set(AXES)
+                and _REWRITABLE.issuperset(args)):
+            start, e_start = state.point(), state.position['E']
+            state.update(line, command, args)
+            end, e = state.point(), (e_start, state.position['E'])
+            if start == end:
+                pass
+            elif run is not None and run.accepts(command, args, end, e,
+                                                 tolerance, flow_tolerance):
+                run.add(line, args, end, e)
+                continue
+            else:
+                if run is not None:
+                    yield run.format()
+                run = _Run(line, command, args, start, end, e,
+                           state.relative, state.e_relative)
+                continue
+        else:
+            state.update(line, command, args)
+        if run is not None:
+            yield run.format()
+            run = None
+        yield line
+    if run is not None:
+        yield run.format()
+
+
+class _Move(object):
+    """ A straight move in the XY plane, as a candidate for an arc.
+    """
+
+    def __init__(self, line, args, start, end, e):
+        self.line = line
+        self.args = args
+        self.start = start
+        self.end = end
+        self.e = e
+
+
+def _circle(a, b, c):
+    """ Return the center and radius of the circle through the 2D points `a`,
+    `b` and `c`, or None if they are collinear.
+    """
+    # Work relative to `a` to keep the precision for far away points.
+    bx, by = b[0] - a[0], b[1] - a[1]
+    cx, cy = c[0] - a[0], c[1] - a[1]
+    d = 2 * (bx * cy - by * cx)
+    if d == 0:
+        return None
+    b2, c2 = bx * bx + by * by, cx * cx + cy * cy
+    ux = (cy * b2 - by * c2) / d
+    uy = (bx * c2 - cx * b2) / d
+    return (a[0] + ux, a[1] + uy), hypot(ux, uy)
+
+
+def _fit_arc(moves, tolerance):
+    """ Return the center, radius and swept angle of an arc that follows
+    `moves` within `tolerance`, and whether the moves are straight enough to
+    not need one. Return None if there is no such arc.
+    """
+    points = [moves[0].start] + [move.end for move in moves]
+    circle = _circle(points[0], points[len(points) // 2], points[-1])
+    if circle is None:
+        return None
+    (cx, cy), radius = circle
+    swept = 0.0
+    for a, b in zip(points, points[1:]):
+        if abs(hypot(b[0] - cx, b[1] - cy) - radius) > tolerance:
+            return None
+        # The moves are chords of the arc, which bulges out of them by the
+        # sagitta.
+        half = _distance(a[:2], b[:2]) / 2
+        if half > radius or radius - sqrt(radius * radius - half * half) > tolerance:
+            return None
+        ax, ay, bx, by = a[0] - cx, a[1] - cy, b[0] - cx, b[1] - cy
+        angle = atan2(ax * by - ay * bx, ax * bx + ay * by)
+        if angle == 0 or angle * swept < 0:  # not turning the same way
+            return None
+        swept += angle
+    if abs(swept) >= 2 * pi - 1e-6:
+        return None  # a full circle can't be told from no move at all
+    start, end = points[0], points[-1]
+    chord = _distance(start[:2], end[:2])
+    straight = chord > 0 and all(
+        abs((end[0] - start[0]) * (p[1] - start[1]) -
+            (end[1] - start[1]) * (p[0] - start[0])) / chord <= tolerance
+        for p in points)
+    return (cx, cy), radius, swept, straight
+
+
+class _ArcRun(object):
+    """ Consecutive moves in the XY plane that may be written as one arc.
+    """
+
+    def __init__(self, relative, e_relative):
+        self.moves = []
+        self.fit = None
+        self.relative = relative
+        self.e_relative = e_relative
+
+    def accepts(self, move, flow_tolerance):
+        """ Whether `move` is compatible with the moves in the run, before
+        looking at the geometry.
+        """
+        if not self.moves:
+            return True
+        first = self.moves[0]
+        return 'F' not in move.args and _same_flow(
+            _distance(move.start, move.end), move.e,
+            _distance(first.start, first.end), first.e, flow_tolerance)
+
+    def is_arc(self, min_moves):
+        """ Whether the run should be written as an arc. Straight runs are
+        left to `merge_collinear`.
+        """
+        return (self.fit is not None and not self.fit[3]
+                and len(self.moves) >= min_moves)
+
+    def format(self, output_digits):
+        """ Return the arc command the run is written as.
+        """
+        (cx, cy), _, swept, _ = self.fit
+        start, end = self.moves[0].start, self.moves[-1].end
+        fmt = '{}{:.%df}' % output_digits
+        words = ['G2' if swept < 0 else 'G3']
+        for axis, s, value in zip('XY', start, end):
+            words.append(fmt.format(axis, value - s if self.relative else value))
+        words.append(fmt.format('I', cx - start[0]))
+        words.append(fmt.format('J', cy - start[1]))
+        if any('E' in move.args for move in self.moves):
+            e_start, e_end = self.moves[0].e[0], self.moves[-1].e[1]
+            words.append(fmt.format('E', e_end - e_start if self.e_relative else e_end))
+        feed = self.moves[0].args.get('F')
+        if feed is not None:
+            words.append('F' + feed[1])
+        return ' '.join(words)
+
+
+def fit_arcs(lines, tolerance=0.001, min_moves=3, flow_tolerance=0.01,
+             output_digits=6):
+    """ Replace runs of straight moves that follow a circle by G2/G3 arcs.
+
+    Paths made of many short G1 moves, like those of `spiral`, linearized
+    arcs or arcs put through `GMatrix`, are written with a fraction of the
+    lines when the controller supports arcs. Arcs are written like
+    `G.arc_ijk` writes them in the XY plane, with the center as I and J
+    offsets from the start, and are preceded by a G17 if another plane may
+    be selected.
+
+    A run of G1 moves is replaced if it has at least `min_moves` moves that
+    stay at the same height, every end point is within `tolerance` of the
+    arc and every move deviates from it by at most `tolerance`, it turns one
+    way by less than a full circle, and the extrusion rules of
+    `merge_collinear` hold. Moves of axes other than X, Y, Z and E are never
+    replaced. Runs that are straight are left alone, so the two passes can
+    be chained.
+
+    Parameters
+    ----------
+    lines : iterable of str
+        The GCode to rewrite, one line per item. Trailing line breaks are
+        dropped.
+    tolerance : float (default: 0.001)
+        The largest distance between the moves and the arc replacing them.
+    min_moves : int (default: 3)
+        The smallest number of moves replaced by an arc.
+    flow_tolerance : float (default: 0.01)
+        The largest relative difference of the extrusion per unit of length
+        of the moves replaced by an arc.
+    output_digits : int (default: 6)
+        The number of decimals of the arc coordinates.
+
+    Examples
+    --------
+    >>> g = G(outfile='spiral.gcode')
+    >>> g.spiral(end_diameter=10, spacing=1, feedrate=10)
+    >>> g.teardown()
+    >>> with open('spiral.gcode') as f:
+    ...     lines = list(fit_arcs(merge_collinear(f), tolerance=0.005))
+
+    """
+    state = _ModalState()
+    run = _ArcRun(state.relative, state.e_relative)
+
+    def flush():
+        if run.is_arc(min_moves):
+            if state.plane != 'G17':
+                state.plane = 'G17'
+                yield 'G17 ; XY plane'
+            yield run.format(output_digits)
+        else:
+            for move in run.moves:
+                yield move.line
+        del run.moves[:]
+        run.fit = None
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+        command, args = _split(line)
+        if (command in ('G1', 'G01') and set(args) & set('XY')
+                and _REWRITABLE.issuperset(args)):
+            start, e_start = state.point(), state.position['E']
+            state.update(line, command, args)
+            end = state.point()
+            if start[2] == end[2] and start[:2] != end[:2]:
+                move = _Move(line, args, start, end, (e_start, state.position['E']))
+                fit = None
+                while run.moves:
+                    if run.accepts(move, flow_tolerance):
+                        fit = _fit_arc(run.moves + [move], tolerance)
+                        if fit is not None:
+                            break
+                    if run.is_arc(min_moves):
+                        for out in flush():
+                            yield out
+                    else:
+                        # The oldest move can't be part of an arc.
+                        yield run.moves.pop(0).line
+                        run.fit = (_fit_arc(run.moves, tolerance)
+                                   if len(run.moves) > 1 else None)
+                # The positioning modes can't change within a run, commands
+                # that change them end it.
+                run.relative, run.e_relative = state.relative, state.e_relative
+                run.moves.append(move)
+                run.fit = fit
+                continue
+        else:
+            state.update(line, command, args)
+        for out in flush():
+            yield out
+        yield line
+    for out in flush():
+        yield out
@@ -0,0 +1,302 @@
+import re
+
+import numpy as np
+
+from wheecode.commands import MOTION_OPCODES, OTHER
+
+# Comments and checksums are dropped before splitting lines into words.
+COMMENT_RE = re.compile(br';[^\n]*|\([^)\n]*\)|\*[0-9]*')
+
+LETTER_RE = re.compile(br'([A-Z])')
+
+# The number of bytes each word is stored in. Longer words are converted one
+# by one.
+WIDTH = 16
+
+# The bytes a number can be made of, including the padding of short words.
+_NUMERIC = np.zeros(256, dtype=bool)
+_NUMERIC[bytearray(b'0123456789.+-')] = True
+_NUMERIC[0] = True
+
+AXES = (b'X', b'Y', b'Z', b'E')
+LETTERS = (b'G', b'M', b'F') + AXES
+_LETTER_CODES = np.frombuffer(b''.join(LETTERS), dtype=np.uint8)
+
+
+def _to_float(word):
+    try:
+        return float(word)
+    except ValueError:
+        return np.nan
+
+
+def _fill_forward(values, initial):
+    """ Replace every NaN in `values` by the last number before it, or by
+    `initial` if there is none.
+    """
+    index = np.where(np.isnan(values), -1, np.arange(len(values)))
+    np.maximum.accumulate(index, out=index)
+    return np.where(index >= 0, values[index], initial)
+
+
+def _track(set_values, is_set, offsets, initial):
+    """ Return the value of an axis after each line, where the lines in
+    `is_set` set it to `set_values` and all other lines add `offsets` to it.
+    """
+    total = np.cumsum(offsets)
+    index = np.where(is_set, np.arange(len(is_set)), -1)
+    np.maximum.accumulate(index, out=index)
+    base = np.where(index >= 0, set_values[index] - total[index], initial)
+    return base + total
+
+
+class ParsedGCode(object):
+    """ The moves of a GCode program as arrays, with one entry per move and
+    per G92, which `G` records in its history as well.
+
+    - `position`: the x, y, z position after the move.
+    - `e`: the position of the E axis after the move.
+    - `feed`: the feed rate of the move.
+    - `extruding`: whether the move extruded, i.e. advanced the E axis.
+    - `opcode`: the `wheecode.commands` opcode of the move, OTHER for G92.
+    - `line`: the zero based number of the line the move is on.
+
+    Use `parse_gcode` to create one, and `G.from_gcode` to turn one into the
+    history of a `G` instance.
+
+    """
+
+    def __init__(self, position, e, feed, extruding, opcode, line):
+        self.position = position
+        self.e = e
+        self.feed = feed
+        self.extruding = extruding
+        self.opcode = opcode
+        self.line = line
+
+    def __len__(self):
+        return len(self.opcode)
+
+    def apply_history(self, g, color=(0, 0, 0, 0.5)):
+        """ Append the moves to the history of `g` as if they had been
+        issued on it, and leave `g` in the state after the last move.
+        """
+        if len(self) == 0:
+            return
+        first_index = len(g.position_history)
+        g.position_history.extend(self.position)
+        colors = np.empty(len(self), dtype=object)
+        colors.fill(color)
+        g.color_history.extend(colors)
+
+        # Only the entries where the state changes are recorded, like
+        # `G._record_state_changes` does.
+        feed = self.feed
+        changes = np.flatnonzero(np.concatenate([[True], feed[1:] != feed[:-1]]))
+        entries = list(zip((changes + first_index).tolist(), feed[changes].tolist()))
+        if g.speed_history and g.speed_history[-1][1] == entries[0][1]:
+            entries = entries[1:]
+        g.speed_history.extend(entries)
+        extruding = self.extruding
+        changes = np.flatnonzero(np.concatenate(
+            [[True], extruding[1:] != extruding[:-1]]))
+        # G replaces its extruding state rather than changing it, so the
+        # entries can share the two possible states.
+        states = {False: [None, False], True: [None, True]}
+        entries = [(index, states[state]) for index, state in
+                   zip((changes + first_index).tolist(), extruding[changes].tolist())]
+        if g.extruding_history and g.extruding_history[-1][1] == entries[0][1]:
+            entries = entries[1:]
+        g.extruding_history.extend(entries)
+
+        x, y, z = self.position[-1].tolist()
+        g._current_position.update(x=x, y=y, z=z, E=float(self.e[-1]))
+        g.speed = float(feed[-1])
+        g.extruding = [None, bool(extruding[-1])]
+
+
+class _State(object):
+    """ The modal state carried from one chunk of a file to the next.
+    """
+
+    def __init__(self):
+        self.position = dict.fromkeys(AXES, 0.0)
+        self.relative = 0.0
+        self.e_relative = 0.0
+        self.feed = 0.0
+        self.motion = float(MOTION_OPCODES[0])
+        self.line = 0
+
+
+def _split_words(text):
+    """ Split `text` into words and return the array of their bytes, the
+    words themselves, and the array of the lines they are on.
+    """
+    # Line breaks become `;` words, which comments can no longer be.
+    parts = text.replace(b'\n', b' ; ').split()
+    chars = np.array(parts, dtype='S%d' % WIDTH).view(np.uint8).reshape(-1, WIDTH)
+    line_of = np.cumsum(chars[:, 0] == ord(';'))
+    return chars, parts, line_of
+
+
+def _words(text):
+    """ Return the letters, values and line numbers of the words in `text`
+    that the parser interprets, and the number of lines.
+    """
+    text = COMMENT_RE.sub(b'', text.upper())
+    chars, parts, line_of = _split_words(text)
+    wanted = np.flatnonzero(np.isin(chars[:, 0], _LETTER_CODES))
+    rest = chars[wanted, 1:]
+    if ((rest >= ord('A')) & (rest <= ord('Z'))).any():
+        # Some words were written without spaces in between, like `G1X10`.
+        chars, parts, line_of = _split_words(LETTER_RE.sub(br' \1', text))
+        wanted = np.flatnonzero(np.isin(chars[:, 0], _LETTER_CODES))
+        rest = chars[wanted, 1:]
+    numeric = _NUMERIC[rest].all(axis=1) & (rest[:, 0] != 0)
+    wanted, rest = wanted[numeric], rest[numeric]
+
+    strings = rest.view('S%d' % (WIDTH - 1)).ravel()
+    try:
+        values = strings.astype(float)
+    except ValueError:  # a malformed number like `1.2.3`
+        values = np.array([_to_float(v) for v in strings])
+    for index in np.flatnonzero(rest[:, -1]).tolist():
+        # Only the start of words longer than WIDTH is stored.
+        values[index] = _to_float(parts[wanted[index]][1:])
+    return chars[wanted, 0], values, line_of[wanted], int(line_of[-1]) + 1
+
+
+def _parse_chunk(text, state):
+    """ Parse `text`, a block of complete lines, and return the arrays of the
+    moves in it, advancing `state` past it.
+    """
+    letters, values, line_of, count = _words(text)
+
+    def column(letter):
+        mask = letters == ord(letter)
+        result = np.full(count, np.nan)
+        result[line_of[mask]] = values[mask]
+        return result
+
+    # Only the first G or M word of a line is the command, later ones may be
+    # part of a message.
+    commands = np.flatnonzero((letters == ord('G')) | (letters == ord('M')))
+    first = np.full(count, -1)
+    first[line_of[commands][::-1]] = commands[::-1]
+    # Lines without a command pick the sentinel at the end.
+    code = np.append(values, np.nan)[first]
+    letter = np.append(letters, 0)[first]
+    g = np.where(letter == ord('G'), code, np.nan)
+    m = np.where(letter == ord('M'), code, np.nan)
+    axes = dict((axis, column(axis)) for axis in AXES)
+    has_axis = np.zeros(count, dtype=bool)
+    for axis in AXES:
+        has_axis |= ~np.isnan(axes[axis])
+
+    # Motion commands are modal, a line with only coordinates repeats the
+    # last one.
+    explicit = np.isin(g, MOTION_OPCODES)
+    opcode = _fill_forward(np.where(explicit, g, np.nan), state.motion)
+    is_motion = explicit | (np.isnan(g) & np.isnan(m) & has_axis)
+
+    mode = np.full(count, np.nan)
+    mode[g == 90] = 0
+    mode[g == 91] = 1
+    relative = _fill_forward(mode, state.relative) == 1
+    mode[m == 82] = 0
+    mode[m == 83] = 1
+    e_relative = _fill_forward(mode, state.e_relative) == 1
+
+    # G92 sets the given axes, or all of them if none are given.
+    g92 = g == 92
+    g92_all = g92 & ~has_axis
+
+    tracks = {}
+    for axis in AXES:
+        value = axes[axis]
+        given = ~np.isnan(value)
+        axis_relative = e_relative if axis == b'E' else relative
+        is_set = (g92 & given) | g92_all | (is_motion & given & ~axis_relative)
+        is_add = is_motion & given & axis_relative
+        set_values = np.where(g92_all & ~given, 0.0, value)
+        offsets = np.where(is_add, value, 0.0)
+        tracks[axis] = _track(set_values, is_set, offsets, state.position[axis])
+
+    feed = _fill_forward(column(b'F'), state.feed)
+    e = tracks[b'E']
+    e_before = np.concatenate([[state.position[b'E']], e[:-1]])
+    # G records setting the position like a move, so do the same.
+    recorded = np.flatnonzero((is_motion & has_axis) | g92)
+
+    state.position = dict((axis, float(tracks[axis][-1])) for axis in AXES)
+    state.relative = float(relative[-1])
+    state.e_relative = float(e_relative[-1])
+    state.feed = float(feed[-1])
+    state.motion = float(opcode[-1])
+    first_line = state.line
+    state.line += count - 1
+
+    position = np.column_stack([tracks[axis][recorded] for axis in AXES[:3]])
+    return (position, e[recorded], feed[recorded],
+            ((e > e_before) & is_motion)[recorded],
+            np.where(g92, OTHER, opcode)[recorded].astype(np.int8),
+            recorded + first_line)
+
+
+def _read_chunks(f, chunk_size):
+    """ Yield blocks of about `chunk_size` bytes of complete lines from `f`.
+    """
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        if not isinstance(chunk, bytes):
+            chunk = chunk.encode('utf-8')
+        if not chunk.endswith(b'\n'):
+            rest = f.readline()
+            if not isinstance(rest, bytes):
+                rest = rest.encode('utf-8')
+            chunk += rest
+            if not chunk.endswith(b'\n'):
+                chunk += b'\n'
+        yield chunk
+
+
+def parse_gcode(source, chunk_size=1 << 22):
+    """ Parse the moves of a GCode file into a `ParsedGCode`.
+
+    The file is read in chunks of complete lines. Each chunk is split into
+    words in one go and the words are converted to numbers as an array. The
+    positions, feed rates and extrusion of all its lines are then worked out
+    with array operations, so large files parse at numpy rather than Python
+    speed.
+
+    G0 and G1 moves, G2 and G3 arcs (only their end points), G90/G91, M82/M83,
+    G92 and F words are interpreted. Other commands are ignored. Like in
+    Marlin, G90 and G91 switch the E axis too, unless M82 or M83 follow. A
+    move is considered extruding when it advances the E axis.
+
+    Parameters
+    ----------
+    source : str or file
+        The path of the file, or a file object open for reading.
+    chunk_size : int (default: 4 MiB)
+        The number of bytes parsed at a time.
+
+    Examples
+    --------
+    >>> parsed = parse_gcode('part.gcode')
+    >>> parsed.position[-1]
+    array([ 95. , 150. ,   0.3])
+
+    """
+    if not hasattr(source, 'read'):
+        with open(source, 'rb') as f:
+            return parse_gcode(f, chunk_size)
+    state = _State()
+    parts = [_parse_chunk(text, state) for text in _read_chunks(source, chunk_size)]
+    if not parts:
+        return ParsedGCode(np.empty((0, 3)), np.empty(0), np.empty(0),
+                           np.empty(0, dtype=bool), np.empty(0, dtype=np.int8),
+                           np.empty(0, dtype=int))
+    return ParsedGCode(*[np.concatenate(column) for column in zip(*parts)])
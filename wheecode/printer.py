@@ -1,7 +1,9 @@
 import os
 import logging
-from threading import Thread, Event, Lock
-from time import sleep, time
+from collections import deque
+from operator import xor
+from threading import Thread, Event, Lock, Condition
+from time import time
 
 import serial
 
@@ -45,13 +47,106 @@ fh.setFormatter(logging.Formatter('%(asctime)s - %(threadName)s - %(levelname)s
 logger.addHandler(fh)
 
 
+class SendBuffer(object):
+    """ Queue of the lines to send to the printer, indexed by their absolute
+    position in the job.
+
+    Lines that can no longer be requested by a resend are dropped with
+    `discard_before`, so the memory used stays bounded however many lines are
+    sent. `len` always counts every line ever queued.
+
+    """
+
+    def __init__(self, lines=()):
+        self._lines = deque(lines)
+        # The framed bytes of each line, or None until it is first sent.
+        self._frames = deque(None for _ in self._lines)
+        self._start = 0
+
+    @property
+    def start(self):
+        """ The absolute index of the oldest line still held.
+        """
+        return self._start
+
+    def append(self, line):
+        self._lines.append(line)
+        self._frames.append(None)
+
+    def extend(self, lines):
+        lines = list(lines)
+        self._lines.extend(lines)
+        self._frames.extend([None] * len(lines))
+
+    def frame(self, idx):
+        """ The cached framed bytes of line `idx`, or None if it wasn't framed
+        yet.
+        """
+        self[idx]  # raise IndexError for discarded lines
+        return self._frames[idx - self._start]
+
+    def set_frame(self, idx, frame):
+        self[idx]
+        self._frames[idx - self._start] = frame
+
+    def discard_before(self, idx):
+        """ Drop every line whose absolute index is below `idx`.
+        """
+        while self._start < idx and self._lines:
+            self._lines.popleft()
+            self._frames.popleft()
+            self._start += 1
+
+    def __len__(self):
+        return self._start + len(self._lines)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not self._start <= idx < len(self):
+            if 0 <= idx < self._start:
+                msg = 'Line {} was already discarded from the send buffer'
+                raise IndexError(msg.format(idx))
+            raise IndexError('send buffer index out of range')
+        return self._lines[idx - self._start]
+
+    def __iter__(self):
+        return iter(self._lines)
+
+
 class Printer(object):
     """ The Printer object is responsible for serial communications with a
     printer. The printer is expected to be running Marlin firmware.
 
     """
 
-    def __init__(self, port='/dev/tty.usbmodem1411', baudrate=250000):
+    def __init__(self, port='/dev/tty.usbmodem1411', baudrate=250000,
+                 rx_buffer_size=None, history_size=1000):
+        """
+        Parameters
+        ----------
+        port : str (default: '/dev/tty.usbmodem1411')
+            The serial port the printer is connected to.
+        baudrate : int (default: 250000)
+            The baudrate used to talk to the printer.
+        rx_buffer_size : int or None (default: None)
+            If None, each line is sent only after the 'ok' for the previous
+            line was received. Otherwise lines are streamed, keeping as many
+            lines in flight as fit in `rx_buffer_size` bytes. This should not
+            exceed the RX_BUFFER_SIZE the firmware was compiled with (128 by
+            default in Marlin).
+        history_size : int (default: 1000)
+            The number of acknowledged lines kept for resends, and the number
+            of entries kept in `responses`, `sentlines` and `temp_readings`.
+            Older entries are discarded so that memory use does not grow with
+            the length of the job.
+
+        """
+
+        # Condition used to wake the print thread and any callers waiting on
+        # the printer whenever the buffer, the pause/stop flags, the
+        # responses or the 'ok' state change.
+        self._condition = Condition()
 
         # USB port and baudrate for communication with the printer.
         self.port = port
@@ -60,11 +155,15 @@ class Printer(object):
         # The Serial object that the printer is communicating on.
         self.s = None
 
-        # List of the responses from the printer.
-        self.responses = []
+        # The number of acknowledged lines, responses, sent lines and
+        # temperature readings to keep.
+        self.history_size = history_size
+
+        # The most recent responses from the printer.
+        self.responses = deque(maxlen=history_size)
 
-        # List of lines that were sent to the printer.
-        self.sentlines = []
+        # The most recent lines that were sent to the printer.
+        self.sentlines = deque(maxlen=history_size)
 
         # True if the print thread is alive and sending lines.
         self.printing = False
@@ -78,13 +177,22 @@ class Printer(object):
         # If set to True, the print_thread will be closed as soon as possible.
         self.stop_printing = False
 
-        # List of all temperature string responses from the printer.
-        self.temp_readings = []
+        # The most recent temperature string responses from the printer.
+        self.temp_readings = deque(maxlen=history_size)
+
+        # Number of bytes that may be awaiting an 'ok' when streaming, or None
+        # to wait for every 'ok' before sending the next line.
+        self.rx_buffer_size = rx_buffer_size
 
         ### Private Attributes  ################################################
 
-        # List of all lines to be sent to the printer.
-        self._buffer = []
+        # The lines to be sent to the printer, along with the most recently
+        # acknowledged ones in case the printer requests a resend.
+        self._buffer = SendBuffer()
+
+        # Total number of responses received, including those no longer held
+        # in `responses`.
+        self._response_count = 0
 
         # Index into the _buffer of the next line to send to the printer.
         self._current_line_idx = 0
@@ -95,12 +203,32 @@ class Printer(object):
         # This thread continuously reads lines as they appear from the printer.
         self._read_thread = None
 
+        # This thread reads a file passed to `load_file(stream=True)` into the
+        # _buffer, staying at most `read_ahead` lines ahead of the printer.
+        self._load_thread = None
+
+        # True while the _load_thread still has lines to queue.
+        self._loading = False
+
+        # If set to True, the load_thread will be closed as soon as possible.
+        self._stop_loading = False
+
         # Flag used to synchronize the print_thread and the read_thread. An 'ok'
         # needs to be returned for every line sent. When the print_thread sends
         # a line this flag is cleared, and when an 'ok' is received it is set.
         self._ok_received = Event()
         self._ok_received.set()
 
+        # Byte lengths of the lines sent but not yet acknowledged, oldest
+        # first, and their sum. Used to fill the firmware's RX buffer without
+        # overflowing it when streaming.
+        self._in_flight = deque()
+        self._in_flight_bytes = 0
+
+        # Marlin answers a 'Resend:' request with an extra 'ok' that does not
+        # acknowledge any line. This is set when the 'ok' should be ignored.
+        self._skip_ok = False
+
         # Lock used to ensure serial send/receive events are atomic with the
         # setting/clearing of the `_ok_received` flag.
         self._communication_lock = Lock()
@@ -140,16 +268,19 @@ class Printer(object):
                 self.s = s
                 self._owns_serial = False
             self._ok_received.set()
+            self._clear_in_flight()
             self._current_line_idx = 0
-            self._buffer = []
-            self.responses = []
-            self.sentlines = []
+            self._reset_history()
             self._disconnect_pending = False
             self._start_read_thread()
+            self._notify()
             if s is None:
-                while len(self.responses) == 0:
-                    sleep(0.01)  # wait until the start message is recieved.
-                self.responses = []
+                # wait until the start message is recieved.
+                self._wait_for(lambda: self._response_count > 0 or
+                               not self._is_read_thread_running())
+                with self._condition:
+                    self.responses.clear()
+                    self._response_count = 0
         logger.debug('Connected to {}'.format(self.s))
 
     def disconnect(self, wait=False):
@@ -168,10 +299,17 @@ class Printer(object):
         with self._connection_lock:
             self._disconnect_pending = True
             if wait:
+                # wait until the file being streamed is fully queued
+                self._wait_for(lambda: not self._loading or
+                               not self._is_print_thread_running())
                 buf_len = len(self._buffer)
-                while buf_len > len(self.responses) and \
-                      self._is_read_thread_running():
-                    sleep(0.01)  # wait until all lines in the buffer are sent
+                # wait until all lines in the buffer are sent
+                self._wait_for(lambda: buf_len <= self._response_count or
+                               not self._is_read_thread_running())
+            if self._load_thread is not None:
+                self._stop_loading = True
+                self._notify()
+                self._load_thread.join(10)
             if self._print_thread is not None:
                 self.stop_printing = True
                 if self.s is not None and self.s.writeTimeout is not None:
@@ -190,13 +328,12 @@ class Printer(object):
                 self.s.close()
                 self.s = None
             self.printing = False
+            self._clear_in_flight()
             self._current_line_idx = 0
-            self._buffer = []
-            self.responses = []
-            self.sentlines = []
+            self._reset_history()
         logger.debug('Disconnected from printer')
 
-    def load_file(self, filepath):
+    def load_file(self, filepath, stream=False, read_ahead=1000):
         """ Load the given file into an internal _buffer. The lines will not be
         send until `self._start_print_thread()` is called.
 
@@ -204,17 +341,26 @@ class Printer(object):
         ----------
         filepath : str
             The path to a text file containing lines of GCode to be printed.
+        stream : Bool (default: False)
+            If True, the file is read by a background thread that keeps at
+            most `read_ahead` unsent lines in the buffer, so printing can start
+            right away and memory use does not depend on the size of the file.
+        read_ahead : int (default: 1000)
+            The number of unsent lines to buffer when `stream` is True.
 
         """
+        if stream:
+            self._start_load_thread(filepath, read_ahead)
+            return
         lines = []
         with open(filepath) as f:
             for line in f:
-                line = line.strip()
-                if ';' in line:  # clear out the comments
-                    line = line.split(';')[0]
+                line = self._clean_line(line)
                 if line:
                     lines.append(line)
-        self._buffer.extend(lines)
+        with self._condition:
+            self._buffer.extend(lines)
+            self._condition.notify_all()
 
     def start(self):
         """ Starts the read_thread and the _print_thread.
@@ -235,11 +381,11 @@ class Printer(object):
             msg = 'Attempted to send line after a disconnect was requested: {}'
             raise RuntimeError(msg.format(line))
         if line:
-            line = str(line).strip()
-            if ';' in line:  # clear out the comments
-                line = line.split(';')[0]
+            line = self._clean_line(str(line))
             if line:
-                self._buffer.append(line)
+                with self._condition:
+                    self._buffer.append(line)
+                    self._condition.notify_all()
 
     def get_response(self, line, timeout=0):
         """ Send the given line and return the response from the printer.
@@ -257,17 +403,7 @@ class Printer(object):
         """
         buf_len = len(self._buffer) + 1
         self.sendline(line)
-        start_time = time()
-        while len(self.responses) != buf_len:
-            if len(self.responses) > buf_len:
-                msg = "Received more responses than lines sent"
-                raise RuntimeError(msg)
-            if timeout > 0 and (time() - start_time) > timeout:
-                return ''  # return blank string on timeout.
-            if not self._is_read_thread_running():
-                raise RuntimeError("can't get response from serial since read thread isn't running")
-            sleep(0.01)
-        return self.responses[-1]
+        return self._wait_for_response(buf_len, time(), timeout)
 
     def current_position(self):
         """ Get the current postion of the printer.
@@ -286,12 +422,156 @@ class Printer(object):
         pos = dict([(k, float(v)) for k, v in r])
         return pos
 
+    @property
+    def pending(self):
+        """ The number of queued lines that have not been sent yet.
+        """
+        return len(self._buffer) - self._current_line_idx
+
     def reset_linenumber(self, number = 0):
         line = "M110 N{}".format(number)
         self.sendline(line)
 
+    @property
+    def paused(self):
+        """ Set to True to pause the print. """
+        return self._paused
+
+    @paused.setter
+    def paused(self, value):
+        self._paused = value
+        self._notify()
+
+    @property
+    def stop_printing(self):
+        """ If set to True, the print_thread will be closed as soon as possible. """
+        return self._stop_printing
+
+    @stop_printing.setter
+    def stop_printing(self, value):
+        self._stop_printing = value
+        self._notify()
+
+    @property
+    def stop_reading(self):
+        """ If set to True, the read_thread will be closed as soon as possible. """
+        return self._stop_reading
+
+    @stop_reading.setter
+    def stop_reading(self, value):
+        self._stop_reading = value
+        self._notify()
+
     ###  Private Methods  ######################################################
 
+    def _reset_history(self):
+        with self._condition:
+            self._buffer = SendBuffer()
+            self.responses = deque(maxlen=self.history_size)
+            self.sentlines = deque(maxlen=self.history_size)
+            self._response_count = 0
+
+    def _add_response(self, response):
+        with self._condition:
+            self.responses.append(response)
+            self._response_count += 1
+            self._condition.notify_all()
+
+    def _notify(self):
+        """ Wake every thread waiting on `_condition`.
+        """
+        with self._condition:
+            self._condition.notify_all()
+
+    def _wait_for(self, predicate):
+        """ Block until `predicate` returns True. It is re-checked each time
+        `_condition` is notified.
+        """
+        with self._condition:
+            while not predicate():
+                self._condition.wait()
+
+    def _wait_for_response(self, buf_len, start_time, timeout):
+        """ Block until the response to the `buf_len`th line in the buffer
+        arrives and return it, or '' once `timeout` seconds have passed since
+        `start_time`.
+        """
+        with self._condition:
+            while self._response_count != buf_len:
+                if self._response_count > buf_len:
+                    msg = "Received more responses than lines sent"
+                    raise RuntimeError(msg)
+                remaining = None
+                if timeout > 0:
+                    remaining = timeout - (time() - start_time)
+                    if remaining <= 0:
+                        return ''  # return blank string on timeout.
+                if not self._is_read_thread_running():
+                    raise RuntimeError("can't get response from serial since read thread isn't running")
+                self._condition.wait(remaining)
+            return self.responses[-1]
+
+    def _set_ok_received(self):
+        """ Flag that the printer acknowledged the last line and wake the
+        print thread.
+        """
+        with self._communication_lock:
+            self._ok_received.set()
+        self._notify()
+
+    def _acknowledge(self):
+        """ Handle an 'ok' from the printer by releasing the oldest line in
+        flight.
+
+        Returns
+        -------
+        acknowledged : Bool
+            False if the 'ok' only followed a resend request rather than
+            acknowledging a line.
+
+        """
+        with self._communication_lock:
+            acknowledged = not self._skip_ok
+            if self._skip_ok:
+                self._skip_ok = False
+            elif self._in_flight:
+                self._in_flight_bytes -= self._in_flight.popleft()
+            self._ok_received.set()
+        self._notify()
+        return acknowledged
+
+    def _request_resend(self, line_idx):
+        """ Rewind to `line_idx` after the printer asked for a resend.
+
+        Marlin flushes its RX buffer before asking for a resend, so every line
+        in flight is lost and will be sent again.
+        """
+        with self._communication_lock:
+            if line_idx < self._buffer.start:
+                logger.error('Resend requested for line {}, which is no '
+                             'longer buffered'.format(line_idx))
+                self.stop_printing = True
+                return
+            self._current_line_idx = line_idx
+            self._clear_in_flight()
+            self._skip_ok = True
+            self._ok_received.set()
+        self._notify()
+
+    def _clear_in_flight(self):
+        self._in_flight.clear()
+        self._in_flight_bytes = 0
+        self._skip_ok = False
+
+    def _can_send(self, line):
+        """ Returns True if the framed `line` may be written to the printer
+        now.
+        """
+        if self.rx_buffer_size is None:
+            return self._ok_received.is_set()
+        return (not self._in_flight or
+                self._in_flight_bytes + len(line) <= self.rx_buffer_size)
+
     def _start_print_thread(self):
         """ Spawns a new thread that will send all lines in the _buffer over
         serial to the printer. This thread can be stopped by setting
@@ -323,17 +603,47 @@ class Printer(object):
         self._read_thread.start()
         logger.debug('read_thread started')
 
+    def _start_load_thread(self, filepath, read_ahead):
+        """ Spawns a new thread that streams the lines of `filepath` into the
+        _buffer. Only one file can be streamed at a time.
+
+        """
+        if self._loading:
+            raise RuntimeError('A file is already being loaded')
+        self._loading = True
+        self._stop_loading = False
+        self._load_thread = Thread(target=self._load_worker_entrypoint,
+                                   args=(filepath, read_ahead), name='Load')
+        self._load_thread.setDaemon(True)
+        self._load_thread.start()
+        logger.debug('load_thread started')
+
+    def _load_worker_entrypoint(self, filepath, read_ahead):
+        try:
+            self._load_worker(filepath, read_ahead)
+        except Exception as e:
+            logger.exception("Exception running load worker: " + str(e))
+        finally:
+            with self._condition:
+                self._loading = False
+                self._condition.notify_all()
+
     def _print_worker_entrypoint(self):
         try:
             self._print_worker()
         except Exception as e:
             logger.exception("Exception running print worker: " + str(e))
+        finally:
+            self._notify()
 
     def _read_worker_entrypoint(self):
         try:
             self._read_worker()
         except Exception as e:
             logger.exception("Exception running read worker: " + str(e))
+        finally:
+            # Anyone waiting on a response must notice the thread is gone.
+            self._notify()
 
     def _is_print_thread_running(self):
         return self._print_thread is not None and self._print_thread.is_alive()
@@ -347,29 +657,67 @@ class Printer(object):
 
         """
         while not self.stop_printing:
-            _paused = False
-            while self.paused is True and not self.stop_printing:
-                if _paused is False:
-                    logger.debug('Printer.paused is True, waiting...')
-                    _paused = True
-                sleep(0.01)
-            if _paused is True:
-                logger.debug('Printer.paused is now False, resuming.')
-            if self._current_line_idx < len(self._buffer):
+            with self._condition:
+                _paused = False
+                while not self.stop_printing and (
+                        self.paused or self._current_line_idx >= len(self._buffer)):
+                    if self.paused:
+                        if _paused is False:
+                            logger.debug('Printer.paused is True, waiting...')
+                            _paused = True
+                    elif not self._loading:
+                        # if there aren't new lines wait until one is queued
+                        self.printing = False
+                    self._condition.wait()
+                if _paused is True:
+                    logger.debug('Printer.paused is now False, resuming.')
+                if self.stop_printing:
+                    break
                 self.printing = True
-                while not self._ok_received.is_set() and not self.stop_printing:
-                    self._ok_received.wait(1)
+                line_idx = self._current_line_idx
                 line = self._next_line()
-                with self._communication_lock:
-                    self.s.write(encode2To3(line))
-                    self._ok_received.clear()
-                    self._current_line_idx += 1
-                # Grab the just sent line without line numbers or checksum
-                plain_line = self._buffer[self._current_line_idx - 1].strip()
-                self.sentlines.append(plain_line)
-            else:  # if there aren't new lines wait 10ms and check again
-                sleep(0.01)
-                self.printing = False
+                while not self._can_send(line) and not self.stop_printing:
+                    self._condition.wait()
+                if self.stop_printing:
+                    break
+            with self._communication_lock:
+                if self._current_line_idx != line_idx:
+                    continue  # a resend was requested while waiting
+                self.s.write(line)
+                self._ok_received.clear()
+                self._in_flight.append(len(line))
+                self._in_flight_bytes += len(line)
+                self._current_line_idx += 1
+                oldest = self._current_line_idx - len(self._in_flight)
+            # Lines before the oldest unacknowledged one can't be asked for
+            # again, so only keep `history_size` of them.
+            with self._condition:
+                self._buffer.discard_before(oldest - self.history_size)
+                # wake anyone waiting for room in the buffer
+                self._condition.notify_all()
+            # Grab the just sent line without line numbers or checksum
+            plain_line = self._buffer[line_idx].strip()
+            self.sentlines.append(plain_line)
+
+    def _load_worker(self, filepath, read_ahead):
+        """ This method is spawned in the load thread. It appends the lines of
+        the file to the _buffer whenever fewer than `read_ahead` lines are
+        waiting to be sent.
+
+        """
+        with open(filepath) as f:
+            for line in f:
+                line = self._clean_line(line)
+                if not line:
+                    continue
+                with self._condition:
+                    while (len(self._buffer) - self._current_line_idx >= read_ahead
+                           and not self._stop_loading):
+                        self._condition.wait()
+                    if self._stop_loading:
+                        return
+                    self._buffer.append(line)
+                    self._condition.notify_all()
 
     def _read_worker(self):
         """ This method is spawned in the read thread. It continuously reads
@@ -381,10 +729,8 @@ class Printer(object):
             if self.s is not None:
                 line = decode2To3(self.s.readline())
                 if line.startswith('Resend: '):  # example line: "Resend: 143"
-                    self._current_line_idx = int(line.split()[1]) - 1 + self._reset_offset
+                    self._request_resend(int(line.split()[1]) - 1 + self._reset_offset)
                     logger.debug('Resend Requested - {}'.format(line.strip()))
-                    with self._communication_lock:
-                        self._ok_received.set()
                     continue
                 if line.startswith('T:'):
                     self.temp_readings.append(line)
@@ -398,29 +744,41 @@ class Printer(object):
                         self.printing = False
                         self.stop_printing = True
                         self.stop_reading = True
-                        with self._communication_lock:
-                            self._ok_received.set()
+                        self._set_ok_received()
                         msg = """readline timed out mid-line.
                             last sentline:  {}
                             response:       {}
                         """
-                        raise RuntimeError(msg.format(self.sentlines[-1:],
+                        raise RuntimeError(msg.format(list(self.sentlines)[-1:],
                                                       full_resp))
                 if 'ok' in line:
-                    with self._communication_lock:
-                        self._ok_received.set()
-                    self.responses.append(full_resp)
+                    if self._acknowledge():
+                        self._add_response(full_resp)
                     full_resp = ''
                 if 'start' in line:
-                    self.responses.append(line)
-            else:  # if no printer is attached, wait 10ms to check again.
-                sleep(0.01)
+                    self._add_response(line)
+            else:  # if no printer is attached, wait until one is connected.
+                self._wait_for(lambda: self.s is not None or self.stop_reading)
+
+    def _clean_line(self, line):
+        """ Strip whitespace and comments from `line`.
+        """
+        line = line.strip()
+        if ';' in line:  # clear out the comments
+            line = line.split(';')[0]
+        return line
 
     def _next_line(self):
         """ Prepares the next line to be sent to the printer by prepending the
         line number and appending a checksum and newline character.
 
+        The framed bytes are cached in the _buffer, so a line that has to be
+        resent is not framed again.
+
         """
+        frame = self._buffer.frame(self._current_line_idx)
+        if frame is not None:
+            return frame
         line = self._buffer[self._current_line_idx].strip()
         if line.startswith('M110 N'):
             new_number = int(line[6:])
@@ -428,13 +786,277 @@ class Printer(object):
         elif line.startswith('M110'):
             self._reset_offset = self._current_line_idx + 1
         idx = self._current_line_idx + 1 - self._reset_offset
-        line = 'N{} {}'.format(idx, line)
-        checksum = self._checksum(line)
-        return '{}*{}\n'.format(line, checksum)
+        line = encode2To3('N{} {}'.format(idx, line))
+        frame = line + encode2To3('*{}\n'.format(self._checksum(line)))
+        self._buffer.set_frame(self._current_line_idx, frame)
+        return frame
 
     def _checksum(self, line):
         """ Calclate the checksum by xor'ing all characters together.
         """
         if not line:
             raise RuntimeError("cannot compute checksum of an empty string")
-        return reduce(lambda a, b: a ^ b, [ord(char) for char in line])
+        if not isinstance(line, (bytes, bytearray)):
+            line = encode2To3(line)
+        return reduce(xor, bytearray(line))
+
+
+class PrinterGroup(object):
+    """ Sends the same stream of lines to several printers at once, such as a
+    farm of identical machines.
+
+    `sendline` puts lines on a fan-out queue, and every printer has a feeder
+    thread that takes the lines from it into the printer's own send buffer.
+    A feeder only keeps `max_pending` unsent lines in its printer, so a slow
+    printer holds back its own feeder but not the others. `sendline` only
+    waits once the slowest printer's feeder is `max_pending` lines behind
+    in the fan-out queue, which keeps memory bounded and means the printers
+    can drift at most twice that many lines apart.
+
+    Examples
+    --------
+    >>> group = PrinterGroup([Printer('/dev/ttyACM0'), Printer('/dev/ttyACM1')])
+    >>> group.connect()
+    >>> group.start()
+    >>> group.sendline('G1 X10')
+    >>> group.disconnect(wait=True)
+
+    """
+
+    def __init__(self, printers, transforms=None, max_pending=1000):
+        """
+        Parameters
+        ----------
+        printers : list of Printer
+            The printers to send to.
+        transforms : list of callables or None (default: None)
+            One entry per printer. Each callable takes a line and returns the
+            line to send to that printer, or None to skip the line. An entry of
+            None sends lines unchanged.
+        max_pending : int or None (default: 1000)
+            The number of unsent lines each printer may have, and the number
+            of lines the fan-out queue holds for the slowest printer before
+            `sendline` waits. If None, neither is limited.
+
+        """
+        self.printers = list(printers)
+        if transforms is None:
+            transforms = [None] * len(self.printers)
+        if len(transforms) != len(self.printers):
+            msg = 'Expected {} transforms, got {}'
+            raise ValueError(msg.format(len(self.printers), len(transforms)))
+        self.transforms = list(transforms)
+        self.max_pending = max_pending
+        self._start_time = None
+
+        # Condition used to wake the feeders and `sendline` whenever the
+        # fan-out queue changes.
+        self._condition = Condition()
+
+        # The lines not yet taken by every feeder. `_queue_start` is the
+        # index of the first of them in the whole stream, and `_taken` the
+        # index of the next line for each feeder, or None once it stopped.
+        self._queue = deque()
+        self._queue_start = 0
+        self._taken = [0] * len(self.printers)
+
+        self._feeders = [None] * len(self.printers)
+        self._stop_feeding = False
+
+    def connect(self, serials=None):
+        """ Connect every printer.
+
+        Parameters
+        ----------
+        serials : list of serial.Serial or None (default: None)
+            One serial object per printer to use instead of opening the
+            printers' ports.
+
+        """
+        if serials is None:
+            serials = [None] * len(self.printers)
+        for printer, s in zip(self.printers, serials):
+            printer.connect(s)
+        self._start_feeders()
+
+    def start(self):
+        """ Start the threads of every printer.
+        """
+        self._start_time = time()
+        for printer in self.printers:
+            printer.start()
+        self._start_feeders()
+
+    def sendline(self, line):
+        """ Queue `line` for every printer, after its transform.
+        """
+        self._start_feeders()
+        with self._condition:
+            while (self.max_pending is not None and
+                   len(self._queue) >= self.max_pending and
+                   any(taken is not None for taken in self._taken)):
+                self._condition.wait()
+            self._queue.append(line)
+            self._condition.notify_all()
+
+    def get_response(self, line, timeout=0):
+        """ Send `line` to every printer once they have been given all lines
+        queued before it, and return their responses.
+
+        Returns
+        -------
+        r : list of str
+            The response of each printer.
+
+        """
+        self._wait_until_fed()
+        # Send to every printer before waiting for any of them.
+        start_time = time()
+        buf_lens = []
+        for printer, transform in zip(self.printers, self.transforms):
+            out = line if transform is None else transform(line)
+            buf_lens.append(len(printer._buffer) + 1 if out else None)
+            if out:
+                printer.sendline(out)
+        responses = []
+        for printer, buf_len in zip(self.printers, buf_lens):
+            if buf_len is None:
+                responses.append('')
+            else:
+                responses.append(printer._wait_for_response(buf_len, start_time,
+                                                            timeout))
+        return responses
+
+    def disconnect(self, wait=False):
+        """ Stop the feeders and disconnect every printer. See
+        `Printer.disconnect`. If `wait` is True, the lines in the fan-out
+        queue are given to the printers first.
+        """
+        if wait:
+            self._wait_until_fed()
+        with self._condition:
+            self._stop_feeding = True
+            self._condition.notify_all()
+        for printer in self.printers:
+            printer._notify()
+        for feeder in self._feeders:
+            if feeder is not None:
+                feeder.join(10)
+        for printer in self.printers:
+            printer.disconnect(wait)
+        with self._condition:
+            self._queue.clear()
+            self._queue_start = 0
+            self._taken = [0] * len(self.printers)
+            self._feeders = [None] * len(self.printers)
+            self._stop_feeding = False
+
+    def progress(self):
+        """ Report how far along each printer is.
+
+        Returns
+        -------
+        progress : list of dict
+            One dict per printer with the keys 'port', 'waiting' (lines in
+            the fan-out queue not yet given to the printer), 'queued' (lines
+            given to the printer in total), 'sent', 'acknowledged' and
+            'lines_per_second' (lines acknowledged per second since `start`).
+
+        """
+        elapsed = None
+        if self._start_time is not None:
+            elapsed = time() - self._start_time
+        with self._condition:
+            end = self._queue_start + len(self._queue)
+            waiting = [0 if taken is None else end - taken for taken in self._taken]
+        progress = []
+        for printer, lines in zip(self.printers, waiting):
+            acknowledged = printer._response_count
+            progress.append({
+                'port': printer.port,
+                'waiting': lines,
+                'queued': len(printer._buffer),
+                'sent': printer._current_line_idx,
+                'acknowledged': acknowledged,
+                'lines_per_second': acknowledged / elapsed if elapsed else 0.0,
+            })
+        return progress
+
+    def _start_feeders(self):
+        """ Spawn the feeder thread of every printer that has none yet.
+        """
+        for i, feeder in enumerate(self._feeders):
+            if feeder is not None:
+                continue
+            feeder = Thread(target=self._feed_worker_entrypoint, args=(i,),
+                            name='Feed')
+            feeder.setDaemon(True)
+            feeder.start()
+            self._feeders[i] = feeder
+
+    def _feed_worker_entrypoint(self, i):
+        try:
+            self._feed_worker(i)
+        except Exception as e:
+            logger.exception("Exception running feed worker: " + str(e))
+        finally:
+            with self._condition:
+                # Don't hold back the queue for a feeder that is gone.
+                self._taken[i] = None
+                self._discard_taken()
+                self._condition.notify_all()
+
+    def _feed_worker(self, i):
+        """ This method is spawned in the feeder thread of the `i`th printer.
+        It gives the lines of the fan-out queue to the printer whenever it
+        has fewer than `max_pending` unsent lines.
+
+        """
+        printer, transform = self.printers[i], self.transforms[i]
+        while True:
+            with self._condition:
+                while (not self._stop_feeding and
+                       self._taken[i] >= self._queue_start + len(self._queue)):
+                    self._condition.wait()
+                if self._stop_feeding:
+                    return
+                line = self._queue[self._taken[i] - self._queue_start]
+            out = line if transform is None else transform(line)
+            if out:
+                if self.max_pending is not None:
+                    printer._wait_for(lambda: printer.pending < self.max_pending or
+                                      not printer._is_print_thread_running() or
+                                      self._stop_feeding)
+                    if self._stop_feeding:
+                        return
+                printer.sendline(out)
+            with self._condition:
+                self._taken[i] += 1
+                self._discard_taken()
+                self._condition.notify_all()
+
+    def _discard_taken(self):
+        """ Drop the lines every feeder has taken from the fan-out queue.
+        """
+        taken = [t for t in self._taken if t is not None]
+        end = min(taken) if taken else self._queue_start + len(self._queue)
+        while self._queue_start < end:
+            self._queue.popleft()
+            self._queue_start += 1
+
+    def _wait_until_fed(self):
+        """ Block until every running feeder has given all queued lines to
+        its printer.
+        """
+        with self._condition:
+            while any(taken is not None and
+                      taken < self._queue_start + len(self._queue)
+                      for taken in self._taken):
+                self._condition.wait()
+
+    @property
+    def throughput(self):
+        """ The total lines acknowledged per second by all printers since
+        `start`.
+        """
+        return sum(p['lines_per_second'] for p in self.progress())
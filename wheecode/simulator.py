@@ -0,0 +1,232 @@
+import random
+import re
+from collections import deque
+from threading import Thread, Condition
+from time import sleep, time
+
+from wheecode.printer import encode2To3, decode2To3
+
+LINE_RE = re.compile(r'^N(\d+) (.*)\*(\d+)$')
+
+
+class MarlinSimulator(object):
+    """ A stand-in for the `serial.Serial` object of a printer running Marlin,
+    for exercising and benchmarking `Printer` without hardware.
+
+    Lines written to the simulator are held in an RX buffer of
+    `rx_buffer_size` bytes and processed in order by a background thread,
+    taking `processing_time` seconds each. Each one is checked for its line
+    number and checksum and answered with 'ok', which becomes readable
+    `latency` seconds later. Errors are answered like Marlin does, by
+    flushing the RX buffer and requesting a resend. Lines that arrive while
+    the RX buffer is full are lost, as they would be on a real serial link,
+    and are only noticed once a later line arrives with the wrong number.
+
+    Commands that were accepted are recorded in `received`. `M114` is
+    answered with the current position and `G0`/`G1` moves update it.
+
+    Examples
+    --------
+    >>> from wheecode.printer import Printer
+    >>> s = MarlinSimulator(latency=0.001)
+    >>> p = Printer()
+    >>> p.connect(s)
+    >>> p.start()
+    >>> p.sendline('G1 X10')
+    >>> p.get_response('M114')
+    'X:10.00 Y:0.00 Z:0.00 E:0.00 Count X: 10.00 Y:0.00 Z:0.00\\nok\\n'
+
+    """
+
+    def __init__(self, latency=0, processing_time=0, rx_buffer_size=128,
+                 resend_rate=0, timeout_rate=0, timeout_delay=None, timeout=0.1,
+                 writeTimeout=1, seed=None):
+        """
+        Parameters
+        ----------
+        latency : float (default: 0)
+            Seconds between the simulator answering a line and the answer
+            becoming readable, standing in for the round trip over the link.
+        processing_time : float (default: 0)
+            Seconds spent processing each line before it is answered. Lines
+            behind it wait in the RX buffer meanwhile.
+        rx_buffer_size : int (default: 128)
+            The number of bytes the simulated firmware can hold before it
+            starts losing incoming lines.
+        resend_rate : float (default: 0)
+            Probability that a line is treated as corrupted, which makes the
+            simulator ask for it to be resent.
+        timeout_rate : float (default: 0)
+            Probability that the answer to a line is held back long enough for
+            `readline` to time out first.
+        timeout_delay : float or None (default: None)
+            How long held back answers are delayed. Defaults to twice
+            `timeout`.
+        timeout : float (default: 0.1)
+            Seconds `readline` waits for a line before returning an empty
+            string, like `serial.Serial.timeout`.
+        writeTimeout : float (default: 1)
+            Only used by `Printer` to size its thread join timeouts.
+        seed : int or None (default: None)
+            Seed for the random fault injection.
+
+        """
+        self.latency = latency
+        self.processing_time = processing_time
+        self.rx_buffer_size = rx_buffer_size
+        self.resend_rate = resend_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_delay = 2 * timeout if timeout_delay is None else timeout_delay
+        self.timeout = timeout
+        self.writeTimeout = writeTimeout
+
+        # The accepted commands, without line numbers or checksums.
+        self.received = []
+
+        # Counters of the faults that occured.
+        self.resends = 0
+        self.timeouts = 0
+        self.overflows = 0
+
+        self.position = {'X': 0.0, 'Y': 0.0, 'Z': 0.0, 'E': 0.0}
+        self.absolute = True
+
+        self._random = random.Random(seed)
+        self._last_line_number = 0
+        self._rx = deque()
+        self._rx_bytes = 0
+        self._tx = deque()
+        self._condition = Condition()
+        self._closed = False
+        self._thread = Thread(target=self._process, name='MarlinSimulator')
+        self._thread.daemon = True
+        self._thread.start()
+
+    ###  Serial Interface  ####################################################
+
+    def write(self, data):
+        with self._condition:
+            if self._rx_bytes + len(data) > self.rx_buffer_size:
+                self.overflows += 1
+            else:
+                self._rx.append(data)
+                self._rx_bytes += len(data)
+                self._condition.notify_all()
+        return len(data)
+
+    def readline(self):
+        deadline = time() + self.timeout
+        with self._condition:
+            while not self._closed:
+                now = time()
+                if self._tx and self._tx[0][0] <= now:
+                    return self._tx.popleft()[1]
+                if now >= deadline:
+                    break
+                wait = deadline - now
+                if self._tx:  # the next answer is still on its way
+                    wait = min(wait, self._tx[0][0] - now)
+                self._condition.wait(wait)
+            return encode2To3('')
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(1)
+
+    ###  Private Methods  #####################################################
+
+    def _send(self, lines, delay=0):
+        """ Queue `lines` to be readable after `latency` plus `delay`
+        seconds, behind any answer that is still on its way.
+        """
+        ready = time() + self.latency + delay
+        with self._condition:
+            if self._tx:
+                ready = max(ready, self._tx[-1][0])
+            self._tx.extend((ready, encode2To3(line + '\n')) for line in lines)
+            self._condition.notify_all()
+
+    def _process(self):
+        """ Runs in the simulator thread, answering each line in the RX
+        buffer in turn.
+        """
+        while True:
+            with self._condition:
+                while not self._rx and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                data = self._rx.popleft()
+                self._rx_bytes -= len(data)
+            if self.processing_time:
+                sleep(self.processing_time)
+            answer = self._handle(decode2To3(data).strip())
+            delay = 0
+            if self.timeout_rate and self._random.random() < self.timeout_rate:
+                self.timeouts += 1
+                delay = self.timeout_delay
+            self._send(answer, delay)
+
+    def _request_resend(self, error):
+        with self._condition:
+            self._rx.clear()
+            self._rx_bytes = 0
+        self.resends += 1
+        return ['Error:' + error,
+                'Resend: {}'.format(self._last_line_number + 1),
+                'ok']
+
+    def _handle(self, line):
+        """ Check and run a single framed line, returning the lines of the
+        answer.
+        """
+        match = LINE_RE.match(line)
+        if match is None:
+            return self._request_resend('No Line Number with checksum, Last Line: {}'
+                                        .format(self._last_line_number))
+        number, command, checksum = match.groups()
+        number = int(number)
+        framed = line[:line.rindex('*')]
+        actual = 0
+        for char in bytearray(encode2To3(framed)):
+            actual ^= char
+        if actual != int(checksum) or (
+                self.resend_rate and self._random.random() < self.resend_rate):
+            return self._request_resend('checksum mismatch, Last Line: {}'
+                                        .format(self._last_line_number))
+        if number != self._last_line_number + 1 and not command.startswith('M110'):
+            return self._request_resend('Line Number is not Last Line Number+1, '
+                                        'Last Line: {}'.format(self._last_line_number))
+        self._last_line_number = number
+        self.received.append(command)
+        return self._run(command) + ['ok']
+
+    def _run(self, command):
+        """ Update the simulated state for `command` and return any lines it
+        prints before the 'ok'.
+        """
+        words = command.split()
+        code = words[0]
+        if code == 'M110':
+            for word in words[1:]:
+                if word.startswith('N'):
+                    self._last_line_number = int(word[1:])
+        elif code == 'G90':
+            self.absolute = True
+        elif code == 'G91':
+            self.absolute = False
+        elif code in ('G0', 'G1'):
+            for word in words[1:]:
+                axis = word[0]
+                if axis in self.position:
+                    value = float(word[1:])
+                    if not self.absolute:
+                        value += self.position[axis]
+                    self.position[axis] = value
+        elif code == 'M114':
+            p = self.position
+            return ['X:{X:.2f} Y:{Y:.2f} Z:{Z:.2f} E:{E:.2f} '
+                    'Count X: {X:.2f} Y:{Y:.2f} Z:{Z:.2f}'.format(**p)]
+        return []
@@ -0,0 +1,217 @@
+import logging
+import socket
+from collections import deque
+from threading import Thread, Condition, Event
+from time import time
+
+from wheecode.main import encode2To3, decode2To3
+
+logger = logging.getLogger(__name__)
+
+
+class Response(object):
+    """ The pending response to a line sent through a `SocketTransport`.
+
+    """
+
+    def __init__(self, line):
+        self.line = line
+        self._done = Event()
+        self._value = None
+        self._error = None
+
+    def done(self):
+        """ Returns True once the controller has answered the line.
+        """
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """ Wait for the controller to answer and return its response.
+
+        Raises
+        ------
+        RuntimeError
+            If the controller reported an error for this line, the
+            connection was lost, or `timeout` seconds passed first.
+
+        """
+        if not self._done.wait(timeout):
+            msg = 'Timed out waiting for a response to: {}'
+            raise RuntimeError(msg.format(self.line))
+        if self._error is not None:
+            raise RuntimeError(self._error)
+        return self._value
+
+    def _set_result(self, value):
+        self._value = value
+        self._done.set()
+
+    def _set_error(self, error):
+        self._error = error
+        self._done.set()
+
+
+class SocketTransport(object):
+    """ Sends lines to a motion controller over a TCP socket without waiting
+    for each answer before sending the next line.
+
+    The controller is expected to answer every line, in order, with a
+    response terminated by a newline. Responses starting with '%' are
+    successes and anything else is an error. Up to `window` lines may be
+    unanswered at any time; `send` blocks once the window is full. A
+    background thread reads the responses and matches them to the lines that
+    were sent.
+
+    The first error reported by the controller is passed to `on_error` and
+    raised by the next call to `send`, `wait` or `close`.
+
+    """
+
+    def __init__(self, host='localhost', port=8000, window=16, lineend='\n',
+                 on_error=None, sock=None):
+        """
+        Parameters
+        ----------
+        host : str (default: 'localhost')
+            Hostname of the controller.
+        port : int (default: 8000)
+            Port of the controller.
+        window : int (default: 16)
+            The maximum number of lines awaiting a response.
+        lineend : str (default: newline)
+            Appended to every line that is sent.
+        on_error : callable or None (default: None)
+            Called from the reader thread with the failed `Response` when the
+            controller reports an error.
+        sock : socket.socket or None (default: None)
+            An already connected socket to use instead of connecting to
+            `host` and `port`.
+
+        """
+        self.host = host
+        self.port = port
+        self.window = window
+        self.lineend = lineend
+        self.on_error = on_error
+        self.error = None
+
+        self._socket = sock
+        self._pending = deque()
+        self._condition = Condition()
+        self._closed = False
+        self._read_thread = None
+
+    def connect(self):
+        """ Open the socket, if needed, and start the reader thread.
+        """
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._socket.connect((self.host, self.port))
+        self._read_thread = Thread(target=self._read_worker, name='SocketRead')
+        self._read_thread.daemon = True
+        self._read_thread.start()
+
+    def send(self, line):
+        """ Send `line` once there is room in the window and return its
+        `Response`.
+        """
+        if self._read_thread is None:
+            self.connect()
+        response = Response(line)
+        with self._condition:
+            while len(self._pending) >= self.window and self.error is None:
+                self._condition.wait()
+            self._raise_error()
+            self._pending.append(response)
+        self._socket.sendall(encode2To3(line + self.lineend))
+        return response
+
+    def wait(self, timeout=None):
+        """ Wait until every line sent so far has been answered.
+
+        Returns
+        -------
+        done : bool
+            False if `timeout` seconds passed before all lines were answered.
+
+        """
+        deadline = None if timeout is None else time() + timeout
+        with self._condition:
+            while self._pending and self.error is None:
+                remaining = None if deadline is None else deadline - time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            self._raise_error()
+            return not self._pending
+
+    def close(self, wait=True):
+        """ Close the connection.
+
+        Parameters
+        ----------
+        wait : Bool (default: True)
+            If True, wait for all outstanding responses before closing.
+
+        """
+        try:
+            if wait and self._read_thread is not None:
+                self.wait()
+        finally:
+            with self._condition:
+                self._closed = True
+            if self._socket is not None:
+                try:
+                    self._socket.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+                self._socket.close()
+            if self._read_thread is not None:
+                self._read_thread.join(1)
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RuntimeError(self.error)
+
+    def _read_worker(self):
+        """ Reads newline terminated responses and resolves the oldest pending
+        line with each of them.
+        """
+        data = b''
+        while True:
+            try:
+                chunk = self._socket.recv(8192)
+            except socket.error:
+                chunk = b''
+            if not chunk:
+                self._fail_pending('Connection to controller closed')
+                return
+            data += chunk
+            responses = data.split(b'\n')
+            data = responses.pop()  # keep any incomplete response
+            for response in responses:
+                self._resolve(decode2To3(response).rstrip('\r'))
+
+    def _resolve(self, text):
+        with self._condition:
+            if not self._pending:
+                logger.warning('Unexpected response from controller: %s', text)
+                return
+            response = self._pending.popleft()
+            if text.startswith('%'):
+                response._set_result(text[1:])
+            else:
+                response._set_error(text)
+                if self.error is None:
+                    self.error = text
+            self._condition.notify_all()
+        if response._error is not None and self.on_error is not None:
+            self.on_error(response)
+
+    def _fail_pending(self, msg):
+        with self._condition:
+            if not self._closed and self.error is None:
+                self.error = msg
+            while self._pending:
+                self._pending.popleft()._set_error(msg)
+            self._condition.notify_all()
@@ -0,0 +1,135 @@
+from threading import Thread
+
+try:
+    from queue import Queue, Full
+except ImportError:
+    from Queue import Queue, Full
+
+
+class StreamClosed(Exception):
+    """ Raised inside a program run by `generate` when the consumer stops
+    iterating before the program finished.
+    """
+
+
+class LineQueue(object):
+    """ A write-only file-like object that hands the complete lines written to
+    it to another thread through a bounded queue.
+
+    `write` blocks while `maxsize` writes are waiting to be consumed, so a
+    fast producer is held back by a slow consumer.
+
+    """
+
+    # Sentinel queued once the producer is done.
+    _END = object()
+
+    def __init__(self, maxsize=1000):
+        self._queue = Queue(maxsize)
+        self._partial = ''
+        self._closed = False
+
+    def write(self, data):
+        lines = (self._partial + data).split('\n')
+        self._partial = lines.pop()
+        if lines:
+            self._put([line.rstrip('\r') for line in lines])
+
+    def flush(self):
+        pass
+
+    def finish(self, error=None):
+        """ Signal the consumer that no more lines will be written, passing
+        on `error` if the producer failed.
+        """
+        if self._partial:
+            self._put([self._partial.rstrip('\r')])
+            self._partial = ''
+        self._put((self._END, error))
+
+    def close(self):
+        """ Stop the consumer side. Further writes raise `StreamClosed`.
+        """
+        self._closed = True
+
+    def _put(self, item):
+        while True:
+            if self._closed:
+                raise StreamClosed()
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except Full:
+                pass
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if isinstance(item, tuple) and item[0] is self._END:
+                if item[1] is not None:
+                    raise item[1]
+                return
+            for line in item:
+                yield line
+
+
+def generate(program, g_class=None, maxsize=1000, **kwargs):
+    """ Run `program` in a background thread and yield the lines of GCode it
+    produces as they are generated.
+
+    The program is only run as fast as the lines are consumed, so huge
+    programs can be streamed to a file, a printer or another processing step
+    without holding all of their lines in memory. If the consumer stops
+    early, the program is interrupted with `StreamClosed`. Exceptions raised
+    by the program are raised by the generator.
+
+    Parameters
+    ----------
+    program : callable
+        Called with the G instance to generate commands on.
+    g_class : class or None (default: None)
+        The G subclass to instantiate, G by default.
+    maxsize : int (default: 1000)
+        The number of writes that may be waiting to be consumed before the
+        program is paused.
+    **kwargs
+        Passed on to the `g_class` constructor.
+
+    Examples
+    --------
+    >>> def program(g):
+    ...     g.move(10, 0)
+    ...     g.meander(5, 5, 1)
+    >>> for line in generate(program):
+    ...     printer.sendline(line)
+
+    """
+    if g_class is None:
+        from wheecode.main import G as g_class
+    queue = LineQueue(maxsize)
+    kwargs.setdefault('print_lines', False)
+
+    def run():
+        error = None
+        try:
+            g = g_class(outfile=queue, **kwargs)
+            program(g)
+            g.teardown()
+        except StreamClosed:
+            return
+        except Exception as e:
+            error = e
+        try:
+            queue.finish(error)
+        except StreamClosed:
+            pass
+
+    thread = Thread(target=run, name='Generate')
+    thread.daemon = True
+    thread.start()
+    try:
+        for line in queue:
+            yield line
+    finally:
+        queue.close()
+        thread.join()
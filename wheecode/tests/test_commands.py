@@ -0,0 +1,114 @@
+#! /usr/bin/env python
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+HERE = dirname(abspath(__file__))
+
+try:
+    from wheecode import G
+except:
+    sys.path.append(abspath(join(HERE, '..', '..')))
+    from wheecode import G
+
+from wheecode.commands import (parse_opcode, RAPID, MOVE, ARC_CW, ARC_CCW,
+                               OTHER)
+
+
+class TestCommandLog(unittest.TestCase):
+
+    def setUp(self):
+        self.g = G(print_lines=False, record_commands=True)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(G(print_lines=False).commands)
+
+    def test_parse_opcode(self):
+        self.assertEqual(parse_opcode('G0 X1'), RAPID)
+        self.assertEqual(parse_opcode('G01 X1'), MOVE)
+        self.assertEqual(parse_opcode('g2 X1 Y1 R1'), ARC_CW)
+        self.assertEqual(parse_opcode('G3 X1 Y1 R1'), ARC_CCW)
+        self.assertEqual(parse_opcode('G92 X0'), OTHER)
+        self.assertEqual(parse_opcode(''), OTHER)
+
+    def test_records_state_after_each_command(self):
+        g = self.g
+        g.feed(100)
+        g.move(1, 2, color=(1, 0, 0))
+        g.rapid(z=1)
+        g.arc(x=2, y=2)
+        g.set_home(0, 0)
+        log = g.commands
+        self.assertEqual(len(log), 7)
+        np.testing.assert_array_equal(
+            log.opcode, [OTHER, MOVE, MOVE, RAPID, OTHER, ARC_CW, OTHER])
+        np.testing.assert_allclose(log.position, [[0, 0, 0], [0, 0, 0],
+                                                  [1, 2, 0], [1, 2, 1],
+                                                  [1, 2, 1], [3, 4, 1],
+                                                  [0, 0, 1]])
+        np.testing.assert_array_equal(log.feed, [0, 100, 100, 100, 100, 100, 100])
+        self.assertEqual(log.color[2], (1, 0, 0))
+        self.assertIsNone(log.color[4])
+        self.assertEqual(log.text[5], 'G2 X2.000000 Y2.000000 R1.414214')
+        np.testing.assert_allclose(log.lengths(), [0, 0, 5 ** 0.5, 1, 0, 8 ** 0.5, 5])
+        np.testing.assert_array_equal(log.is_motion(),
+                                      [False, True, True, True, False, True, False])
+
+    def test_moves_matches_move(self):
+        points = [[1, 0], [0, 2], [-3, 1]]
+        single = G(print_lines=False, record_commands=True, extrude=True)
+        for x, y in points:
+            single.move(x, y)
+        self.g.extrude = True
+        self.g.moves(points)
+        expected, actual = single.commands, self.g.commands
+        np.testing.assert_array_equal(actual.opcode, expected.opcode)
+        np.testing.assert_allclose(actual.position, expected.position)
+        np.testing.assert_allclose(actual.e, expected.e)
+        self.assertEqual(list(actual.text), list(expected.text))
+
+    def test_extruding(self):
+        self.g.toggle_pressure(3)
+        self.g.move(1)
+        self.assertEqual(self.g.commands.extruding.tolist(), [False, True, True])
+
+    def test_to_gcode(self):
+        g = self.g
+        g.move(1, 2)
+        g.move(3, 0)
+        g.arc(x=2, y=2)
+        g.move(A=5)
+        g.dwell(5)
+        g.abs_move(z=1)
+        self.assertEqual(list(g.commands.to_gcode()), [
+            'G90',
+            'G1 X1.000000 Y2.000000',
+            'G1 X4.000000',
+            'G17 ; XY plane',
+            'G91',
+            'G2 X2.000000 Y2.000000 R1.414214',
+            'G1 A5.000000',
+            'G4 P5',
+            'G90',
+            'G1 Z1.000000',
+        ])
+
+    def test_record_without_text(self):
+        g = G(outfile=None, print_lines=False, record_commands=True)
+        g.meander(2, 2, 1)
+        self.assertEqual(len(g.commands), 6)
+        self.assertEqual(g.commands.position[-1].tolist(), [2, 2, 0])
+
+    def test_clear(self):
+        self.g.move(1)
+        self.g.commands.clear()
+        self.assertEqual(len(self.g.commands), 0)
+        self.g.move(1)
+        self.assertEqual(self.g.commands.position.tolist(), [[2, 0, 0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,11 @@ from os.path import abspath, dirname
 
 HERE = dirname(abspath(__file__))
 
+try:
+    import sympy
+except ImportError:
+    sympy = None
+
 try:
     from wheecode import G, is_str, decode2To3
 except:
@@ -731,6 +736,80 @@ class TestG(TestGFixture):
         self.assert_output()
         self.assert_position({'x': 3, 'y': 4, 'z': 0})
 
+    def test_spiral(self):
+        self.g.spiral(4, 1, 8, step_angle=2)
+        self.expect_cmd("""
+        G90 ; absolute
+        G1 X0.000000 Y0.000000
+        G1 F8
+        G1 X0.132464 Y0.289438
+        G1 X0.416122 Y-0.481795
+        G1 X-0.916895 Y-0.266822
+        G1 X0.185256 Y1.259690
+        G1 X1.335424 Y-0.865836
+        G1 X-1.611642 Y-1.024779
+        G1 X-2.000000 Y-0.000000
+        G91 ; relative
+        """)
+        self.assert_output()
+        self.assert_almost_position({'x': -2, 'y': 0, 'z': 0})
+
+        self.g.spiral(4, 1, 8, start='edge', direction='CCW', step_angle=2)
+        self.expect_cmd("""
+        G90 ; absolute
+        G1 X-4.000000 Y-0.000000
+        G1 F8
+        G1 X-3.611642 Y-1.024779
+        G1 X-0.664576 Y-0.865836
+        G1 X-1.814744 Y1.259690
+        G1 X-2.916895 Y-0.266822
+        G1 X-1.583878 Y-0.481795
+        G1 X-1.867536 Y0.289438
+        G1 X-2.000000 Y-0.000000
+        G91 ; relative
+        """)
+        self.assert_output()
+        self.assert_almost_position({'x': -2, 'y': 0, 'z': 0})
+        self.assertEqual(len(self.g.position_history), 17)
+
+    @unittest.skipIf(sympy is None, 'gradient_spiral requires sympy')
+    def test_gradient_spiral(self):
+        self.g.gradient_spiral(end_diameter=6, spacing=1, gradient='20 - 2*r',
+                               feedrate=8, flowrate=0.5, step_angle=3,
+                               start_diameter=2, dead_delay=1)
+        self.expect_cmd("""
+        G90 ; absolute
+        G1 X-1.000000 Y-0.000000
+        G1 F8
+        G92 a0 b0
+        G1 X1.462679 Y0.208500 a0.042052 b0.112416
+        G1 X-1.877065 Y-0.546238 a0.105649 b0.262817
+        G1 X2.216228 Y1.002435 a0.194412 b0.447583
+        G1 X-2.455496 Y-1.561352 a0.312256 b0.662800
+        G1 X-3.000000 Y-0.000000 a0.352049 b0.726355
+        G91 ; relative
+        """)
+        self.assert_output()
+
+        # A constant gradient is broadcast to every segment.
+        self.g.gradient_spiral(end_diameter=4, spacing=1, gradient='15',
+                               feedrate=8, flowrate=0.5, step_angle=3,
+                               start='edge')
+        self.expect_cmd("""
+        G90 ; absolute
+        G1 X-1.000000 Y-0.000000
+        G1 F8
+        G92 a0 b0
+        G1 X-1.388358 Y-1.024779 a0.024249 b0.044245
+        G1 X-4.305098 Y0.590316 a0.098020 b0.178852
+        G1 X-2.083105 Y-0.266822 a0.150717 b0.275004
+        G1 X-3.472687 Y0.067380 a0.182340 b0.332706
+        G1 X-3.000000 Y-0.000000 a0.192905 b0.351983
+        G91 ; relative
+        """)
+        self.assert_output()
+        self.assertAlmostEqual(self.g.color_history[-1], 0.3540269457009745)
+
     def test_output_digits(self):
         self.g.output_digits = 1
         self.g.move(10)
@@ -754,6 +833,174 @@ class TestG(TestGFixture):
         assert(type(lines[0]) == bytes)
         outfile.close()
 
+    def test_position_history(self):
+        self.g.move(10, 10)
+        self.g.move(z=5, color=(1, 0, 0))
+        history = self.g.position_history.array
+        self.assertEqual(history.shape, (3, 3))
+        self.assertEqual(history.tolist(), [[0, 0, 0], [10, 10, 0],
+                                            [10, 10, 5]])
+        self.assertEqual(len(self.g.color_history), 3)
+        self.assertEqual(self.g.color_history[2], (1, 0, 0))
+        with self.assertRaises(ValueError):
+            history[0, 0] = 1
+
+    def test_position_history_growth(self):
+        for _ in range(3000):
+            self.g.move(1)
+        self.assertEqual(len(self.g.position_history), 3001)
+        self.assertEqual(self.g.position_history[-1][0], 3000)
+        self.assertEqual(self.g.position_history[1:].sum(axis=0)[0],
+                         3000 * 3001 / 2)
+
+    def test_moves(self):
+        points = [[1, 2], [3, -4], [0.5, 0]]
+        for x, y in points:
+            self.g.move(x, y)
+        expected_position = dict(self.g.current_position)
+        expected_history = self.g.position_history.array.tolist()
+        self.outfile.seek(0)
+        self.expected = self.outfile.read()
+        self.g.moves(points)
+        self.expect_cmd('''
+        G1 X1.000000 Y2.000000
+        G1 X3.000000 Y-4.000000
+        G1 X0.500000 Y0.000000
+        ''')
+        self.assert_output()
+        for k, v in expected_position.items():
+            self.assertAlmostEqual(self.g.current_position[k], 2 * v)
+        self.assertEqual(len(self.g.position_history), 7)
+        self.assertEqual(self.g.position_history[3].tolist(),
+                         expected_history[3])
+
+        self.g.moves([[1, 1, 1], [2, 2, 2]], axes=('x', 'y', 'z'),
+                     absolute=True)
+        self.expect_cmd('''
+        G90 ; absolute
+        G1 X1.000000 Y1.000000 Z1.000000
+        G1 X2.000000 Y2.000000 Z2.000000
+        G91 ; relative
+        ''')
+        self.assert_output()
+        self.assert_position({'x': 2, 'y': 2, 'z': 2})
+
+        self.g.moves([[5], [-1]], axes=('z',), rapid=True)
+        self.expect_cmd('''
+        G0 Z5.000000
+        G0 Z-1.000000
+        ''')
+        self.assert_output()
+        self.assert_almost_position({'x': 2, 'y': 2, 'z': 6})
+
+    def test_moves_matches_move(self):
+        points = [[1, 2], [3, -4], [0.5, 0]]
+        self.g.extrude = True
+        self.g.rename_axis(z='A')
+        self.g.absolute()
+        for x, y in points:
+            self.g.move(x, y, z=x)
+        self.g.relative()
+        for x, y in points:
+            self.g.move(x, y, z=x)
+        reference = self.g
+        self.outfile.seek(0)
+        expected = self.outfile.read()
+
+        self.outfile = TemporaryFile('w+')
+        self.g = self.getGClass()(outfile=self.outfile, print_lines=False)
+        self.g.extrude = True
+        self.g.rename_axis(z='A')
+        xyz = [[x, y, x] for x, y in points]
+        self.g.moves(xyz, axes=('x', 'y', 'z'), absolute=True)
+        self.g.moves(xyz, axes=('x', 'y', 'z'))
+        self.outfile.seek(0)
+        self.assertEqual(self.outfile.read(), expected.replace(
+            'G90 ; absolute\nG91 ; relative\n', ''))
+        self.assertEqual(self.g.current_position, reference.current_position)
+        self.assertEqual(self.g.position_history.array.tolist(),
+                         reference.position_history.array.tolist())
+        reference.teardown()
+
+    def test_record_history_disabled(self):
+        g = self.getGClass()(print_lines=False, record_history=False)
+        g.move(10, 10)
+        g.feed(5)
+        g.move(z=1)
+        self.assertEqual(len(g.position_history), 1)
+        self.assertEqual(len(g.color_history), 1)
+        self.assertEqual(g.speed_history, [])
+        self.assertEqual(g.extruding_history, [])
+        self.assertAlmostEqual(g.current_position['z'], 1)
+        with self.assertRaises(RuntimeError):
+            g.export_APE()
+
+    def test_view_groups(self):
+        g = self.g
+        g.move(1, 0)
+        g.extruding = [None, True]
+        g.move(0, 1)
+        g.move(1, 1, color='red')
+        g.moves([[2, 0], [2, 0]], color=[1, 0, 0])
+        g.extruding = [None, False]
+        g.move(1, 1)
+        g.extruding = [None, True]
+        g.moves([[1, 0], [1, 0]])
+
+        def ends(segments):
+            return segments[:, 1, :2].tolist()
+
+        groups = g._view_groups()
+        self.assertEqual([style for _, style in groups],
+                         [dict(colors='k', linestyles='--', linewidths=0.5),
+                          dict(colors=[(0, 0, 0, 0.5)]),
+                          dict(colors=['red']),
+                          dict(colors=[(1, 0, 0)])])
+        self.assertEqual([ends(segments) for segments, _ in groups],
+                         [[[1, 0], [7, 3]],
+                          [[1, 1], [8, 3], [9, 3]],
+                          [[2, 2]],
+                          [[4, 2], [6, 2]]])
+
+        groups = g._view_groups(hide_travel=True, color_on=False)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0][1], dict(colors='b'))
+        self.assertEqual(len(groups[0][0]), 6)
+
+    def test_buffered_output(self):
+        self.g.teardown()
+        self.outfile = TemporaryFile('w+')
+        self.g = self.getGClass()(outfile=self.outfile, print_lines=False,
+                                  buffer_lines=3)
+        self.expected = ""
+        self.expect_cmd('G91 ; relative')
+        self.g.move(10)
+        # Only two lines are pending so nothing has been written yet.
+        self.outfile.seek(0)
+        self.assertEqual(self.outfile.read(), '')
+        self.g.move(y=5)
+        self.expect_cmd("""
+        G1 X10.000000
+        G1 Y5.000000
+        """)
+        self.assert_output()
+        self.g.move(z=1)
+        self.g.flush()
+        self.expect_cmd('G1 Z1.000000')
+        self.assert_output()
+
+    def test_buffered_output_binary(self):
+        outfile = TemporaryFile('wb+')
+        g = self.getGClass()(outfile=outfile, print_lines=False,
+                             buffer_size=1024)
+        g.move(10, 10)
+        g.teardown()
+        outfile.seek(0)
+        lines = outfile.readlines()
+        self.assertEqual(lines, [b'G91 ; relative\n',
+                                 b'G1 X10.000000 Y10.000000\n'])
+        outfile.close()
+
 
 if __name__ == '__main__':
     unittest.main()
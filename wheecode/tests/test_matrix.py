@@ -4,6 +4,9 @@ from os.path import abspath, dirname, join
 import unittest
 import sys
 import math
+from io import StringIO
+
+import numpy as np
 
 HERE = dirname(abspath(__file__))
 
@@ -205,5 +208,194 @@ class TestGMatrix(TestGFixture):
         self.g.pop_matrix()
         self.assert_output()
 
+    def test_matrix_cache(self):
+        self.g.push_matrix()
+        self.g.reflect(0.0)
+        self.g.arc(x=10, y=0)
+        self.g.push_matrix()
+        self.g.rotate(math.pi/2)
+        self.assert_almost_position({'x': 0, 'y': 10, 'z': 0})
+        self.g.pop_matrix()
+        self.assert_almost_position({'x': 10, 'y': 0, 'z': 0})
+        self.g.pop_matrix()
+        self.g.arc(x=-10, y=0)
+        self.expect_cmd("""
+        G17 ; XY plane
+        G3 X10.000000 Y0.000000 R5.000000
+        G17 ; XY plane
+        G2 X-10.000000 Y0.000000 R5.000000
+        """)
+        self.assert_output()
+        self.assert_almost_position({'x': 0, 'y': 0, 'z': 0})
+
+    def test_moves(self):
+        self.g.rotate(math.pi/2)
+        self.g.moves([[10, 0], [0, 5]])
+        self.g.moves([[2]], axes=('y',))
+        self.expect_cmd("""
+        G1 X0.000000 Y10.000000
+        G1 X-5.000000 Y0.000000
+        G1 X-2.000000 Y0.000000
+        """)
+        self.assert_output()
+        self.assert_almost_position({'x': 10, 'y': 7, 'z': 0})
+
+    def test_translate(self):
+        self.g.push_matrix()
+        self.g.translate(10, 5)
+        self.assert_almost_position({'x': -10, 'y': -5, 'z': 0})
+        self.g.abs_move(1, 1)
+        self.g.move(1, 0)
+        self.g.rotate(math.pi/2)
+        self.g.translate(2, 0)
+        self.g.abs_move(0, 0)
+        self.g.pop_matrix()
+        self.expect_cmd("""
+        G90 ; absolute
+        G1 X11.000000 Y6.000000 Z0.000000
+        G91 ; relative
+        G1 X1.000000 Y0.000000
+        G90 ; absolute
+        G1 X10.000000 Y7.000000 Z0.000000
+        G91 ; relative
+        """)
+        self.assert_output()
+        self.assert_almost_position({'x': 10, 'y': 7, 'z': 0})
+
+    def test_rotate_about_axis(self):
+        self.g.rotate(math.pi/2, axis='x')
+        self.g.move(0, 1)
+        self.expect_cmd("""
+        G1 X0.000000 Y0.000000 Z1.000000
+        """)
+        self.assert_output()
+        self.assert_almost_position({'x': 0, 'y': 1, 'z': 0})
+        self.g.rotate(-math.pi/2, axis=(1, 0, 0))
+        self.g.move(0, 1)
+        self.assert_almost_position({'x': 0, 'y': 1, 'z': 1})
+
+    def test_scale_and_shear(self):
+        self.g.push_matrix()
+        self.g.scale(1, 2, 3)
+        self.g.move(1, 1, 1)
+        self.g.pop_matrix()
+        self.g.shear(xz=0.5)
+        self.g.move(0, 0, 2)
+        self.expect_cmd("""
+        G1 X1.000000 Y2.000000 Z3.000000
+        G1 X1.000000 Y0.000000 Z2.000000
+        """)
+        self.assert_output()
+        self.assert_almost_position({'x': -0.5, 'y': 2, 'z': 5})
+
+    def test_transform_points(self):
+        self.g.translate(1, 2, 3)
+        self.g.rotate(math.pi/2)
+        points = [[1, 0, 0], [0, 1, 1]]
+        np.testing.assert_allclose(self.g.transform_points(points),
+                                   [[1, 3, 3], [0, 2, 4]], atol=1e-12)
+        np.testing.assert_allclose(self.g.transform_points(points, translate=False),
+                                   [[0, 1, 0], [-1, 0, 1]], atol=1e-12)
+
+    def test_arc_scaled(self):
+        self.g.translate(5, 0)
+        self.g.scale(2)
+        self.g.arc(x=10, y=0, radius=-5)
+        self.g.abs_move(0, 0)
+        self.g.arc(x=10, y=0, direction='CCW')
+        self.expect_cmd("""
+        G17 ; XY plane
+        G2 X20.000000 Y0.000000 R-10.000000
+        G90 ; absolute
+        G1 X5.000000 Y0.000000 Z0.000000
+        G91 ; relative
+        G17 ; XY plane
+        G3 X20.000000 Y0.000000 R10.000000
+        """)
+        self.assert_output()
+
+    def test_arc_other_axis(self):
+        self.g.translate(10, 0)
+        self.g.arc(x=4, A=2, radius=5)
+        self.g.absolute()
+        self.g.arc(x=4, A=2, radius=5)
+        self.expect_cmd("""
+        G16 X Y A ; coordinate axis assignment
+        G18 ; XZ plane
+        G2 X4.000000 A2.000000 R5.000000
+        G90 ; absolute
+        G16 X Y A ; coordinate axis assignment
+        G18 ; XZ plane
+        G2 X14.000000 A2.000000 R5.000000
+        """)
+        self.assert_output()
+
+    def test_arc_linearized(self):
+        # Tilting the XY plane about X turns the arc into one in XZ, which
+        # G2 cannot describe in the XY plane.
+        self.g.rotate(math.pi/4, axis='x')
+        self.g.arc(x=10, y=0)
+        self.outfile.seek(0)
+        self.assertNotIn('G2', self.outfile.read())
+        self.assert_almost_position({'x': 10, 'y': 0, 'z': 0})
+        history = self.g.position_history.array
+        # The points are on a half circle of radius 5 around (5, 0) tilted
+        # by 45 degrees, going clockwise over the top, i.e. towards +y.
+        self.assertGreater(len(history), 10)
+        np.testing.assert_allclose(history[:, 1], history[:, 2], atol=1e-9)
+        logical_y = history[:, 1] * math.sqrt(2)
+        radii = np.hypot(history[:, 0] - 5, logical_y)
+        np.testing.assert_allclose(radii, 5)
+        self.assertTrue((history[:, 1] >= -1e-9).all())
+
+        # Arcs are not transformed twice when linearized on request.
+        self.g.arc(x=-10, y=0, linearize=True)
+        self.assert_almost_position({'x': 0, 'y': 0, 'z': 0})
+
+    def test_moves_match_move(self):
+        points = np.random.RandomState(0).uniform(-10, 10, (50, 2))
+        outputs, histories = [], []
+        for batched in (False, True):
+            outfile = StringIO()
+            g = GMatrix(outfile=outfile, print_lines=False)
+            g.translate(1, 2, 3)
+            g.rotate(0.3, axis=(1, 2, 3))
+            g.scale(2)
+            for absolute in (False, True):
+                if batched:
+                    g.moves(points, absolute=absolute)
+                else:
+                    if absolute:
+                        g.absolute()
+                    for x, y in points.tolist():
+                        g.move(x, y)
+                    g.relative()
+            outputs.append(outfile.getvalue().splitlines())
+            histories.append(g.position_history.array)
+        self.assertEqual(outputs[0], outputs[1])
+        # Relative moves are summed up in a different order.
+        np.testing.assert_allclose(histories[0], histories[1], atol=1e-9)
+
+    def test_moves_match_move_missing_axis(self):
+        outputs = []
+        for batched in (False, True):
+            outfile = StringIO()
+            g = GMatrix(outfile=outfile, print_lines=False)
+            g.translate(1, 2)
+            g.absolute()
+            g.move(x=1, y=2, z=3)
+            if batched:
+                g.moves([[5], [6]], axes=('x',))
+                g.moves([[7]], axes=('z',))
+            else:
+                g.move(x=5)
+                g.move(x=6)
+                g.move(z=7)
+            outputs.append(outfile.getvalue().splitlines())
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0][-3:], ['G1 X6.000000 Y4.000000',
+                                           'G1 X7.000000 Y4.000000',
+                                           'G1 X7.000000 Y4.000000 Z7.000000'])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,198 @@
+#! /usr/bin/env python
+
+import sys
+import unittest
+from math import cos, pi, sin
+from io import BytesIO, StringIO
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+HERE = dirname(abspath(__file__))
+
+try:
+    from wheecode import G
+except:
+    sys.path.append(abspath(join(HERE, '..', '..')))
+    from wheecode import G
+
+from wheecode.optimize import fit_arcs, merge_collinear
+from wheecode.parser import parse_gcode
+
+
+def parse(lines):
+    return parse_gcode(BytesIO('\n'.join(lines).encode('utf-8')))
+
+
+def gradient_spiral():
+    """ The lines of a `gradient_spiral`, whose moves carry the a and b pump
+    axes.
+    """
+    outfile = StringIO()
+    g = G(outfile=outfile, print_lines=False)
+    g.gradient_spiral(start_diameter=7.62, end_diameter=30.48, spacing=1,
+                      feedrate=8, flowrate=2 / 60.0, start='edge',
+                      gradient='-0.322*r**2 - 6.976*r + 131.892')
+    g.teardown()
+    return outfile.getvalue().splitlines()
+
+
+def pump_words(lines):
+    """ The a and b words of the last move that has them.
+    """
+    moves = [line.split() for line in lines if ' a' in line and 'G92' not in line]
+    return [word for word in moves[-1] if word[0] in 'ab']
+
+
+class TestMergeCollinear(unittest.TestCase):
+
+    def test_relative(self):
+        lines = ['G91', 'G1 X1 Y1', 'G1 X1 Y1.0001', 'G1 X1']
+        self.assertEqual(list(merge_collinear(lines)),
+                         ['G91', 'G1 X2.0000 Y2.0001', 'G1 X1'])
+
+    def test_absolute(self):
+        lines = ['G90', 'G1 X1 Y0', 'G1 X2 Y0.0005', 'G1 X3 Y0']
+        self.assertEqual(list(merge_collinear(lines)), ['G90', 'G1 X3.0000 Y0.0000'])
+        self.assertEqual(list(merge_collinear(lines, tolerance=0.0001)), lines)
+
+    def test_feed_and_extrusion(self):
+        lines = ['G90',
+                 'G1 X1 F100', 'G1 X2',          # merged, keeping the feed
+                 'G1 X3 F200', 'G1 X4',          # new feed, new run
+                 'G1 Y1 E1', 'G1 Y2 E2',         # extruding
+                 'G1 Y3 E4',                     # different flow
+                 'G1 Y4',                        # not extruding
+                 'G0 Y5']                        # rapid
+        self.assertEqual(list(merge_collinear(lines)),
+                         ['G90', 'G1 X2 F100', 'G1 X4 F200', 'G1 Y2 E2',
+                          'G1 Y3 E4', 'G1 Y4', 'G0 Y5'])
+
+    def test_barriers(self):
+        lines = ['G91', 'G1 X1', 'G1 X1 ; comment', 'G1 X1', 'G4 P10', 'G1 X1',
+                 'G1 X-1']
+        self.assertEqual(list(merge_collinear(lines)), lines)
+
+    def test_other_axes(self):
+        lines = ['G90', 'G1 X1 Y0 A0.1 B0.2', 'G1 X2 Y0 A0.2 B0.4',
+                 'G1 X3 Y0 A0.3 B0.6']
+        self.assertEqual(list(merge_collinear(lines)), lines)
+        lines = gradient_spiral()
+        merged = list(merge_collinear(lines, tolerance=0.05))
+        self.assertEqual(pump_words(merged), pump_words(lines))
+        self.assertEqual(merged, lines)
+
+    def test_linearized_arc(self):
+        outfile = StringIO()
+        g = G(outfile=outfile, print_lines=False, extrude=True,
+              layer_height=0.2, extrusion_width=0.4)
+        g.move(10, 0)
+        for _ in range(20):
+            g.move(0.5, 0)
+        g.arc(x=10, y=10, linearize=True)
+        g.teardown()
+        lines = outfile.getvalue().splitlines()
+        merged = list(merge_collinear(lines, tolerance=0.01))
+        self.assertLess(len(merged), len(lines))
+
+        before, after = parse(lines), parse(merged)
+        np.testing.assert_allclose(after.position[-1], before.position[-1], atol=1e-6)
+        self.assertAlmostEqual(after.e[-1], before.e[-1], places=5)
+        # Every point of the original path is close to the merged path.
+        for point in before.position:
+            distances = np.sqrt(((after.position - point) ** 2).sum(axis=1))
+            segments = np.vstack([[0, 0, 0], after.position])
+            starts, ends = segments[:-1], segments[1:]
+            chords = ends - starts
+            t = np.clip(((point - starts) * chords).sum(axis=1)
+                        / (chords * chords).sum(axis=1), 0, 1)
+            closest = starts + t[:, None] * chords
+            self.assertLess(np.sqrt(((closest - point) ** 2).sum(axis=1)).min(),
+                            0.01 + 1e-6)
+
+
+def circle(count, radius=5, turn=pi / 2, direction=1):
+    """ Absolute moves along an arc around the origin, starting at
+    (radius, 0).
+    """
+    lines = ['G90', 'G1 X{:.6f} Y0.000000'.format(radius)]
+    for n in range(1, count + 1):
+        angle = direction * turn * n / count
+        lines.append('G1 X{:.6f} Y{:.6f}'.format(radius * cos(angle),
+                                                 radius * sin(angle)))
+    return lines
+
+
+class TestFitArcs(unittest.TestCase):
+
+    def test_absolute(self):
+        self.assertEqual(list(fit_arcs(circle(90))),
+                         ['G90', 'G1 X5.000000 Y0.000000', 'G17 ; XY plane',
+                          'G3 X0.000000 Y5.000000 I-5.000000 J0.000000'])
+        self.assertEqual(list(fit_arcs(circle(90, direction=-1)))[-1],
+                         'G2 X0.000000 Y-5.000000 I-5.000000 J-0.000000')
+
+    def test_linearized_arc(self):
+        outfile = StringIO()
+        g = G(outfile=outfile, print_lines=False, extrude=True,
+              layer_height=0.2, extrusion_width=0.4)
+        g.move(10, 0)
+        g.arc(x=10, y=10, linearize=True)
+        g.move(5, 0)
+        g.teardown()
+        lines = outfile.getvalue().splitlines()
+        fitted = list(fit_arcs(lines, tolerance=0.05))
+        self.assertEqual(len(fitted), 5)
+        self.assertEqual(fitted[2], 'G17 ; XY plane')
+        self.assertTrue(fitted[3].startswith(
+            'G2 X10.000000 Y10.000000 I5.000000 J5.000000 E'))
+        before, after = parse(lines), parse(fitted)
+        np.testing.assert_allclose(after.position[-1], before.position[-1], atol=1e-6)
+        self.assertAlmostEqual(after.e[-1], before.e[-1], places=5)
+
+        # The moves deviate from the arc by more than the default tolerance.
+        self.assertEqual(list(fit_arcs(lines)), lines)
+
+    def test_left_alone(self):
+        straight = ['G91'] + ['G1 X1 Y0.0001'] * 10
+        self.assertEqual(list(fit_arcs(straight)), straight)
+        few = circle(2)
+        self.assertEqual(list(fit_arcs(few)), few)
+        self.assertEqual(list(fit_arcs(few, tolerance=0.5, min_moves=2))[-1],
+                         'G3 X0.000000 Y5.000000 I-5.000000 J0.000000')
+        interrupted = circle(90)
+        interrupted.insert(40, 'G4 P1')
+        self.assertEqual(sum(line.startswith('G3') for line in fit_arcs(interrupted)), 2)
+
+    def test_other_axes(self):
+        lines = circle(90)
+        lines[10:] = [line + ' A%d' % i for i, line in enumerate(lines[10:])]
+        fitted = list(fit_arcs(lines))
+        self.assertTrue(fitted[3].startswith('G3'))
+        self.assertEqual(fitted[-len(lines[10:]):], lines[10:])
+        lines = gradient_spiral()
+        fitted = list(fit_arcs(lines, tolerance=0.01))
+        self.assertEqual(pump_words(fitted), pump_words(lines))
+        self.assertEqual(fitted, lines)
+
+    def test_full_circle(self):
+        fitted = list(fit_arcs(circle(360, turn=2 * pi)))
+        # The last few moves are left over after an arc of almost 360 degrees.
+        arcs = [line for line in fitted if line.startswith('G3')]
+        self.assertEqual(len(arcs), 1)
+        self.assertLess(len(fitted), 10)
+
+    def test_chained(self):
+        outfile = StringIO()
+        g = G(outfile=outfile, print_lines=False)
+        g.spiral(end_diameter=20, spacing=1, feedrate=10)
+        g.teardown()
+        lines = outfile.getvalue().splitlines()
+        fitted = list(fit_arcs(merge_collinear(lines), tolerance=0.01))
+        self.assertLess(len(fitted), len(lines) / 3)
+        np.testing.assert_allclose(parse(fitted).position[-1],
+                                   parse(lines).position[-1], atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+#! /usr/bin/env python
+
+import sys
+import unittest
+from io import BytesIO, StringIO
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+HERE = dirname(abspath(__file__))
+
+try:
+    from wheecode import G
+except:
+    sys.path.append(abspath(join(HERE, '..', '..')))
+    from wheecode import G
+
+from wheecode.commands import RAPID, MOVE, ARC_CW, OTHER
+from wheecode.parser import parse_gcode
+
+
+def parse(text, **kwargs):
+    return parse_gcode(BytesIO(text.encode('utf-8')), **kwargs)
+
+
+class TestParseGCode(unittest.TestCase):
+
+    def test_absolute_and_relative(self):
+        parsed = parse('G90\n'
+                       'G0 X10 Y5\n'
+                       'G1 Z1 F300\n'
+                       'G91\n'
+                       'G1 X1 Y1\n'
+                       'X2\n')
+        np.testing.assert_array_equal(parsed.position,
+                                      [[10, 5, 0], [10, 5, 1], [11, 6, 1], [13, 6, 1]])
+        np.testing.assert_array_equal(parsed.opcode, [RAPID, MOVE, MOVE, MOVE])
+        np.testing.assert_array_equal(parsed.feed, [0, 300, 300, 300])
+        np.testing.assert_array_equal(parsed.line, [1, 2, 4, 5])
+
+    def test_set_position(self):
+        parsed = parse('G90\n'
+                       'G1 X10 Y10\n'
+                       'G92 X0\n'
+                       'G1 X5\n'
+                       'G92\n'
+                       'G91\n'
+                       'G1 Y1\n')
+        np.testing.assert_array_equal(parsed.position,
+                                      [[10, 10, 0], [0, 10, 0], [5, 10, 0],
+                                       [0, 0, 0], [0, 1, 0]])
+        np.testing.assert_array_equal(parsed.opcode, [MOVE, OTHER, MOVE, OTHER, MOVE])
+
+    def test_extrusion(self):
+        parsed = parse('G90\n'
+                       'M83\n'
+                       'G1 X1 E0.5\n'
+                       'G1 X2\n'
+                       'G1 E-1\n'
+                       'M82\n'
+                       'G92 E0\n'
+                       'G1 X3 E2\n'
+                       'G1 X4 E1\n')
+        np.testing.assert_array_equal(parsed.e, [0.5, 0.5, -0.5, 0, 2, 1])
+        np.testing.assert_array_equal(parsed.extruding,
+                                      [True, False, False, False, True, False])
+
+    def test_comments_checksums_and_compact_words(self):
+        parsed = parse('; G1 X100\n'
+                       'N1 G1 X1 (move Y100) Y2*57\n'
+                       'G2X3Y4I1J1\n'
+                       'M117 G1 X50\n'
+                       'g1 x5\n')
+        np.testing.assert_array_equal(parsed.position,
+                                      [[1, 2, 0], [3, 4, 0], [5, 4, 0]])
+        np.testing.assert_array_equal(parsed.opcode, [MOVE, ARC_CW, MOVE])
+
+    def test_chunks(self):
+        with open(join(HERE, 'test.gcode'), 'rb') as f:
+            text = f.read()
+        whole = parse_gcode(BytesIO(text))
+        chunked = parse_gcode(BytesIO(text), chunk_size=100)
+        # Relative moves are summed in a different order in each chunk.
+        for name in ('position', 'e', 'feed', 'extruding', 'opcode', 'line'):
+            np.testing.assert_allclose(getattr(whole, name),
+                                       getattr(chunked, name), atol=1e-9)
+        lines = text.splitlines()
+        for index in whole.line[[0, 1000, -1]]:
+            self.assertTrue(lines[index].startswith((b'G0', b'G1', b'G92')))
+
+    def test_empty(self):
+        self.assertEqual(len(parse('')), 0)
+        self.assertEqual(len(parse('M104 S200\nT0\n')), 0)
+
+
+class TestFromGCode(unittest.TestCase):
+
+    def test_round_trip(self):
+        outfile = StringIO()
+        g = G(outfile=outfile, print_lines=False, extrude=True,
+              layer_height=0.2, extrusion_width=0.4)
+        g.feed(20)
+        g.move(10, 10)
+        g.abs_move(x=2, y=3, z=1)
+        g.set_home(x=0)
+        g.feed(40)
+        g.move(5, 1)
+        g.arc(x=4, y=0)
+        g.meander(5, 5, 1)
+        g.teardown()
+
+        loaded = G.from_gcode(StringIO(outfile.getvalue()))
+        np.testing.assert_allclose(loaded.position_history.array,
+                                   g.position_history.array, atol=1e-6)
+        self.assertEqual(loaded.speed_history, g.speed_history)
+        self.assertEqual(loaded.current_position['x'], g.current_position['x'])
+
+    def test_test_gcode(self):
+        g = G.from_gcode(join(HERE, 'test.gcode'))
+        self.assertEqual(len(g.position_history), len(g.color_history))
+        self.assertEqual(g.extruding_history[0], (1, [None, False]))
+        self.assertEqual(g.speed_history[:2], [(1, 2000.0), (2, 9000.0)])
+        segments = g.export_APE()
+        self.assertTrue(segments)
+        self.assertEqual(sorted(segments[0][0]), ['X', 'Y', 'Z'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,13 @@
 import unittest
 from mock import Mock, patch, MagicMock
 import os
+import tempfile
 from time import sleep
 from threading import Thread
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
 try:
     from threading import _Event as Event
 except ImportError:
@@ -11,7 +16,7 @@ except ImportError:
 
 import serial
 
-from wheecode.printer import Printer
+from wheecode.printer import Printer, SendBuffer
 
 # for python 2/3 compatibility
 try:
@@ -89,7 +94,32 @@ class TestPrinter(unittest.TestCase):
                     line = line.split(';')[0]
                 if line:
                     expected.append(line)
-        self.assertEqual(self.p._buffer, expected)
+        self.assertEqual(list(self.p._buffer), expected)
+
+    def test_load_file_stream(self):
+        fd, path = tempfile.mkstemp(suffix='.gcode')
+        with os.fdopen(fd, 'w') as f:
+            for i in range(50):
+                f.write('; move {}\n'.format(i))
+                f.write('G1 X{}\n'.format(i))
+        try:
+            self.p.load_file(path, stream=True, read_ahead=5)
+            for _ in range(100):
+                if len(self.p._buffer) == 5:
+                    break
+                sleep(0.01)
+            sleep(0.05)
+            # Nothing has been sent, so the load thread stops reading ahead.
+            self.assertEqual(list(self.p._buffer),
+                             ['G1 X{}'.format(i) for i in range(5)])
+            self.p.start()
+            while self.p.printing:
+                sleep(0.01)
+            self.assertEqual(self.p.s.write.call_count, 50)
+            self.assertEqual(self.p.sentlines[-1], 'G1 X49')
+        finally:
+            self.p.disconnect()
+            os.remove(path)
 
     def test_sendline(self):
         self.p.start()
@@ -148,6 +178,21 @@ class TestPrinter(unittest.TestCase):
         self.assertEqual(self.p.s.write.call_count, len(self.p._buffer))
         self.assertEqual(self.p._current_line_idx, len(self.p._buffer))
 
+    def test_bounded_history(self):
+        s = self.p.s
+        self.p = Printer(history_size=5)
+        self.p.s = s
+        self.p.load_file(os.path.join(HERE, 'test.gcode'))
+        total = len(self.p._buffer)
+        self.p.start()
+        while self.p.printing:
+            sleep(0.01)
+        self.assertEqual(s.write.call_count, total)
+        self.assertEqual(len(self.p._buffer), total)
+        self.assertLessEqual(len(list(self.p._buffer)), 6)
+        self.assertEqual(len(self.p.sentlines), 5)
+        self.assertLessEqual(len(self.p.responses), 5)
+
     def test_pause(self):
         self.p.load_file(os.path.join(HERE, 'test.gcode'))
         self.p.start()
@@ -165,14 +210,29 @@ class TestPrinter(unittest.TestCase):
     def test_next_line(self):
         self.p.load_file(os.path.join(HERE, 'test.gcode'))
         line = self.p._next_line()
-        expected = 'N1 M900*43\n'
+        expected = encode2To3('N1 M900*43\n')
         self.assertEqual(line, expected)
 
         self.p._current_line_idx = 1
         line = self.p._next_line()
-        expected = 'N2 G90*18\n'
+        expected = encode2To3('N2 G90*18\n')
         self.assertEqual(line, expected)
 
+    def test_next_line_cached(self):
+        self.p.sendline('G1 X1')
+        self.p.sendline('M110 N10')
+        self.p.sendline('G1 X2')
+        frames = []
+        for idx in range(3):
+            self.p._current_line_idx = idx
+            frames.append(self.p._next_line())
+        self.assertEqual(frames[2], encode2To3('N11 G1 X2*82\n'))
+        # Resending a line reuses the frame it was first sent with.
+        self.p._current_line_idx = 0
+        self.assertIs(self.p._next_line(), frames[0])
+        self.assertEqual(self.p._checksum('N11 G1 X2'), 82)
+        self.assertEqual(self.p._checksum(encode2To3('N11 G1 X2')), 82)
+
     def test_get_response_no_threads_running(self):
         with self.assertRaises(RuntimeError):
             self.p.get_response('test')
@@ -184,6 +244,69 @@ class TestPrinter(unittest.TestCase):
         # We expect to get a blank response when the timeout is hit.
         self.assertEqual(resp, expected)
 
+    def _queue_responses(self):
+        """ Make readline return the lines put in the returned queue, or an
+        empty string if none arrive in time.
+        """
+        responses = Queue()
+
+        def readline():
+            try:
+                return responses.get(timeout=0.05)
+            except Empty:
+                return encode2To3('')
+        self.p.s.readline.side_effect = readline
+        return responses
+
+    def _wait_for_writes(self, count):
+        for _ in range(500):
+            if self.p.s.write.call_count >= count:
+                break
+            sleep(0.01)
+        return [decode2To3(c[0][0]) for c in self.p.s.write.call_args_list]
+
+    def test_streaming(self):
+        responses = self._queue_responses()
+        self.p.rx_buffer_size = 32
+        self.p.start()
+        for line in ['G1 X1', 'G1 X2', 'G1 X3', 'G1 X4']:
+            self.p.sendline(line)
+        # Each framed line is 12 bytes, so only two fit in the RX buffer.
+        self.assertEqual(self._wait_for_writes(2),
+                         ['N1 G1 X1*96\n', 'N2 G1 X2*96\n'])
+        sleep(0.1)
+        self.assertEqual(self.p.s.write.call_count, 2)
+        responses.put(encode2To3('ok\n'))
+        self.assertEqual(len(self._wait_for_writes(3)), 3)
+        for _ in range(3):
+            responses.put(encode2To3('ok\n'))
+        self.assertEqual(len(self._wait_for_writes(4)), 4)
+        s = self.p.s
+        self.p.disconnect(wait=True)
+        self.assertEqual(s.write.call_count, 4)
+
+    def test_streaming_resend(self):
+        responses = self._queue_responses()
+        self.p.rx_buffer_size = 64
+        self.p.start()
+        for line in ['G1 X1', 'G1 X2', 'G1 X3']:
+            self.p.sendline(line)
+        self._wait_for_writes(3)
+        responses.put(encode2To3('ok\n'))
+        responses.put(encode2To3('Error:checksum mismatch, Last Line: 1\n'))
+        responses.put(encode2To3('Resend: 2\n'))
+        responses.put(encode2To3('ok\n'))
+        writes = self._wait_for_writes(5)
+        self.assertEqual(writes[3:], ['N2 G1 X2*96\n', 'N3 G1 X3*96\n'])
+        self.assertEqual(list(self.p._in_flight), [12, 12])
+        responses.put(encode2To3('ok\n'))
+        responses.put(encode2To3('ok\n'))
+        for _ in range(100):
+            if not self.p._in_flight:
+                break
+            sleep(0.01)
+        self.assertEqual(self.p._in_flight_bytes, 0)
+
     #def test_readline_timeout(self):
     #    def side_effect():
     #        yield 'ok '
@@ -195,6 +318,22 @@ class TestPrinter(unittest.TestCase):
     #        self.p._start_read_thread()
 
 
+class TestSendBuffer(unittest.TestCase):
+
+    def test_absolute_indexing(self):
+        buf = SendBuffer(['G90', 'G1 X1', 'G1 X2'])
+        buf.append('G1 X3')
+        buf.discard_before(2)
+        self.assertEqual(len(buf), 4)
+        self.assertEqual(buf.start, 2)
+        self.assertEqual(list(buf), ['G1 X2', 'G1 X3'])
+        self.assertEqual(buf[2], 'G1 X2')
+        self.assertEqual(buf[-1], 'G1 X3')
+        with self.assertRaises(IndexError):
+            buf[1]
+        with self.assertRaises(IndexError):
+            buf[4]
+
 
 if __name__ == '__main__':
     unittest.main()
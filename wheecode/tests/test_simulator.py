@@ -0,0 +1,145 @@
+#! /usr/bin/env python
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+HERE = dirname(abspath(__file__))
+
+try:
+    from wheecode.printer import Printer, PrinterGroup
+except:
+    sys.path.append(abspath(join(HERE, '..', '..')))
+    from wheecode.printer import Printer, PrinterGroup
+
+from wheecode.simulator import MarlinSimulator
+
+
+class TestMarlinSimulator(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = ['G1 X{} Y{}'.format(i, i % 7) for i in range(200)]
+        self.p = None
+        self.s = None
+
+    def tearDown(self):
+        if self.p is not None:
+            self.p.disconnect()
+        if self.s is not None:
+            self.s.close()
+
+    def stream(self, printer_options, **simulator_options):
+        self.s = MarlinSimulator(seed=1, timeout=0.02, **simulator_options)
+        self.p = Printer(**printer_options)
+        self.p.connect(self.s)
+        self.p.start()
+        for line in self.lines:
+            self.p.sendline(line)
+        return self.p.get_response('M114')
+
+    def test_get_response(self):
+        response = self.stream({})
+        self.assertEqual(response, 'X:199.00 Y:3.00 Z:0.00 E:0.00 '
+                                   'Count X: 199.00 Y:3.00 Z:0.00\nok\n')
+        self.assertEqual(self.s.received, self.lines + ['M114'])
+
+    def test_resend(self):
+        self.stream({}, resend_rate=0.05)
+        self.assertGreater(self.s.resends, 0)
+        self.assertEqual(self.s.received, self.lines + ['M114'])
+
+    def test_streaming_resend(self):
+        self.stream({'rx_buffer_size': 127}, resend_rate=0.05, latency=0.001)
+        self.assertGreater(self.s.resends, 0)
+        self.assertEqual(self.s.received, self.lines + ['M114'])
+
+    def test_timeout(self):
+        self.stream({'rx_buffer_size': 127}, timeout_rate=0.02)
+        self.assertGreater(self.s.timeouts, 0)
+        self.assertEqual(self.s.received, self.lines + ['M114'])
+
+    def test_line_number_reset(self):
+        self.lines[100:100] = ['M110 N5']
+        self.stream({}, resend_rate=0.05)
+        self.assertEqual(self.s.received, self.lines + ['M114'])
+
+
+class TestPrinterGroup(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = ['G1 X{}'.format(i) for i in range(100)]
+        # The second machine is much slower than the first.
+        self.simulators = [MarlinSimulator(timeout=0.02),
+                           MarlinSimulator(timeout=0.02, processing_time=0.002)]
+        self.group = PrinterGroup([Printer(), Printer(rx_buffer_size=127)],
+                                  max_pending=10)
+
+    def tearDown(self):
+        self.group.disconnect()
+        for s in self.simulators:
+            s.close()
+
+    def test_fan_out(self):
+        self.group.connect(self.simulators)
+        self.group.start()
+        for line in self.lines:
+            self.group.sendline(line)
+        fast, slow = self.group.printers
+        self.assertLessEqual(slow.pending, 10)
+        responses = self.group.get_response('M114')
+        self.assertEqual(len(responses), 2)
+        for response in responses:
+            self.assertTrue(response.startswith('X:99.00 '))
+        for s in self.simulators:
+            self.assertEqual(s.received, self.lines + ['M114'])
+        progress = self.group.progress()
+        self.assertEqual([p['acknowledged'] for p in progress], [101, 101])
+        self.assertEqual([p['sent'] for p in progress], [101, 101])
+        self.assertGreater(self.group.throughput, 0)
+
+    def test_stalled_printer(self):
+        self.group.connect(self.simulators)
+        self.group.start()
+        fast, slow = self.group.printers
+        slow.paused = True
+        # The paused printer holds 10 unsent lines, and the fan-out queue 10
+        # more for it, so none of these wait while the other printer is fed.
+        for line in self.lines[:20]:
+            self.group.sendline(line)
+        fast._wait_for(lambda: fast._response_count == 20)
+        slow._wait_for(lambda: slow.pending == 10)
+        self.assertEqual(self.simulators[0].received, self.lines[:20])
+        self.assertEqual([p['waiting'] for p in self.group.progress()], [0, 10])
+        slow.paused = False
+        responses = self.group.get_response('M114')
+        for response in responses:
+            self.assertTrue(response.startswith('X:19.00 '))
+        for s in self.simulators:
+            self.assertEqual(s.received, self.lines[:20] + ['M114'])
+
+    def test_transforms(self):
+        def mirror(line):
+            if line.startswith('G1 X'):
+                return 'G1 X-' + line[4:]
+            return line
+
+        def skip_comments(line):
+            if not line.startswith('M117'):
+                return line
+
+        self.group.transforms = [skip_comments, mirror]
+        self.group.connect(self.simulators)
+        self.group.start()
+        for line in ['M117 hello', 'G1 X5']:
+            self.group.sendline(line)
+        self.group.disconnect(wait=True)
+        self.assertEqual(self.simulators[0].received, ['G1 X5'])
+        self.assertEqual(self.simulators[1].received, ['M117 hello', 'G1 X-5'])
+
+    def test_transform_count(self):
+        with self.assertRaises(ValueError):
+            PrinterGroup([Printer()], transforms=[None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
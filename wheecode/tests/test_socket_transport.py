@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+
+import socket
+import sys
+import unittest
+from os.path import abspath, dirname, join
+from threading import Thread, Event
+
+HERE = dirname(abspath(__file__))
+
+try:
+    from wheecode import G
+except:
+    sys.path.append(abspath(join(HERE, '..', '..')))
+    from wheecode import G
+
+from wheecode.socket_transport import SocketTransport
+
+
+class FakeController(object):
+    """ Accepts a single connection and answers every received line with
+    '%' followed by the line, or '!' for lines starting with 'BAD'. Answers
+    are held back until `release` is set, so tests can observe several lines
+    in flight.
+    """
+
+    def __init__(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('localhost', 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.received = []
+        self.release = Event()
+        self.release.set()
+        self._thread = Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _serve(self):
+        conn, _ = self.server.accept()
+        data = b''
+        while True:
+            chunk = conn.recv(8192)
+            if not chunk:
+                break
+            data += chunk
+            lines = data.split(b'\n')
+            data = lines.pop()
+            for line in lines:
+                line = line.decode('UTF-8')
+                self.received.append(line)
+                self.release.wait()
+                if line.startswith('BAD'):
+                    conn.sendall(b'!' + line.encode('UTF-8') + b'\n')
+                else:
+                    # Split the answer in two to exercise reassembly.
+                    conn.sendall(b'%' + line[:2].encode('UTF-8'))
+                    conn.sendall(line[2:].encode('UTF-8') + b'\n')
+        conn.close()
+
+    def close(self):
+        self.server.close()
+
+
+class TestSocketTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = FakeController()
+
+    def tearDown(self):
+        self.controller.close()
+
+    def test_pipelined_responses(self):
+        transport = SocketTransport('localhost', self.controller.port, window=4)
+        transport.connect()
+        self.controller.release.clear()
+        responses = [transport.send('G1 X{}'.format(i)) for i in range(4)]
+        self.assertFalse(any(r.done() for r in responses))
+        self.controller.release.set()
+        self.assertEqual([r.result(5) for r in responses],
+                         ['G1 X{}'.format(i) for i in range(4)])
+        self.assertTrue(transport.wait(5))
+        transport.close()
+        self.assertEqual(self.controller.received,
+                         ['G1 X{}'.format(i) for i in range(4)])
+
+    def test_error_is_surfaced(self):
+        errors = []
+        transport = SocketTransport('localhost', self.controller.port,
+                                    window=2, on_error=errors.append)
+        ok = transport.send('G1 X1')
+        bad = transport.send('BAD LINE')
+        self.assertEqual(ok.result(5), 'G1 X1')
+        with self.assertRaises(RuntimeError):
+            bad.result(5)
+        self.assertEqual(errors, [bad])
+        with self.assertRaises(RuntimeError):
+            transport.send('G1 X2')
+        with self.assertRaises(RuntimeError):
+            transport.close()
+
+    def test_g_direct_write(self):
+        g = G(print_lines=False, direct_write=True, printer_port=self.controller.port,
+              socket_window=8)
+        g.move(1, 2)
+        self.assertEqual(g.write('M114', resp_needed=True), 'M114')
+        g.teardown()
+        self.assertEqual(self.controller.received,
+                         ['G91 ; relative', 'G1 X1.000000 Y2.000000', 'M114'])
+
+
+if __name__ == '__main__':
+    unittest.main()
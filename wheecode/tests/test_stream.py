@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+
+import sys
+import tempfile
+import unittest
+from os.path import abspath, dirname, join
+from time import sleep
+
+HERE = dirname(abspath(__file__))
+
+try:
+    from wheecode import G
+except:
+    sys.path.append(abspath(join(HERE, '..', '..')))
+    from wheecode import G
+
+from wheecode import GMatrix
+from wheecode.stream import generate, StreamClosed
+
+
+def program(g):
+    g.move(1, 2)
+    g.meander(5, 5, 1)
+    g.arc(x=2, y=2)
+    g.abs_move(0, 0)
+
+
+class TestGenerate(unittest.TestCase):
+
+    def test_matches_direct_output(self):
+        outfile = tempfile.TemporaryFile('w+')
+        g = G(outfile=outfile, print_lines=False, extrude=True)
+        program(g)
+        g.teardown()
+        outfile.seek(0)
+        expected = outfile.read().splitlines()
+        outfile.close()
+        self.assertEqual(list(G.generate(program, extrude=True)), expected)
+
+    def test_g_subclass(self):
+        def rotated(g):
+            g.rotate(1.5707963267948966)
+            g.move(1, 0)
+        self.assertEqual(list(GMatrix.generate(rotated))[-1],
+                         'G1 X0.000000 Y1.000000')
+
+    def test_backpressure(self):
+        written = []
+
+        def counting(g):
+            for i in range(1000):
+                g.move(i)
+                written.append(i)
+
+        lines = G.generate(counting, maxsize=2)
+        next(lines)
+        sleep(0.1)
+        # The program is held back until the lines are consumed.
+        self.assertLess(len(written), 10)
+        self.assertEqual(len(list(lines)), 1000)
+        self.assertEqual(len(written), 1000)
+
+    def test_early_stop(self):
+        state = {}
+
+        def endless(g):
+            try:
+                while True:
+                    g.move(1)
+            except StreamClosed:
+                state['closed'] = True
+                raise
+
+        lines = generate(endless, maxsize=5)
+        self.assertEqual(next(lines), 'G91 ; relative')
+        lines.close()
+        self.assertTrue(state['closed'])
+
+    def test_error(self):
+        def failing(g):
+            g.move(1)
+            raise ValueError('bad program')
+
+        lines = G.generate(failing)
+        with self.assertRaises(ValueError):
+            list(lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
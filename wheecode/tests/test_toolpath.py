@@ -0,0 +1,173 @@
+#! /usr/bin/env python
+
+import math
+import sys
+import unittest
+from io import StringIO
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+HERE = dirname(abspath(__file__))
+
+try:
+    from wheecode import GMatrix
+except:
+    sys.path.append(abspath(join(HERE, '..', '..')))
+    from wheecode import GMatrix
+
+
+def part(g):
+    g.feed(100)
+    g.meander(4, 2, 1)
+    g.move(z=1)
+    g.arc(x=2, y=2)
+    g.abs_move(1, 1)
+    g.dwell(5)
+
+
+def lines(g):
+    return g.outfile.getvalue().splitlines()
+
+
+class TestToolpath(unittest.TestCase):
+
+    def setUp(self):
+        self.g = GMatrix(outfile=StringIO(), print_lines=False, setup=False)
+
+    def test_record(self):
+        path = self.g.record_toolpath(part)
+        self.assertEqual([block[0] for block in path.blocks],
+                         ['feed', 'moves', 'moves', 'arc', 'moves', 'write'])
+        self.assertEqual(path.end, (1, 1, 1))
+        # Nothing is written while recording.
+        self.assertEqual(lines(self.g), [])
+
+    def test_replay_as_recorded(self):
+        direct = GMatrix(outfile=StringIO(), print_lines=False, setup=False)
+        part(direct)
+        self.g.replay(self.g.record_toolpath(part), travel=False)
+        expected = lines(direct)
+        # The absolute move is replayed as a relative one.
+        self.assertEqual(expected[-4:], ['G90 ; absolute',
+                                         'G1 X1.000000 Y1.000000 Z1.000000',
+                                         'G91 ; relative', 'G4 P5'])
+        self.assertEqual(lines(self.g), expected[:-4] + [
+            'G1 X-5.000000 Y-3.000000 Z0.000000', 'G4 P5'])
+        np.testing.assert_allclose(self.g.position_history.array,
+                                   direct.position_history.array)
+
+    def test_replay_transformed(self):
+        transforms = [lambda g: g.translate(10, 0),
+                      lambda g: (g.translate(0, 10), g.rotate(math.pi / 2)),
+                      np.diag([-1.0, 1, 1, 1])]
+        direct = GMatrix(outfile=StringIO(), print_lines=False, setup=False)
+        for transform in transforms[:2]:
+            direct.push_matrix()
+            transform(direct)
+            direct.abs_move(x=0, y=0, rapid=True)
+            direct.meander(4, 2, 1)
+            direct.arc(x=2, y=2)
+            direct.pop_matrix()
+
+        def program(g):
+            g.meander(4, 2, 1)
+            g.arc(x=2, y=2)
+        self.g.replay(self.g.record_toolpath(program), transforms)
+        output = lines(self.g)
+        self.assertEqual(output[:len(lines(direct))], lines(direct))
+        # The mirrored copy keeps its arc, in the other direction.
+        self.assertEqual(output[-2:], ['G17 ; XY plane',
+                                       'G3 X-2.000000 Y2.000000 R1.414214'])
+        self.assertEqual(len(self.g.matrix_stack), 1)
+        self.assertAlmostEqual(self.g.current_position['x'], -6)
+
+    def test_replay_tilted(self):
+        path = self.g.record_toolpath(lambda g: g.arc(x=10, y=0))
+        self.g.replay(path, [lambda g: g.rotate(math.pi / 2, axis='x')],
+                      travel=False)
+        self.assertFalse([line for line in lines(self.g) if line.startswith('G2')])
+        position = self.g._current_position
+        self.assertAlmostEqual(position['x'], 10)
+        self.assertAlmostEqual(position['z'], 0)
+
+    def test_helix(self):
+        path = self.g.record_toolpath(lambda g: g.arc(
+            x=10, y=0, radius=5, helix_dim='z', helix_len=2))
+        self.g.replay(path, [None, lambda g: g.rotate(math.pi / 2)],
+                      travel=False)
+        arcs = [line for line in lines(self.g) if line.startswith('G2')]
+        self.assertEqual(arcs, ['G2 X10.000000 Y0.000000 R5.000000 G1 Z2.0',
+                                'G2 X0.000000 Y10.000000 R5.000000 G1 Z2.0'])
+        self.assertAlmostEqual(self.g.current_position['z'], 4)
+
+    def test_ijk_arc(self):
+        def program(g):
+            g.move(1, 0)
+            g.arc_ijk([2, 0], [1, 0], 'xy')
+            g.move(0, 1)
+        path = self.g.record_toolpath(program)
+        self.g.replay(path, [lambda g: g.rotate(math.pi / 2)], travel=False)
+        self.assertEqual(lines(self.g), ['G1 X0.000000 Y1.000000',
+                                         'G17 ; XY plane',
+                                         'G2 X0.000000 Y2.000000 R1.000000',
+                                         'G1 X-1.000000 Y0.000000'])
+        position = self.g.current_position
+        self.assertAlmostEqual(position['x'], -1)
+        self.assertAlmostEqual(position['y'], 3)
+
+    def test_ijk_long_arc(self):
+        def program(g):
+            g.arc_ijk([1, 1], [1, 0], 'xy', direction='CCW')
+            g.arc_ijk([0, 0], [0, 1], 'xy')
+        path = self.g.record_toolpath(program)
+        # A full circle is replayed as two halves.
+        self.assertEqual([block[1]['radius'] for block in path.blocks],
+                         [-1, 1, 1])
+        self.g.replay(path, [lambda g: g.shear(0.5)], travel=False)
+        self.assertFalse([line for line in lines(self.g) if line.startswith('G3')])
+        # The first arc turns the long way, through 3/4 of the circle around
+        # (1, 0), in 24 moves.
+        history = self.g.position_history.array
+        x, y = history[:25, 0] - 0.5 * history[:25, 1], history[:25, 1]
+        np.testing.assert_allclose(np.hypot(x - 1, y), 1, atol=1e-9)
+        self.assertAlmostEqual(y.min(), -1)
+        np.testing.assert_allclose([x[-1], y[-1]], [1, 1], atol=1e-9)
+        np.testing.assert_allclose(history[-1, :2], [1.5, 1], atol=1e-9)
+
+    def test_positional(self):
+        def program(g):
+            g.move(1, 0)
+            g.set_home(0, 0)
+        self.assertRaises(ValueError, self.g.record_toolpath, program)
+
+    def test_other_axes(self):
+        def program(g):
+            g.move(x=1, a=2)
+            g.abs_move(x=0, a=1)
+        path = self.g.record_toolpath(program)
+        self.g.replay(path, [None, lambda g: g.rotate(math.pi / 2)],
+                      travel=False)
+        # The a axis is replayed as steps, in its own case.
+        self.assertEqual(lines(self.g), [
+            'G1 X1.000000 Y0.000000 a2.000000',
+            'G1 X-1.000000 Y0.000000 Z0.000000 a-1.000000',
+            'G1 X0.000000 Y1.000000 a2.000000',
+            'G1 X-0.000000 Y-1.000000 Z0.000000 a-1.000000'])
+        self.assertAlmostEqual(self.g._current_position['a'], 2)
+
+    def test_extrusion(self):
+        g = GMatrix(outfile=StringIO(), print_lines=False, setup=False,
+                    extrude=True, layer_height=0.2, extrusion_width=0.4)
+        path = g.record_toolpath(lambda g: g.meander(4, 2, 1))
+        self.assertEqual(path.blocks[0][2], ('x', 'y', 'E'))
+        g.replay(path, [None, None])
+        output = lines(g)
+        # Travel does not extrude, the copies do, once.
+        self.assertEqual(output[1], 'G0 X0.000000 Y0.000000 Z0.000000')
+        self.assertEqual(sum(line.count('E') for line in output), 10)
+        self.assertTrue(g.extrude)
+
+
+if __name__ == '__main__':
+    unittest.main()
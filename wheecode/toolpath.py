@@ -0,0 +1,254 @@
+import math
+
+import numpy as np
+
+from wheecode.commands import ARC_CW
+
+# The settings a recording instance takes over from the instance it records
+# for, so the recorded commands come out the same as they would there.
+_SETTINGS = ('output_digits', 'x_axis', 'y_axis', 'z_axis', 'i_axis', 'j_axis',
+             'k_axis', 'extrude', 'filament_diameter', 'layer_height',
+             'extrusion_width', 'extrusion_multiplier')
+
+# Commands that are issued again as needed when replaying.
+_MODAL = ('G90', 'G91', 'G16', 'G17', 'G18', 'G19')
+
+# The axes of the arcs in each plane, in the order `G.arc` takes them.
+_PLANES = {'G17': ('x', 'y'), 'G18': ('x', 'z'), 'G19': ('y', 'z')}
+
+# Commands that set the position, which a replay cannot transform.
+_POSITIONAL = ('G28', 'G92', 'G92.1')
+
+
+class Toolpath(object):
+    """ A block of commands recorded once, that can be replayed any number of
+    times under different transformations.
+
+    The moves are kept as relative steps, grouped into blocks of consecutive
+    moves over the same axes, so a replay hands each block to
+    `GMatrix.moves` as a single array. Arcs, also those given by their
+    center, are replayed through `GMatrix.arc`, so they stay arcs where the
+    transformation allows it.
+    Moves of other axes, like A, are replayed as relative steps too. Feed
+    rates are set again, and any other command is written as recorded.
+    Commands that set the position, like G92, cannot be recorded.
+
+    The path starts at the origin of the coordinate system it is recorded
+    in. Extrusion is replayed as recorded for moves, while arcs work out
+    their extrusion again.
+
+    Use `GMatrix.record_toolpath` to create one and `GMatrix.replay` to
+    replay it.
+
+    """
+
+    def __init__(self, blocks, end):
+        self.blocks = blocks
+        self.end = end
+
+    def __len__(self):
+        return len(self.blocks)
+
+    @classmethod
+    def record(cls, program, like):
+        """ Run `program` on a new instance of the class of `like`, which
+        takes over its output and extrusion settings, and return the
+        commands it issued as a `Toolpath`.
+        """
+        settings = dict((name, getattr(like, name)) for name in _SETTINGS)
+        g = type(like)(print_lines=False, setup=False, record_history=False,
+                       record_commands=True, comment_char=like._comment_char,
+                       **settings)
+        program(g)
+        axes = {g.x_axis: 'x', g.y_axis: 'y', g.z_axis: 'z', 'E': 'E'}
+        centers = {g.i_axis: 'x', g.j_axis: 'y', g.k_axis: 'z'}
+        return cls(list(_compile(g.commands, axes, centers, g._comment_char)),
+                   tuple(g._current_position[name] for name in 'xyz'))
+
+    def emit(self, g):
+        """ Issue the recorded commands on `g`, starting from its current
+        position.
+        """
+        was_relative, extrude = g.is_relative, g.extrude
+        g.relative()
+        # Moves carry their recorded extrusion.
+        g.extrude = False
+        try:
+            for block in self.blocks:
+                kind, args = block[0], block[1:]
+                if kind == 'moves':
+                    steps, axes, rapid, colors = args
+                    g.moves(steps, axes=axes, absolute=False, rapid=rapid,
+                            colors=colors)
+                elif kind == 'move':
+                    kwargs, rapid, color = args
+                    g.move(rapid=rapid, color=color, **kwargs)
+                elif kind == 'arc':
+                    kwargs, extruding = args
+                    g.extrude = extruding
+                    g.arc(**kwargs)
+                    g.extrude = False
+                elif kind == 'feed':
+                    g.feed(args[0])
+                else:
+                    g.write(args[0])
+        finally:
+            g.extrude = extrude
+            if not was_relative:
+                g.absolute()
+
+
+def _number(word):
+    try:
+        return float(word)
+    except ValueError:
+        return None
+
+
+def _rate(rate):
+    " Write whole feed rates without decimals, as they are usually given. "
+    return int(rate) if rate.is_integer() else rate
+
+
+def _compile(log, axes, centers, comment_char):
+    """ Yield the blocks of a `Toolpath` for the commands in `log`, where
+    `axes` maps the letters of the axes to their names, and `centers` the
+    letters of the arc center offsets to the names of their axes.
+
+    Raises a ValueError for commands that cannot be replayed.
+    """
+    positions = np.vstack([[0.0, 0.0, 0.0], log.position])
+    steps = np.diff(positions, axis=0)
+    e_steps = np.diff(np.concatenate([[0.0], log.e]))
+    columns = {'x': 0, 'y': 1, 'z': 2}
+    others = {}
+    plane = _PLANES['G17']
+    run = None
+
+    def step(index, names):
+        return [float(e_steps[index] if name == 'E' else steps[index, columns[name]])
+                for name in names]
+
+    for index, text in enumerate(log.text):
+        words = text.split(comment_char)[0].split()
+        command = words[0].upper() if words else ''
+        letters = [w[:1].upper() for w in words[1:]]
+        values = [_number(w[1:]) for w in words[1:]]
+        color = log.color[index]
+
+        if command in ('G0', 'G1') and letters and all(l in axes for l in letters):
+            names = tuple(axes[l] for l in letters)
+            key = (command, names)
+            if run is not None and run[0] == key:
+                run[1].append(step(index, names))
+                run[2].append(color)
+                continue
+            if run is not None:
+                yield _moves(run)
+            run = (key, [step(index, names)], [color])
+            continue
+        if run is not None:
+            yield _moves(run)
+            run = None
+
+        if command in _MODAL:
+            plane = _PLANES.get(command, plane)
+            continue
+        if command == 'G1' and letters == ['F'] and values[0] is not None:
+            yield ('feed', _rate(values[0]))
+        elif command in ('G0', 'G1') and None not in values:
+            kwargs = {}
+            for word, letter, value in zip(words[1:], letters, values):
+                if letter in axes:
+                    name = axes[letter]
+                    kwargs[name] = step(index, (name,))[0]
+                elif letter == 'F':
+                    kwargs[letter] = value
+                else:
+                    # The log has no column for other axes, so follow their
+                    # positions here to replay them as steps too.
+                    last = others.get(letter, 0.0)
+                    others[letter] = last + value if log.relative[index] else value
+                    kwargs[word[:1]] = others[letter] - last
+            yield ('move', kwargs, command == 'G0', color)
+        elif command in ('G2', 'G3') and 'R' in letters:
+            yield _arc(index, letters, values, axes, step, log, color)
+        elif command in ('G2', 'G3'):
+            for block in _ijk_arcs(index, text, letters, values, plane, axes,
+                                   centers, step, log, color):
+                yield block
+        elif command in _POSITIONAL or steps[index].any() or e_steps[index]:
+            raise ValueError("Can't replay {!r} at another position".format(text))
+        else:
+            yield ('write', text)
+    if run is not None:
+        yield _moves(run)
+
+
+def _moves(run):
+    (command, names), rows, colors = run
+    return ('moves', np.array(rows), names, command == 'G0', colors)
+
+
+def _arc(index, letters, values, axes, step, log, color):
+    """ Return the block of the arc at `index`. Its end point is taken
+    from the recorded positions, so arcs issued in absolute mode replay as
+    relative ones.
+    """
+    r = letters.index('R')
+    names = [axes[l] for l in letters[:r] if axes.get(l) in ('x', 'y', 'z')]
+    normal = [name for name in 'xyz' if name not in names]
+    # A helix is written as a G1 word and a word of the axis normal to the
+    # arc, after the radius.
+    helix = [axes.get(l) for l in letters[r + 1:] if l != 'G']
+    if (not all(l in axes for l in letters[:r])
+            or helix and (len(normal) != 1 or helix != normal)):
+        raise ValueError("Can't replay {!r}".format(log.text[index]))
+    kwargs = dict(zip(names, step(index, names)))
+    kwargs.update(direction='CW' if log.opcode[index] == ARC_CW else 'CCW',
+                  radius=values[r])
+    if color is not None:
+        kwargs['color'] = color
+    if helix:
+        kwargs.update(helix_dim=normal[0], helix_len=step(index, normal)[0])
+    return ('arc', kwargs, 'E' in letters[:r])
+
+
+def _ijk_arcs(index, text, letters, values, plane, axes, centers, step, log,
+              color):
+    """ Yield the blocks of the arc at `index`, given by the offset of its
+    center, in `plane`. `GMatrix.arc` takes a radius instead, which is
+    negative for arcs of more than half a circle, so a full circle is
+    replayed as two halves.
+    """
+    offsets = dict((centers[l], v) for l, v in zip(letters, values) if l in centers)
+    if (None in values or set(offsets) - set(plane)
+            or not all(l in axes or l in centers for l in letters)):
+        raise ValueError("Can't replay {!r}".format(text))
+    u, v = step(index, plane)
+    center = [offsets.get(name, 0.0) for name in plane]
+    radius = math.hypot(*center)
+    direction = 'CW' if log.opcode[index] == ARC_CW else 'CCW'
+    start = math.atan2(-center[1], -center[0])
+    end = math.atan2(v - center[1], u - center[0])
+    sweep = (start - end if direction == 'CW' else end - start) % (2 * math.pi)
+    normal = [name for name in 'xyz' if name not in plane][0]
+    helix = step(index, (normal,))[0]
+    kwargs = {'direction': direction}
+    if color is not None:
+        kwargs['color'] = color
+    if math.hypot(u, v) < 1e-9:
+        # The arc ends where it starts.
+        ends = [(2 * center[0], 2 * center[1]),
+                (u - 2 * center[0], v - 2 * center[1])]
+        helix /= 2.0
+    else:
+        ends = [(u, v)]
+        radius = max(radius, math.hypot(u, v) / 2.0)
+        if sweep > math.pi:
+            radius = -radius
+    kwargs['radius'] = radius
+    if helix:
+        kwargs.update(helix_dim=normal, helix_len=helix)
+    for end in ends:
+        yield ('arc', dict(kwargs, **dict(zip(plane, end))), 'E' in letters)